@@ -1,12 +1,32 @@
+import asyncio
+import inspect
 import json
 import os
-from typing import Literal
+import threading
+from collections import OrderedDict
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, List, Literal, Optional, Tuple
 
 from dotenv import load_dotenv
-from langgraph.graph import StateGraph, END
 
+import candidates
+from candidates import Candidate
+from cascade import EvaluationCascade
 from state import AgentState
-from tools import (GoalDecomposer, CriteriaGenerator, PromptIdeator, PromptEvaluator, ReportGenerator)
+from stopping import AnyOf, MaxIterations, QualityThreshold, StoppingPolicy, best_score_history
+from telemetry import Telemetry
+from tools import (GoalDecomposer, CriteriaGenerator, PromptIdeator, PromptEvaluator, PromptScreener,
+                   ReportGenerator, charge_usage, fan_out, track_usage)
+
+# LangGraph, LangChain and NumPy take most of the import time, so they are only loaded when a
+# graph is built. Node signatures keep string annotations, which LangGraph still recognizes.
+if TYPE_CHECKING:
+    from langchain_core.runnables import RunnableConfig
+    from langgraph.graph import StateGraph
+
+    from cache import LLMCache
+    from rubric_index import RubricIndex
+    from scoring import Scorer
 
 # Example: os.environ = "YOUR_API_KEY"
 load_dotenv()
@@ -15,175 +35,509 @@ GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 # --- Configuration ---
 MAX_ITERATIONS = 4
 QUALITY_THRESHOLD = 0.95  # 95% of max possible score
+POPULATION_SIZE = 1  # Prompt candidates generated per Construct iteration
+BEAM_WIDTH = 1  # Top-scoring candidates that seed the next iteration
+SPECULATION_WORKERS = 8  # Threads generating speculative reports for the sync graph
+MAX_PENDING_SPECULATIONS = 1024
+TOOL_NAMES = ("goal_decomposer", "criteria_generator", "prompt_ideator", "prompt_screener", "prompt_evaluator",
+              "report_generator")
 
 
 class OrcaAgent:
-    def __init__(self, llm):
-        self.goal_decomposer = GoalDecomposer(llm)
-        self.criteria_generator = CriteriaGenerator(llm)
-        self.prompt_ideator = PromptIdeator(llm)
-        self.prompt_evaluator = PromptEvaluator(llm)
-        self.report_generator = ReportGenerator(llm)
-
-    # --- Node Functions ---
-    def orient(self, state: AgentState) -> AgentState:
-        print("--- PHASE: ORIENT ---")
-        initial_prompt = state["initial_prompt"]
-        user_goal = state["user_goal"]
-
-        decomposed_goals_obj = self.goal_decomposer.run(initial_prompt, user_goal)
+    def __init__(self, llm, population_size: int = POPULATION_SIZE, beam_width: int = BEAM_WIDTH,
+                 cache: Optional["LLMCache"] = None, evaluation_shard_size: Optional[int] = None,
+                 compact_context: bool = True, telemetry: Optional[Telemetry] = None,
+                 stopping_policy: Optional[StoppingPolicy] = None, speculative_report: bool = False,
+                 rubric_index: Optional["RubricIndex"] = None, scorer: Optional["Scorer"] = None,
+                 tool_llms: Optional[Dict] = None, cascade: Optional[EvaluationCascade] = None,
+                 max_iterations: int = MAX_ITERATIONS):
+        """`llm` serves every tool without its own model in `tool_llms`, which is keyed by the
+        names in `TOOL_NAMES`. A `prompt_screener` model enables cascaded evaluation, with a
+        default `cascade` unless one is given; a `cascade` without one only runs its pre-check.
+
+        `max_iterations` is a hard cap on every run, whatever its stopping policy, so a per-run
+        policy that is never met cannot loop forever."""
+        if population_size < 1 or beam_width < 1 or max_iterations < 1:
+            raise ValueError("population_size, beam_width and max_iterations must be at least 1.")
+        tool_llms = tool_llms or {}
+        unknown = set(tool_llms) - set(TOOL_NAMES)
+        if unknown:
+            raise ValueError(f"Unknown tools in tool_llms: {sorted(unknown)}")
+        self.population_size = population_size
+        self.beam_width = beam_width
+        self.telemetry = telemetry or Telemetry()
+        self.iteration_cap = MaxIterations(max_iterations)
+        self.stopping_policy = stopping_policy or AnyOf(self.iteration_cap, QualityThreshold(QUALITY_THRESHOLD))
+        self.speculative_report = speculative_report
+        self.rubric_index = rubric_index
+        if scorer is None:
+            from scoring import Scorer
+
+            scorer = Scorer()
+        self.scorer = scorer
+        self._speculations = OrderedDict()  # run_id -> (report request, Future or Task)
+        self._speculations_lock = threading.Lock()
+        self._speculation_pool = None
+
+        tool_options = {"cache": cache, "telemetry": self.telemetry}
+        self.goal_decomposer = GoalDecomposer(tool_llms.get("goal_decomposer", llm), **tool_options)
+        self.criteria_generator = CriteriaGenerator(tool_llms.get("criteria_generator", llm), **tool_options)
+        self.prompt_ideator = PromptIdeator(tool_llms.get("prompt_ideator", llm), compact=compact_context,
+                                            **tool_options)
+        self.prompt_evaluator = PromptEvaluator(tool_llms.get("prompt_evaluator", llm),
+                                                shard_size=evaluation_shard_size, **tool_options)
+        self.report_generator = ReportGenerator(tool_llms.get("report_generator", llm), compact=compact_context,
+                                                **tool_options)
+        self.prompt_screener = None
+        if "prompt_screener" in tool_llms:
+            self.prompt_screener = PromptScreener(tool_llms["prompt_screener"], **tool_options)
+            cascade = cascade or EvaluationCascade()
+        self.cascade = cascade
+
+    # --- Helpers ---
+    def token_usage(self) -> dict:
+        """Returns the estimated LLM calls and tokens spent so far, per tool."""
+        tools = [self.goal_decomposer, self.criteria_generator, self.prompt_ideator, self.prompt_screener,
+                 self.prompt_evaluator, self.report_generator]
+        return {type(tool).__name__: dict(tool.usage) for tool in tools if tool is not None}
+
+    def _survivors(self, state: AgentState) -> List[Candidate]:
+        """Returns the top `beam_width` scored candidates, best first, by the scorer's selection mode."""
+        return self.scorer.best(state["prompt_candidates"], state["evaluation_criteria"], self.beam_width)
+
+    # --- Node Logic ---
+    # Each node is split into the steps before and after its LLM calls so that the
+    # sync nodes and their async counterparts (prefixed with `a`) share one implementation.
+    # Nodes return only the state keys they change; `prompt_candidates` takes a list of
+    # candidate ops, which the channel's reducer applies to the run's `CandidateStore`.
+    def _orient_update(self, state: AgentState, decomposed_goals_obj) -> dict:
         if not decomposed_goals_obj:
             raise ValueError("Failed to decompose goals.")
 
-        print(f"Decomposed Goals: {decomposed_goals_obj.decomposed_goals}")
+        self.telemetry.log(f"Decomposed Goals: {decomposed_goals_obj.decomposed_goals}")
 
         return {
-            **state,
             "decomposed_goals": decomposed_goals_obj.decomposed_goals,
             "iteration_count": 0,
-            "prompt_candidates": []
+            "prompt_candidates": [candidates.reset()]
         }
 
-    def refine(self, state: AgentState) -> AgentState:
-        print("--- PHASE: REFINE ---")
-        decomposed_goals = state["decomposed_goals"]
-
-        criteria_obj = self.criteria_generator.run(decomposed_goals)
+    def _refine_update(self, state: AgentState, criteria_obj) -> dict:
         if not criteria_obj:
             raise ValueError("Failed to generate criteria.")
 
         criteria_list = [c.dict() for c in criteria_obj.evaluation_criteria]
-        print(f"Generated Criteria: {json.dumps(criteria_list, indent=2)}")
-
-        return {**state, "evaluation_criteria": criteria_list}
-
-    def ideate(self, state: AgentState) -> AgentState:
-        print(f"\n--- CONSTRUCT LOOP: ITERATION {state['iteration_count'] + 1} (IDEATE) ---")
+        if self.telemetry.verbose:
+            self.telemetry.log(f"Generated Criteria: {json.dumps(criteria_list, indent=2)}")
 
-        previous_candidate = None
-        evaluation_feedback = None
-        if state["prompt_candidates"]:
-            last_candidate = state["prompt_candidates"][-1]
-            previous_candidate = last_candidate["text"]
-            evaluation_feedback = last_candidate["scores"]
+        return {
+            "evaluation_criteria": criteria_list,
+            "prompt_candidates": [candidates.reset(c["criterion_id"] for c in criteria_list)]
+        }
 
-        new_prompt_obj = self.prompt_ideator.run(
-            original_prompt=state["initial_prompt"],
-            evaluation_criteria=state["evaluation_criteria"],
-            previous_candidate=previous_candidate,
-            evaluation_feedback=evaluation_feedback
-        )
-        if not new_prompt_obj:
+    def _ideation_requests(self, state: AgentState) -> List[dict]:
+        """Returns the `PromptIdeator` arguments for each candidate of this iteration."""
+        self.telemetry.log(f"\n--- CONSTRUCT LOOP: ITERATION {state['iteration_count'] + 1} (IDEATE) ---")
+
+        # Seed each new candidate from the surviving beam, round-robin; the first
+        # iteration has no survivors, so every candidate starts from the original prompt.
+        survivors = self._survivors(state)
+        seeds = [survivors[i % len(survivors)] if survivors else None for i in range(self.population_size)]
+
+        return [{
+            "original_prompt": state["initial_prompt"],
+            "evaluation_criteria": state["evaluation_criteria"],
+            "previous_candidate": seed.text if seed else None,
+            "evaluation_feedback": seed.scores if seed else None
+        } for seed in seeds]
+
+    def _ideate_update(self, state: AgentState, new_prompt_objs: List) -> dict:
+        new_prompt_objs = [obj for obj in new_prompt_objs if obj]
+        if not new_prompt_objs:
             raise ValueError("Failed to generate a new prompt candidate.")
 
-        print(f"Generated new prompt candidate:\n{new_prompt_obj.prompt_text}")
-
-        # Add placeholder for evaluation
-        new_candidates = state["prompt_candidates"] + [{"text": new_prompt_obj.prompt_text,
-                                                        "scores": "",
-                                                        "avg_score": 0.0}]
-
-        return {**state, "prompt_candidates": new_candidates}
-
-    def evaluate(self, state: AgentState) -> AgentState:
-        print(f"--- CONSTRUCT LOOP: ITERATION {state['iteration_count'] + 1} (EVALUATE) ---")
-
-        current_candidate_text = state["prompt_candidates"][-1]["text"]
+        for new_prompt_obj in new_prompt_objs:
+            self.telemetry.log(f"Generated new prompt candidate:\n{new_prompt_obj.prompt_text}")
+
+        # New candidates are added unscored, for evaluation
+        return {"prompt_candidates": [candidates.add(obj.prompt_text, state["iteration_count"])
+                                      for obj in new_prompt_objs]}
+
+    def _pending_candidates(self, state: AgentState) -> List[Candidate]:
+        """Returns the candidates generated in the current iteration."""
+        self.telemetry.log(f"--- CONSTRUCT LOOP: ITERATION {state['iteration_count'] + 1} (EVALUATE) ---")
+        return state["prompt_candidates"].pending(state["iteration_count"])
+
+    def _precheck(self, state: AgentState, pending: List[Candidate]) -> List[Candidate]:
+        """Returns the candidates that pass the cascade's local pre-check."""
+        if self.cascade is None:
+            return pending
+        usable = []
+        for candidate in pending:
+            reason = self.cascade.precheck(candidate.text, state["initial_prompt"])
+            if reason is None:
+                usable.append(candidate)
+                continue
+            self.cascade.record("rejected", None, None)
+            self.telemetry.emit("screening", run_id=state.get("run_id"), outcome="rejected", reason=reason)
+            self.telemetry.log(f"Rejected prompt candidate without evaluation ({reason}).")
+        return usable
+
+    def _finalists(self, state: AgentState, screened: List[Candidate],
+                   screening_objs: List) -> Tuple[List[Candidate], Dict[int, Tuple[Optional[float], str]]]:
+        """Returns the screened candidates that get the full evaluation, and each screened
+        candidate's screening score and cascade role by candidate index."""
+        screening_scores = [self.scorer.score(state["evaluation_criteria"], [r.dict() for r in obj.results])
+                            if obj else None for obj in screening_objs]
+        binary_failures = [len(self.cascade.binary_failures(c.text, state["evaluation_criteria"])) for c in screened]
+        roles = self.cascade.roles([c.text for c in screened], screening_scores, binary_failures)
+        finalists, screening = [], {}
+        for candidate, screening_score, role in zip(screened, screening_scores, roles):
+            screening[candidate.index] = (screening_score, role)
+            if role == "screened_out":
+                self.cascade.record(role, screening_score, None)
+            else:
+                finalists.append(candidate)
+            self.telemetry.emit("screening", run_id=state.get("run_id"), outcome=role,
+                                screening_score=screening_score)
+        self.telemetry.log(f"Screening passed {len(finalists)} of {len(screened)} candidates to the full evaluation.")
+        return finalists, screening
+
+    def _evaluate_update(self, state: AgentState, finalists: List[Candidate], eval_result_objs: List,
+                         screening: Optional[Dict] = None) -> dict:
+        iteration = state["iteration_count"]
         evaluation_criteria = state["evaluation_criteria"]
-
-        eval_result_obj = self.prompt_evaluator.run(current_candidate_text, evaluation_criteria)
-        if not eval_result_obj:
+        screening = screening or {}
+
+        # Candidates whose evaluation failed stay unscored, which drops them from the population.
+        scored = []
+        for candidate, eval_result_obj in zip(finalists, eval_result_objs):
+            scores_list = [r.dict() for r in eval_result_obj.results] if eval_result_obj else None
+            avg_score = self.scorer.score(evaluation_criteria, scores_list) if eval_result_obj else None
+            if candidate.index in screening:
+                screening_score, role = screening[candidate.index]
+                self.cascade.record(role, screening_score, avg_score)
+            if not eval_result_obj:
+                continue
+
+            if self.telemetry.verbose:
+                self.telemetry.log(f"Evaluation results: {json.dumps(scores_list, indent=2)}")
+                self.telemetry.log(f"Normalized Score for this candidate: {avg_score:.2f}")
+
+            scored.append(candidates.score(candidate.index, scores_list, avg_score))
+
+        if finalists and not scored:
             raise ValueError("Failed to evaluate the prompt candidate.")
+        if not finalists:
+            self.telemetry.log("No prompt candidate passed the pre-check in this iteration.")
 
-        scores_list = [r.dict() for r in eval_result_obj.results]
-
-        # Calculate average score
-        total_score = 0
-        max_score = 0
-        for criterion, score_data in zip(evaluation_criteria, scores_list):
-            if criterion['metric_type'] == 'binary':
-                total_score += score_data['score']
-                max_score += 1
-            elif criterion['metric_type'] == 'scale_1_5':
-                total_score += score_data['score']
-                max_score += 5
-
-        avg_score = total_score / max_score if max_score > 0 else 0.0
-
-        print(f"Evaluation results: {json.dumps(scores_list, indent=2)}")
-        print(f"Normalized Score for this iteration: {avg_score:.2f}")
+        return {"prompt_candidates": scored, "iteration_count": iteration + 1}
 
-        # Update the last candidate in the list with its scores
-        updated_candidates = state["prompt_candidates"][:]
-        updated_candidates[-1]["scores"] = scores_list
-        updated_candidates[-1]["avg_score"] = avg_score
-
-        return {**state, "prompt_candidates": updated_candidates, "iteration_count": state["iteration_count"] + 1}
+    @staticmethod
+    def _report_inputs(state: AgentState, text: str, scores: List[dict]) -> dict:
+        return {
+            "initial_prompt": state["initial_prompt"],
+            "user_goal": state["user_goal"],
+            "final_prompt": text,
+            "evaluation_criteria": state["evaluation_criteria"],
+            "final_scores": scores
+        }
 
-    def act(self, state: AgentState) -> AgentState:
-        print("--- PHASE: ACT ---")
+    def _report_request(self, state: AgentState) -> dict:
+        """Selects the best prompt and returns the `ReportGenerator` arguments for it."""
+        self.telemetry.log("--- PHASE: ACT ---")
 
-        # Find the best prompt
-        best_candidate = max(state["prompt_candidates"], key=lambda x: x["avg_score"])
-        final_prompt_text = best_candidate["text"]
-        final_scores = best_candidate["scores"]
+        survivors = self._survivors(state)
+        if not survivors:
+            raise ValueError("No prompt candidate was fully evaluated.")
+        best_candidate = survivors[0]
+        self.telemetry.log(f"Selected best prompt with score {best_candidate.avg_score:.2f}")
 
-        print(f"Selected best prompt with score {best_candidate['avg_score']:.2f}")
+        return self._report_inputs(state, best_candidate.text, best_candidate.scores)
 
-        report_obj = self.report_generator.run(
-            initial_prompt=state["initial_prompt"],
-            user_goal=state["user_goal"],
-            final_prompt=final_prompt_text,
-            evaluation_criteria=state["evaluation_criteria"],
-            final_scores=final_scores
-        )
+    def _act_update(self, state: AgentState, report_obj) -> dict:
         if not report_obj:
             raise ValueError("Failed to generate the final report.")
 
+        if self.telemetry.enabled:
+            trajectory = best_score_history(state)
+            self.telemetry.emit("run", run_id=state.get("run_id"), iterations=state["iteration_count"],
+                                score_trajectory=trajectory, final_score=max(trajectory),
+                                stop_reason=state.get("stop_reason"), llm_calls=state.get("llm_calls", 0),
+                                tokens_used=state.get("tokens_used", 0))
+
         return {
-            **state,
             "final_prompt": report_obj.final_prompt,
             "final_rationale": report_obj.dict()
         }
 
-    # --- Conditional Edge Function ---
-    def decide(self, state: AgentState) -> Literal["ideate", "act"]:
-        print("--- CONSTRUCT LOOP: (DECIDE) ---")
-        iteration_count = state["iteration_count"]
-
-        if iteration_count >= MAX_ITERATIONS:
-            print("Decision: Max iterations reached. Proceeding to Act.")
-            return "act"
-
-        current_score = state["prompt_candidates"][-1]["avg_score"]
-        if current_score >= QUALITY_THRESHOLD:
-            print(f"Decision: Quality threshold ({QUALITY_THRESHOLD}) met. Proceeding to Act.")
-            return "act"
+    # --- Node Functions ---
+    def recall(self, state: AgentState) -> dict:
+        """Reuses the rubric of an indexed, similar run, if there is one."""
+        match = self.rubric_index.lookup(state["initial_prompt"], state["user_goal"])
+        if match is None:
+            return {"rubric_source": None}
+
+        self.telemetry.log(f"--- PHASE: RECALL --- Reusing rubric {match['id']} "
+                           f"(similarity {match['similarity']:.2f}); skipping Orient and Refine.")
+        self.telemetry.emit("rubric_reused", run_id=state.get("run_id"), entry_id=match["id"],
+                            similarity=match["similarity"])
+        return {
+            "decomposed_goals": match["decomposed_goals"],
+            "evaluation_criteria": match["evaluation_criteria"],
+            "iteration_count": 0,
+            "prompt_candidates": [candidates.reset(c["criterion_id"] for c in match["evaluation_criteria"])],
+            "rubric_source": {"entry_id": match["id"], "similarity": match["similarity"]}
+        }
 
-        print("Decision: Continuing to next iteration.")
-        return "ideate"
+    def orient(self, state: AgentState) -> dict:
+        self.telemetry.log("--- PHASE: ORIENT ---")
+        return self._orient_update(state, self.goal_decomposer.run(state["initial_prompt"], state["user_goal"]))
+
+    def _index_rubric(self, state: AgentState, update: dict) -> None:
+        if self.rubric_index is not None:
+            self.rubric_index.add(state["initial_prompt"], state["user_goal"], state["decomposed_goals"],
+                                  update["evaluation_criteria"])
+
+    def refine(self, state: AgentState) -> dict:
+        self.telemetry.log("--- PHASE: REFINE ---")
+        update = self._refine_update(state, self.criteria_generator.run(state["decomposed_goals"]))
+        self._index_rubric(state, update)
+        return update
+
+    def ideate(self, state: AgentState) -> dict:
+        requests = self._ideation_requests(state)
+        return self._ideate_update(state, fan_out(lambda kwargs: self.prompt_ideator.run(**kwargs), requests))
+
+    def evaluate(self, state: AgentState) -> dict:
+        criteria = state["evaluation_criteria"]
+        finalists = self._precheck(state, self._pending_candidates(state))
+        screening = None
+        if self.prompt_screener is not None and finalists:
+            screening_objs = fan_out(lambda candidate: self.prompt_screener.run(candidate.text, criteria), finalists)
+            finalists, screening = self._finalists(state, finalists, screening_objs)
+        eval_result_objs = fan_out(lambda candidate: self.prompt_evaluator.run(candidate.text, criteria), finalists)
+        update = self._evaluate_update(state, finalists, eval_result_objs, screening)
+
+        request = self._speculation_request(state, update)
+        if request is not None:
+            if self._speculation_pool is None:
+                self._speculation_pool = ThreadPoolExecutor(max_workers=SPECULATION_WORKERS)
+            self._replace_speculation(state.get("run_id"), request,
+                                      self._speculation_pool.submit(self._speculative_report, request))
+        return update
+
+    def act(self, state: AgentState) -> dict:
+        request = self._report_request(state)
+        report_obj = None
+        job = self._take_speculation(state.get("run_id"), request) if self.speculative_report else None
+        if job is not None:
+            try:
+                report_obj = self._use_speculation(*job.result())
+            except CancelledError:
+                pass
+        if report_obj is None:
+            report_obj = self.report_generator.run(**request)
+        return self._act_update(state, report_obj)
+
+    # --- Async Node Functions ---
+    async def arecall(self, state: AgentState) -> dict:
+        # The lookup is NumPy work and may wait on the index lock while another run writes the
+        # index file, so it runs on a thread rather than blocking the event loop.
+        return await asyncio.to_thread(self.recall, state)
+
+    async def aorient(self, state: AgentState) -> dict:
+        self.telemetry.log("--- PHASE: ORIENT ---")
+        return self._orient_update(
+            state, await self.goal_decomposer.arun(state["initial_prompt"], state["user_goal"]))
+
+    async def arefine(self, state: AgentState) -> dict:
+        self.telemetry.log("--- PHASE: REFINE ---")
+        update = self._refine_update(state, await self.criteria_generator.arun(state["decomposed_goals"]))
+        await asyncio.to_thread(self._index_rubric, state, update)
+        return update
+
+    async def aideate(self, state: AgentState) -> dict:
+        requests = self._ideation_requests(state)
+        new_prompt_objs = await asyncio.gather(*(self.prompt_ideator.arun(**kwargs) for kwargs in requests))
+        return self._ideate_update(state, list(new_prompt_objs))
+
+    async def aevaluate(self, state: AgentState) -> dict:
+        criteria = state["evaluation_criteria"]
+        finalists = self._precheck(state, self._pending_candidates(state))
+        screening = None
+        if self.prompt_screener is not None and finalists:
+            screening_objs = await asyncio.gather(
+                *(self.prompt_screener.arun(candidate.text, criteria) for candidate in finalists))
+            finalists, screening = self._finalists(state, finalists, list(screening_objs))
+        eval_result_objs = await asyncio.gather(
+            *(self.prompt_evaluator.arun(candidate.text, criteria) for candidate in finalists))
+        update = self._evaluate_update(state, finalists, list(eval_result_objs), screening)
+
+        request = self._speculation_request(state, update)
+        if request is not None:
+            self._replace_speculation(state.get("run_id"), request,
+                                      asyncio.create_task(self._aspeculative_report(request)))
+        return update
+
+    async def aact(self, state: AgentState) -> dict:
+        request = self._report_request(state)
+        report_obj = None
+        task = self._take_speculation(state.get("run_id"), request) if self.speculative_report else None
+        if task is not None:
+            try:
+                report_obj = self._use_speculation(*await task)
+            except asyncio.CancelledError:
+                if not task.cancelled():
+                    raise  # This node itself is being cancelled.
+        if report_obj is None:
+            report_obj = await self.report_generator.arun(**request)
+        return self._act_update(state, report_obj)
+
+    # --- Speculative Reports ---
+    # With `speculative_report`, every new best candidate found by evaluate gets its final
+    # report generated in the background, so act can usually return it without another
+    # LLM round-trip. A speculation is cancelled once a better candidate supersedes it.
+    # A thread cannot be interrupted, so in the sync graph a speculation that has already
+    # started runs to completion and its report is discarded; SPECULATION_WORKERS bounds how
+    # many can do so at once. Its LLM calls count towards the run's budget only if act uses it.
+    def _speculation_request(self, state: AgentState, update: dict) -> Optional[dict]:
+        """Returns the report request for the new best candidate, or None if the best is unchanged."""
+        if not self.speculative_report:
+            return None
+        store, criteria = state["prompt_candidates"], state["evaluation_criteria"]
+        # Rank the new scores alongside the store rather than applying them, which would
+        # extend the shared log ahead of the reducer and force it to copy the log.
+        new_scores = {op["index"]: op["scores"] for op in update["prompt_candidates"]}
+        before = self.scorer.rank(store, criteria)[:1]
+        after = self.scorer.rank(store, criteria, update["prompt_candidates"])[:1]
+        if not len(after) or (len(before) and before[0] == after[0]):
+            return None
+        best = store[int(after[0])]
+        scores = store.recorded_scores(new_scores[best.index]) if best.index in new_scores else best.scores
+        return self._report_inputs(state, best.text, scores)
+
+    def _cancel_speculation(self, run_id: Optional[str], job) -> None:
+        # `cancel` fails for a thread that is already running or a job that has finished; its
+        # report is then discarded, but its LLM calls were still made.
+        self.telemetry.emit("speculation", run_id=run_id, outcome="superseded" if job.cancel() else "discarded")
+
+    def _replace_speculation(self, run_id: Optional[str], request: dict, job) -> None:
+        with self._speculations_lock:
+            superseded = [self._speculations.pop(run_id, None)]
+            self._speculations[run_id] = (request, job)
+            # Runs that failed before act never collect their speculation.
+            while len(self._speculations) > MAX_PENDING_SPECULATIONS:
+                superseded.append(self._speculations.popitem(last=False)[1])
+        for entry in superseded:
+            if entry is not None:
+                self._cancel_speculation(run_id, entry[1])
+        self.telemetry.emit("speculation", run_id=run_id, outcome="started")
+
+    def _take_speculation(self, run_id: Optional[str], request: dict):
+        """Returns the pending speculation for `request`, cancelling one for another candidate."""
+        with self._speculations_lock:
+            entry = self._speculations.pop(run_id, None)
+        if entry is None:
+            return None
+        speculated_request, job = entry
+        if speculated_request != request:
+            self._cancel_speculation(run_id, job)
+            return None
+        return job
+
+    def _use_speculation(self, report_obj, usage: dict):
+        self.telemetry.emit("speculation", outcome="used" if report_obj else "failed")
+        if report_obj:
+            charge_usage(usage)
+        return report_obj
+
+    def _speculative_report(self, request: dict):
+        with self.telemetry.tagged(speculative=True), track_usage() as usage:
+            return self.report_generator.run(**request), usage
+
+    async def _aspeculative_report(self, request: dict):
+        with self.telemetry.tagged(speculative=True), track_usage() as usage:
+            return await self.report_generator.arun(**request), usage
+
+    # --- Decide Node and Conditional Edge ---
+    def decide(self, state: AgentState, config: "Optional[RunnableConfig]" = None) -> dict:
+        """Applies the run's stopping policy and records why the loop stops, if it does."""
+        self.telemetry.log("--- CONSTRUCT LOOP: (DECIDE) ---")
+
+        beam = self._survivors(state)
+        self.telemetry.log(f"Surviving beam scores: {[round(c.avg_score, 2) for c in beam]}")
+
+        policy = (config or {}).get("configurable", {}).get("stopping_policy") or self.stopping_policy
+        stop_reason = policy.check(state) or self.iteration_cap.check(state)
+        if stop_reason:
+            self.telemetry.log(f"Decision: {stop_reason} Proceeding to Act.")
+        else:
+            self.telemetry.log("Decision: Continuing to next iteration.")
+
+        return {"stop_reason": stop_reason}
+
+    @staticmethod
+    def route(state: AgentState) -> Literal["ideate", "act"]:
+        return "act" if state.get("stop_reason") else "ideate"
+
+    @staticmethod
+    def route_after_recall(state: AgentState) -> Literal["orient", "ideate"]:
+        return "ideate" if state.get("rubric_source") else "orient"
+
+    def _instrument(self, name: str, node):
+        """Wraps a node to add its LLM calls and tokens to the run's totals and, when
+        telemetry is enabled, emit its wall time as a `node` event."""
+        accepts_config = "config" in inspect.signature(node).parameters
+
+        def with_usage(state: AgentState, update: dict, usage: dict) -> dict:
+            return {**update,
+                    "llm_calls": state.get("llm_calls", 0) + usage["calls"],
+                    "tokens_used": state.get("tokens_used", 0) + usage["tokens"]}
+
+        if asyncio.iscoroutinefunction(node):
+            async def instrumented_node(state: AgentState, config: "RunnableConfig") -> dict:
+                with self.telemetry.span("node", node=name, run_id=state.get("run_id")), track_usage() as usage:
+                    update = await (node(state, config) if accepts_config else node(state))
+                return with_usage(state, update, usage)
+        else:
+            def instrumented_node(state: AgentState, config: "RunnableConfig") -> dict:
+                with self.telemetry.span("node", node=name, run_id=state.get("run_id")), track_usage() as usage:
+                    update = node(state, config) if accepts_config else node(state)
+                return with_usage(state, update, usage)
+        return instrumented_node
+
+    def _build_graph(self, nodes: dict, checkpointer=None) -> "StateGraph":
+        from langgraph.graph import END, StateGraph
 
-    def get_graph(self) -> StateGraph:
-        """Builds and returns the LangGraph StateGraph."""
         workflow = StateGraph(AgentState)
 
         # Add nodes
-        workflow.add_node("orient", self.orient)
-        workflow.add_node("refine", self.refine)
-        workflow.add_node("ideate", self.ideate)
-        workflow.add_node("evaluate", self.evaluate)
-        workflow.add_node("act", self.act)
+        for name, node in nodes.items():
+            workflow.add_node(name, self._instrument(name, node))
 
         # Define edges
-        workflow.set_entry_point("orient")
+        if "recall" in nodes:
+            workflow.set_entry_point("recall")
+            workflow.add_conditional_edges(
+                "recall",
+                self.route_after_recall,
+                {
+                    "orient": "orient",
+                    "ideate": "ideate"
+                }
+            )
+        else:
+            workflow.set_entry_point("orient")
         workflow.add_edge("orient", "refine")
         workflow.add_edge("refine", "ideate")
 
         # The construct loop
         workflow.add_edge("ideate", "evaluate")
+        workflow.add_edge("evaluate", "decide")
         workflow.add_conditional_edges(
-            "evaluate",
-            self.decide,
+            "decide",
+            self.route,
             {
                 "ideate": "ideate",
                 "act": "act"
@@ -192,4 +546,36 @@ class OrcaAgent:
 
         workflow.add_edge("act", END)
 
-        return workflow.compile()
+        return workflow.compile(checkpointer=checkpointer)
+
+    def get_graph(self, checkpointer=None) -> "StateGraph":
+        """Builds and returns the LangGraph StateGraph.
+
+        With a `checkpointer` (see `checkpoints.open_checkpointer`), the state is persisted after
+        every node under the run's `thread_id`, so a failed run can be resumed from its last
+        completed node with `checkpoints.resume`.
+        """
+        return self._build_graph({
+            **({"recall": self.recall} if self.rubric_index is not None else {}),
+            "orient": self.orient,
+            "refine": self.refine,
+            "ideate": self.ideate,
+            "evaluate": self.evaluate,
+            "decide": self.decide,
+            "act": self.act
+        }, checkpointer)
+
+    def get_async_graph(self, checkpointer=None) -> "StateGraph":
+        """Builds the StateGraph from the async nodes, for use with `app.ainvoke`/`app.astream`.
+
+        `checkpointer` must be async-capable, e.g. from `checkpoints.open_async_checkpointer`.
+        """
+        return self._build_graph({
+            **({"recall": self.arecall} if self.rubric_index is not None else {}),
+            "orient": self.aorient,
+            "refine": self.arefine,
+            "ideate": self.aideate,
+            "evaluate": self.aevaluate,
+            "decide": self.decide,
+            "act": self.aact
+        }, checkpointer)
@@ -0,0 +1,303 @@
+"""Batch runner: optimizes a stream of prompts from JSONL and writes one result line per job.
+
+Each input line is a JSON object with `initial_prompt` and `user_goal`, plus an optional `id`
+and an optional `stopping` policy spec (see `stopping.policy_from_spec`). A malformed line
+gets an `{"id", "line", "error"}` result and does not stop the batch.
+Jobs are read lazily, run through the async graph by a bounded pool of workers, and each
+result is written and flushed as soon as its job finishes, so memory stays flat for any
+input size. Re-running against an existing output file skips jobs that already succeeded, and
+with `--checkpoint-db` jobs that failed part-way continue from their last completed node.
+
+Usage:
+    python batch.py --input jobs.jsonl --output results.jsonl --concurrency 16
+    cat jobs.jsonl | python batch.py --output results.jsonl --processes 4
+"""
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from typing import Iterable, Iterator, Optional, Set, TextIO
+
+from checkpoints import open_async_checkpointer, run_config
+from state import initial_state
+from stopping import policy_from_spec
+
+# --- Configuration ---
+DEFAULT_CONCURRENCY = 8
+
+
+def job_id(job: dict) -> str:
+    """Returns the job's explicit `id`, or a stable hash of its inputs."""
+    if job.get("id") is not None:
+        return str(job["id"])
+    digest = hashlib.sha256(f"{job['initial_prompt']}\0{job['user_goal']}".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def parse_job(line: str) -> dict:
+    """Parses and validates one input line. Raises ValueError for a malformed job."""
+    job = json.loads(line)
+    if not isinstance(job, dict):
+        raise ValueError("A job must be a JSON object.")
+    for key in ("initial_prompt", "user_goal"):
+        if not isinstance(job.get(key), str) or not job[key].strip():
+            raise ValueError(f"'{key}' must be a non-empty string.")
+    job["id"] = job_id(job)
+    return job
+
+
+def completed_job_ids(path: str) -> Set[str]:
+    """Returns the ids of jobs that already have a successful result in `path`."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # A line truncated by an interrupted run; the job is redone.
+            if "final_rationale" in record:
+                done.add(record["id"])
+    return done
+
+
+def read_jobs(lines: Iterable[str], skip_ids: Set[str] = frozenset(), shard_index: int = 0,
+              num_shards: int = 1) -> Iterator[dict]:
+    """Lazily parses jobs, keeping only this shard's lines and skipping completed ids.
+
+    A malformed line is yielded as an `{"id", "line", "error"}` record instead, with the
+    1-based line number and the job's `id` if it has one, so one bad line fails only itself.
+    """
+    for line_number, line in enumerate(lines):
+        if line_number % num_shards != shard_index or not line.strip():
+            continue
+        try:
+            job = parse_job(line)
+        except ValueError as e:  # Including json.JSONDecodeError
+            explicit_id = None
+            with contextlib.suppress(ValueError, AttributeError):
+                explicit_id = json.loads(line).get("id")
+            yield {"id": None if explicit_id is None else str(explicit_id), "line": line_number + 1,
+                   "error": f"{type(e).__name__}: {e}"}
+            continue
+        if job["id"] not in skip_ids:
+            yield job
+
+
+async def run_batch(app, jobs: Iterator[dict], output: TextIO, concurrency: int = DEFAULT_CONCURRENCY,
+                    stopping: Optional[dict] = None) -> int:
+    """Runs `jobs` through the compiled async graph `app`, writing each result as it completes.
+
+    At most `concurrency` jobs are in flight and at most as many more are buffered, so the
+    input is never read ahead of the workers. `stopping` is the default policy spec for jobs
+    without their own. Returns the number of failed jobs.
+    """
+    queue = asyncio.Queue(maxsize=concurrency)
+    failures = 0
+
+    async def produce():
+        while True:
+            # The input may be a slow pipe, so lines are read off the event loop.
+            job = await asyncio.to_thread(next, jobs, None)
+            if job is None:
+                break
+            await queue.put(job)
+
+    async def finish():
+        for _ in range(concurrency):
+            await queue.put(None)
+        await asyncio.gather(*workers)
+
+    async def work():
+        nonlocal failures
+        while (job := await queue.get()) is not None:
+            if "error" in job:  # A malformed input line
+                failures += 1
+                output.write(json.dumps(job) + "\n")
+                output.flush()
+                continue
+            record = {"id": job["id"], "initial_prompt": job["initial_prompt"], "user_goal": job["user_goal"]}
+            try:
+                config = {}
+                if job.get("stopping") or stopping:
+                    config["configurable"] = {"stopping_policy": policy_from_spec(job.get("stopping") or stopping)}
+                state = initial_state(job["initial_prompt"], job["user_goal"], run_id=job["id"])
+                if app.checkpointer is not None:
+                    config = run_config(job["id"], config)
+                    if (await app.aget_state(config)).next:
+                        state = None  # A checkpointed attempt failed part-way; continue it.
+                        await app.aupdate_state(config, {"started_at": time.time()})
+                final_state = await app.ainvoke(state, config=config)
+                record["final_rationale"] = final_state["final_rationale"]
+                record["stop_reason"] = final_state["stop_reason"]
+            except Exception as e:
+                failures += 1
+                record["error"] = f"{type(e).__name__}: {e}"
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+
+    workers = [asyncio.create_task(work()) for _ in range(concurrency)]
+    try:
+        await produce()
+    except Exception:
+        # Reading the input failed (e.g. on an undecodable byte). Jobs already read still
+        # finish and are written before the error propagates.
+        await finish()
+        raise
+    except BaseException:
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        raise
+    await finish()
+    return failures
+
+
+def _run_shard(args: argparse.Namespace, shard_index: int, num_shards: int, output_path: Optional[str]) -> int:
+    from agents import OrcaAgent
+    from cache import open_cache
+    from main import create_models
+    from rubric_index import RubricIndex
+    from scheduler import LLMScheduler, set_scheduler
+    from scoring import scorer_from_spec
+    from telemetry import JsonlSink, Telemetry
+
+    # Provider quotas are shared by all worker processes, so each gets an equal slice.
+    set_scheduler(LLMScheduler(
+        requests_per_minute=args.requests_per_minute / num_shards if args.requests_per_minute else None,
+        tokens_per_minute=args.tokens_per_minute / num_shards if args.tokens_per_minute else None,
+        max_concurrency=args.max_concurrent_llm_calls, hedge_percentile=args.hedge_percentile))
+    cache = open_cache(args.cache_db) if args.cache_db else None
+    rubric_index = None
+    if args.rubric_index:
+        # Eviction rewrites the index file from one process's entries, so each shard has its own.
+        rubric_index = RubricIndex(args.rubric_index if num_shards == 1 else f"{args.rubric_index}.{shard_index}",
+                                   threshold=args.similarity_threshold)
+    sink = None
+    if args.metrics_jsonl:
+        sink = JsonlSink(args.metrics_jsonl if num_shards == 1 else f"{args.metrics_jsonl}.{shard_index}")
+    agent = OrcaAgent(**create_models(args), population_size=args.population_size,
+                    beam_width=args.beam_width, max_iterations=args.max_iterations, cache=cache,
+                    evaluation_shard_size=args.evaluation_shard_size,
+                    speculative_report=args.speculative_report, rubric_index=rubric_index,
+                    scorer=scorer_from_spec(json.loads(args.scoring)) if args.scoring else None,
+                    telemetry=Telemetry(sink, verbose=args.verbose))
+    skip_ids = completed_job_ids(output_path) if output_path and args.resume else set()
+
+    with contextlib.ExitStack() as stack:
+        source = sys.stdin if args.input == "-" else stack.enter_context(open(args.input, encoding="utf-8"))
+        if output_path:
+            output = stack.enter_context(open(output_path, "a" if args.resume else "w", encoding="utf-8"))
+        else:
+            output = sys.stdout
+        # The agent's progress printing goes to stderr so stdout carries only results.
+        stack.enter_context(contextlib.redirect_stdout(sys.stderr))
+
+        jobs = read_jobs(source, skip_ids, shard_index, num_shards)
+        stopping = json.loads(args.stopping) if args.stopping else None
+
+        async def run() -> int:
+            if not args.checkpoint_db:
+                return await run_batch(agent.get_async_graph(), jobs, output, args.concurrency, stopping)
+            checkpoint_db = args.checkpoint_db if num_shards == 1 else f"{args.checkpoint_db}.{shard_index}"
+            async with open_async_checkpointer(checkpoint_db) as checkpointer:
+                app = agent.get_async_graph(checkpointer=checkpointer)
+                return await run_batch(app, jobs, output, args.concurrency, stopping)
+
+        failures = asyncio.run(run())
+        if agent.cascade is not None:
+            print(f"Screening: {json.dumps(agent.cascade.summary())}")
+        return failures
+
+
+def _shard_process(args: argparse.Namespace, shard_index: int) -> None:
+    output_path = f"{args.output}.{shard_index}-of-{args.processes}"
+    sys.exit(1 if _run_shard(args, shard_index, args.processes, output_path) else 0)
+
+
+def main(argv=None) -> int:
+    from agents import MAX_ITERATIONS
+    from main import add_model_arguments
+
+    parser = argparse.ArgumentParser(description="Run ORCA over a JSONL file of prompt optimization jobs.")
+    parser.add_argument("--input", default="-", help="Input JSONL file, or '-' for stdin (default).")
+    parser.add_argument("--output", default="-", help="Output JSONL file, or '-' for stdout (default).")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="Jobs run concurrently per process.")
+    parser.add_argument("--resume", action="store_true",
+                        help="Append to the output file, skipping jobs that already succeeded.")
+    parser.add_argument("--shard-index", type=int, default=0, help="Run only this shard of the input lines.")
+    parser.add_argument("--num-shards", type=int, default=1, help="Total number of shards.")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="Shard the input across this many worker processes, each writing "
+                             "OUTPUT.<i>-of-<n>. Requires a file --output.")
+    parser.add_argument("--requests-per-minute", type=float, help="Provider request quota, split across shards.")
+    parser.add_argument("--tokens-per-minute", type=float,
+                        help="Provider token quota (estimated tokens), split across shards.")
+    parser.add_argument("--max-concurrent-llm-calls", type=int, default=32,
+                        help="Ceiling of the adaptive limit on in-flight LLM calls per process.")
+    parser.add_argument("--hedge-percentile", type=float,
+                        help="Send a duplicate of any LLM call slower than this latency percentile.")
+    parser.add_argument("--population-size", type=int, default=1)
+    parser.add_argument("--beam-width", type=int, default=1)
+    parser.add_argument("--evaluation-shard-size", type=int,
+                        help="Score criteria in concurrent calls of this many criteria each.")
+    parser.add_argument("--speculative-report", action="store_true",
+                        help="Generate the final report in the background whenever a new best candidate appears.")
+    parser.add_argument("--max-iterations", type=int, default=MAX_ITERATIONS,
+                        help="Hard cap on the iterations of every job, whatever its stopping policy.")
+    parser.add_argument("--stopping", help="Default stopping policy spec as JSON, e.g. "
+                                           "'{\"max_iterations\": 4, \"plateau\": {\"window\": 1}}'.")
+    parser.add_argument("--scoring", help="Scoring spec as JSON (see `scoring.scorer_from_spec`), e.g. "
+                                          "'{\"selection\": \"pareto\", \"weights\": {\"criterion_1\": 2}}'.")
+    parser.add_argument("--cache-db", help="SQLite file for the LLM response cache; replays of identical "
+                                           "tool calls are then served from disk.")
+    parser.add_argument("--checkpoint-db", help="SQLite file to checkpoint every job in after each node; jobs "
+                                                "that failed part-way continue from their last completed node "
+                                                "when the batch is re-run.")
+    parser.add_argument("--rubric-index", help="JSONL file of generated rubrics; similar jobs reuse them and "
+                                               "skip the Orient and Refine phases. Each shard uses its own "
+                                               "file, suffixed with .N.")
+    parser.add_argument("--similarity-threshold", type=float, default=0.9,
+                        help="Minimum similarity for a job to reuse an indexed rubric.")
+    parser.add_argument("--metrics-jsonl", help="Append node/LLM-call/run telemetry events to this JSONL file.")
+    parser.add_argument("--verbose", action="store_true", help="Print agent progress to stderr.")
+    add_model_arguments(parser)
+    args = parser.parse_args(argv)
+
+    if args.stopping:
+        try:
+            policy_from_spec(json.loads(args.stopping))
+        except ValueError as e:
+            parser.error(f"Invalid --stopping: {e}")
+    if args.scoring:
+        from scoring import scorer_from_spec
+
+        try:
+            scorer_from_spec(json.loads(args.scoring))
+        except ValueError as e:  # Including json.JSONDecodeError
+            parser.error(f"Invalid --scoring: {e}")
+    if args.resume and args.output == "-":
+        parser.error("--resume requires a file --output.")
+    if args.processes > 1:
+        if args.output == "-" or args.input == "-":
+            parser.error("--processes requires file --input and --output.")
+        workers = [multiprocessing.Process(target=_shard_process, args=(args, i)) for i in range(args.processes)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return 1 if any(worker.exitcode for worker in workers) else 0
+
+    output_path = None if args.output == "-" else args.output
+    return 1 if _run_shard(args, args.shard_index, args.num_shards, output_path) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,199 @@
+"""Offline benchmark of ORCA's execution modes against the deterministic `FakeChatModel`.
+
+Three scenarios are measured:
+- `single`: runs one after another through the sync graph, streamed to also time the first
+  scored candidate.
+- `concurrent`: runs driven concurrently through the async graph on one event loop.
+- `overhead`: the sync graph against a zero-latency model, so node times are pure ORCA,
+  LangGraph and serialization cost rather than LLM time.
+
+Usage:
+    python benchmark.py --runs 20 --concurrency 16 --latency-ms 200 --population-size 4
+"""
+import argparse
+import asyncio
+import json
+import math
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+from agents import OrcaAgent
+from fake_llm import FakeChatModel
+from scheduler import LLMScheduler, get_scheduler, set_scheduler
+from state import initial_state
+from streaming import CandidateScored, stream
+from telemetry import InMemorySink, Telemetry
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile, `q` in [0, 100]."""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _build(args: argparse.Namespace, latency_seconds: float):
+    model = FakeChatModel(seed=args.seed, latency_seconds=latency_seconds, latency_sigma=args.latency_sigma,
+                          failure_rate=args.failure_rate, throttle_rate=args.throttle_rate,
+                          capacity=args.capacity)
+    # Each scenario starts from a fresh scheduler, so adaptive state does not carry over.
+    set_scheduler(LLMScheduler(requests_per_minute=args.requests_per_minute, max_concurrency=args.max_concurrency,
+                               hedge_percentile=args.hedge_percentile))
+    sink = InMemorySink()
+    tool_llms = {}
+    if args.screener_latency_ms is not None:
+        tool_llms["prompt_screener"] = FakeChatModel(seed=args.seed + 1, model="fake-orca-screener",
+                                                     latency_seconds=latency_seconds and args.screener_latency_ms / 1000,
+                                                     latency_sigma=args.latency_sigma)
+    agent = OrcaAgent(model, population_size=args.population_size, beam_width=args.beam_width,
+                      evaluation_shard_size=args.evaluation_shard_size, telemetry=Telemetry(sink),
+                      tool_llms=tool_llms)
+    return agent, model, sink
+
+
+def _summary(latencies: List[float], wall_seconds: float, agent: OrcaAgent, model: FakeChatModel,
+             runs: int) -> Dict:
+    stats = get_scheduler().stats()
+    # The screener runs on its own model, whose calls count as much as the main model's.
+    screener_model_calls = 0 if agent.prompt_screener is None else sum(agent.prompt_screener.llm.calls.values())
+    summary = {
+        "runs": runs,
+        "failed_runs": runs - len(latencies),
+        "runs_per_second": runs / wall_seconds,
+        "p50_seconds": percentile(latencies, 50) if latencies else None,
+        "p95_seconds": percentile(latencies, 95) if latencies else None,
+        "p99_seconds": percentile(latencies, 99) if latencies else None,
+        "llm_calls_per_run": (sum(model.calls.values()) + screener_model_calls) / runs,
+        "retries": stats["retries"] + stats["parse_retries"],
+        "throttles": stats["throttles"],
+        "hedges": stats["hedges"],
+        "hedge_wins": stats["hedge_wins"],
+        "final_concurrency_limit": stats["concurrency_limit"],
+        "evaluator_calls_per_run": agent.prompt_evaluator.usage["calls"] / runs,
+    }
+    if agent.prompt_screener is not None:
+        screening = agent.cascade.summary()
+        outcomes = screening["outcomes"]
+        summary["main_model_calls_per_run"] = sum(model.calls.values()) / runs
+        summary["screener_model_calls_per_run"] = screener_model_calls / runs
+        summary["screener_calls_per_run"] = agent.prompt_screener.usage["calls"] / runs
+        summary["screened_out_share"] = outcomes.get("screened_out", 0) / max(1, sum(outcomes.values()))
+        summary["screening_agreement"] = screening["agreement"]
+        summary["suggested_cutoff"] = screening["suggested_cutoff"]
+    return summary
+
+
+def bench_single(args: argparse.Namespace) -> Dict:
+    agent, model, _ = _build(args, args.latency_ms / 1000)
+    app = agent.get_graph()
+    latencies = []
+    first_candidate_latencies = []
+    wall_start = time.perf_counter()
+    for i in range(args.runs):
+        start = time.perf_counter()
+        first_candidate = None
+        try:
+            for event in stream(app, initial_state(f"Benchmark prompt {i}.", "Benchmark goal.")):
+                if first_candidate is None and isinstance(event, CandidateScored):
+                    first_candidate = time.perf_counter() - start
+        except ValueError:
+            continue
+        latencies.append(time.perf_counter() - start)
+        first_candidate_latencies.append(first_candidate)
+    summary = _summary(latencies, time.perf_counter() - wall_start, agent, model, args.runs)
+    if first_candidate_latencies:
+        summary["p50_first_candidate_seconds"] = percentile(first_candidate_latencies, 50)
+    return summary
+
+
+def bench_concurrent(args: argparse.Namespace) -> Dict:
+    agent, model, _ = _build(args, args.latency_ms / 1000)
+    app = agent.get_async_graph()
+    latencies = []
+
+    async def run_all():
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def run_one(i: int):
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    await app.ainvoke(initial_state(f"Benchmark prompt {i}.", "Benchmark goal."))
+                except ValueError:
+                    return
+                latencies.append(time.perf_counter() - start)
+
+        await asyncio.gather(*(run_one(i) for i in range(args.runs)))
+
+    wall_start = time.perf_counter()
+    asyncio.run(run_all())
+    return _summary(latencies, time.perf_counter() - wall_start, agent, model, args.runs)
+
+
+def bench_overhead(args: argparse.Namespace) -> Dict:
+    agent, _, sink = _build(args, 0.0)
+    app = agent.get_graph()
+    run_seconds = []
+    for i in range(args.runs):
+        start = time.perf_counter()
+        app.invoke(initial_state(f"Benchmark prompt {i}.", "Benchmark goal."))
+        run_seconds.append(time.perf_counter() - start)
+
+    node_seconds = defaultdict(list)
+    for event in sink.events:
+        if event["event"] == "node":
+            node_seconds[event["node"]].append(event["seconds"])
+    total_node_seconds = sum(sum(v) for v in node_seconds.values())
+    return {
+        "node_mean_microseconds": {node: 1e6 * sum(v) / len(v) for node, v in node_seconds.items()},
+        "run_mean_microseconds": 1e6 * sum(run_seconds) / len(run_seconds),
+        "graph_overhead_per_run_microseconds": 1e6 * (sum(run_seconds) - total_node_seconds) / len(run_seconds),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark ORCA against a fake LLM backend.")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, default=100.0, help="Median simulated LLM latency.")
+    parser.add_argument("--latency-sigma", type=float, default=0.3, help="Log-normal shape of LLM latency.")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Probability of a simulated 429.")
+    parser.add_argument("--capacity", type=int, help="Simulated provider capacity; calls beyond it get a 429.")
+    parser.add_argument("--max-concurrency", type=int, default=32, help="Ceiling of the adaptive LLM call limit.")
+    parser.add_argument("--requests-per-minute", type=float)
+    parser.add_argument("--hedge-percentile", type=float, help="Hedge calls slower than this latency percentile.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--population-size", type=int, default=1)
+    parser.add_argument("--beam-width", type=int, default=1)
+    parser.add_argument("--evaluation-shard-size", type=int)
+    parser.add_argument("--screener-latency-ms", type=float,
+                        help="Screen candidates with a second fake model of this median latency first.")
+    parser.add_argument("--scenarios", default="single,concurrent,overhead")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+    args = parser.parse_args(argv)
+
+    benchmarks = {"single": bench_single, "concurrent": bench_concurrent, "overhead": bench_overhead}
+    results = {name: benchmarks[name](args) for name in args.scenarios.split(",")}
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+        return 0
+    for name, result in results.items():
+        print(f"--- {name.upper()} ---")
+        for key, value in result.items():
+            if isinstance(value, dict):
+                for sub_key, sub_value in value.items():
+                    print(f"  {key}[{sub_key}]: {sub_value:.1f}")
+            elif isinstance(value, float):
+                print(f"  {key}: {value:.4f}")
+            else:
+                print(f"  {key}: {value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+"""Content-addressed cache for structured LLM responses.
+
+Entries are keyed by a hash of the model identity, the calling tool, the rendered prompt and
+the output schema, so any change to one of them is a miss. Values are the parsed responses in
+their `.dict()` form.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from pydantic import BaseModel
+
+# --- Configuration ---
+MEMORY_CACHE_ENTRIES = 1024
+DISK_CACHE_ENTRIES = 100_000
+DISK_CACHE_TTL_SECONDS = 30 * 24 * 3600
+DISK_EVICTION_INTERVAL = 100  # Writes between expiry/size eviction passes
+
+
+def model_identity(llm) -> Dict:
+    """Returns the attributes of a chat model that determine its responses."""
+    return {
+        "class": f"{type(llm).__module__}.{type(llm).__qualname__}",
+        "model": getattr(llm, "model", None) or getattr(llm, "model_name", None),
+        "temperature": getattr(llm, "temperature", None),
+    }
+
+
+def cache_key(llm, tool_name: str, prompt: str, pydantic_model: BaseModel) -> str:
+    if hasattr(pydantic_model, "model_json_schema"):
+        schema = pydantic_model.model_json_schema()
+    else:
+        schema = pydantic_model.schema()
+    payload = json.dumps([model_identity(llm), tool_name, prompt, schema], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """Base class for cache tiers. Subclasses implement `_get` and `_set`."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Dict]:
+        value = self._get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: Dict) -> None:
+        self._set(key, value)
+
+    def stats(self) -> Dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+    def _get(self, key: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def _set(self, key: str, value: Dict) -> None:
+        raise NotImplementedError
+
+
+class MemoryCache(LLMCache):
+    """In-process LRU tier."""
+
+    def __init__(self, max_entries: int = MEMORY_CACHE_ENTRIES):
+        super().__init__()
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def _set(self, key: str, value: Dict) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class SQLiteCache(LLMCache):
+    """Persistent tier with a time-to-live and least-recently-used eviction past `max_entries`."""
+
+    def __init__(self, path: str, ttl_seconds: Optional[float] = DISK_CACHE_TTL_SECONDS,
+                 max_entries: int = DISK_CACHE_ENTRIES):
+        super().__init__()
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed_at)")
+        self._conn.commit()
+
+    def _get(self, key: str) -> Optional[Dict]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if self.ttl_seconds is not None and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def _set(self, key: str, value: Dict) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?)",
+                               (key, json.dumps(value), now, now))
+            self._conn.commit()
+            self._writes += 1
+            if self._writes % DISK_EVICTION_INTERVAL == 0:
+                self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        if self.ttl_seconds is not None:
+            self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+        self._conn.execute(
+            "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY accessed_at DESC "
+            "LIMIT -1 OFFSET ?)", (self.max_entries,))
+        self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class TieredCache(LLMCache):
+    """Looks up the memory tier first, then the disk tier, promoting disk hits into memory."""
+
+    def __init__(self, memory: LLMCache, disk: LLMCache):
+        super().__init__()
+        self.memory = memory
+        self.disk = disk
+
+    def _get(self, key: str) -> Optional[Dict]:
+        value = self.memory.get(key)
+        if value is None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.set(key, value)
+        return value
+
+    def _set(self, key: str, value: Dict) -> None:
+        self.memory.set(key, value)
+        self.disk.set(key, value)
+
+    def stats(self) -> Dict:
+        return {**super().stats(), "memory": self.memory.stats(), "disk": self.disk.stats()}
+
+
+def open_cache(path: Optional[str] = None) -> LLMCache:
+    """Returns a memory-only cache, or a memory cache backed by the SQLite file at `path`."""
+    if path is None:
+        return MemoryCache()
+    return TieredCache(MemoryCache(), SQLiteCache(path))
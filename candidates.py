@@ -0,0 +1,287 @@
+"""Compact, append-only history of the prompt candidates of a run.
+
+`CandidateStore` keeps candidate texts and iterations in parallel arrays and their scores in
+one `array('d')` column per interned criterion id, with NaN for cells the evaluator did not
+score. Justifications are kept alongside. Candidates are only ever added and scored once, so
+a store is a cheap, immutable view (a length and a scored-row count) over a shared log.
+Applying changes returns a new view that appends to the log, without copying it. The log is
+copied only when an older view is extended a second time, e.g. when a step is retried.
+
+Graph nodes never rebuild the store. They return lists of ops (`reset`, `add`, `score`),
+which the `merge_candidates` reducer of the `prompt_candidates` state channel applies.
+"""
+import math
+import sys
+from array import array
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+NAN = float("nan")
+
+
+# --- Ops ---
+def reset(criterion_ids: Sequence[str] = ()) -> Dict:
+    """Clears the history, e.g. when a run starts over, and registers the rubric's criteria so
+    that their columns follow the rubric's order."""
+    return {"op": "reset", "criterion_ids": list(criterion_ids)}
+
+
+def add(text: str, iteration: int) -> Dict:
+    """Appends an unscored candidate generated in `iteration`."""
+    return {"op": "add", "text": text, "iteration": iteration}
+
+
+def score(index: int, scores: List[Dict], avg_score: float) -> Dict:
+    """Records the evaluator's `scores` (dicts with `criterion_id`, `score`, `justification`)
+    and aggregate score for candidate `index`."""
+    return {"op": "score", "index": index, "scores": scores, "avg_score": avg_score}
+
+
+class _Log:
+    """The shared, append-only storage behind one or more `CandidateStore` views."""
+    __slots__ = ("texts", "iterations", "score_rows", "avg_scores", "columns", "justifications",
+                 "criterion_ids", "criterion_index")
+
+    def __init__(self):
+        self.texts: List[str] = []
+        self.iterations = array("l")
+        self.score_rows = array("l")  # Per candidate: its row in the score columns, or -1
+        self.avg_scores = array("d")  # Per score row
+        self.columns: List[array] = []  # Per criterion: one score per score row, NaN if missing
+        self.justifications: List[tuple] = []  # Per score row, aligned with `criterion_ids`
+        self.criterion_ids: List[str] = []
+        self.criterion_index: Dict[str, int] = {}
+
+    def criterion(self, criterion_id: str) -> int:
+        """Returns the column of `criterion_id`, interning it on first use."""
+        position = self.criterion_index.get(criterion_id)
+        if position is None:
+            criterion_id = sys.intern(criterion_id)
+            position = self.criterion_index[criterion_id] = len(self.criterion_ids)
+            self.criterion_ids.append(criterion_id)
+            self.columns.append(array("d", [NAN]) * len(self.avg_scores))
+        return position
+
+    def truncated(self, count: int, scored: int) -> "_Log":
+        """Returns a copy holding only the first `count` candidates and `scored` score rows."""
+        log = _Log()
+        log.texts = self.texts[:count]
+        log.iterations = self.iterations[:count]
+        log.score_rows = array("l", (row if row < scored else -1 for row in self.score_rows[:count]))
+        log.avg_scores = self.avg_scores[:scored]
+        log.columns = [column[:scored] for column in self.columns]
+        log.justifications = self.justifications[:scored]
+        log.criterion_ids = list(self.criterion_ids)
+        log.criterion_index = dict(self.criterion_index)
+        return log
+
+
+class Candidate:
+    """A read-only view of one candidate in a `CandidateStore`."""
+    __slots__ = ("_store", "index")
+
+    def __init__(self, store: "CandidateStore", index: int):
+        self._store = store
+        self.index = index
+
+    @property
+    def text(self) -> str:
+        return self._store._log.texts[self.index]
+
+    @property
+    def iteration(self) -> int:
+        return self._store._log.iterations[self.index]
+
+    @property
+    def scored(self) -> bool:
+        return self._store._row(self.index) is not None
+
+    @property
+    def avg_score(self) -> Optional[float]:
+        row = self._store._row(self.index)
+        return None if row is None else self._store._log.avg_scores[row]
+
+    @property
+    def scores(self) -> List[Dict]:
+        """The scored criteria as `ScoredCriterion` dicts, in criterion order; empty if unscored."""
+        log, row = self._store._log, self._store._row(self.index)
+        if row is None:
+            return []
+        justifications = log.justifications[row]
+        return [{"criterion_id": criterion_id, "score": column[row],
+                 "justification": justifications[position] if position < len(justifications) else None}
+                for position, (criterion_id, column) in enumerate(zip(log.criterion_ids, log.columns))
+                if not math.isnan(column[row])]
+
+    def __repr__(self) -> str:
+        return f"Candidate(index={self.index}, iteration={self.iteration}, avg_score={self.avg_score})"
+
+
+class CandidateStore:
+    """An immutable view of a run's candidates. See the module docstring."""
+    __slots__ = ("_log", "_count", "_scored")
+
+    def __init__(self, criterion_ids: Sequence[str] = (), texts: Sequence[str] = (),
+                 iterations: Sequence[int] = (), avg_scores: Sequence[Optional[float]] = (),
+                 scores: Sequence[Optional[Sequence[Optional[float]]]] = (),
+                 justifications: Sequence[Optional[Sequence[Optional[str]]]] = ()):
+        """Builds a store from its serialized form (see `dict`); with no arguments, an empty one."""
+        self._log, self._count, self._scored = _Log(), 0, 0
+        for criterion_id in criterion_ids:
+            self._log.criterion(criterion_id)
+        ops = [add(text, iteration) for text, iteration in zip(texts, iterations)]
+        for index, avg_score in enumerate(avg_scores):
+            if avg_score is not None:
+                ops.append(score(index, [
+                    {"criterion_id": criterion_id, "score": value, "justification": justification}
+                    for criterion_id, value, justification in zip(criterion_ids, scores[index],
+                                                                  justifications[index])
+                    if value is not None], avg_score))
+        self._log, self._count, self._scored = self._apply(ops)
+
+    @classmethod
+    def _view(cls, log: _Log, count: int, scored: int) -> "CandidateStore":
+        store = cls.__new__(cls)
+        store._log, store._count, store._scored = log, count, scored
+        return store
+
+    def _row(self, index: int) -> Optional[int]:
+        row = self._log.score_rows[index]
+        return row if 0 <= row < self._scored else None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index: int) -> Candidate:
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        return Candidate(self, index)
+
+    def __iter__(self) -> Iterator[Candidate]:
+        return (Candidate(self, index) for index in range(self._count))
+
+    @property
+    def criterion_ids(self) -> List[str]:
+        return list(self._log.criterion_ids)
+
+    def scored(self) -> List[Candidate]:
+        return [c for c in self if c.scored]
+
+    def pending(self, iteration: int) -> List[Candidate]:
+        """Returns the unscored candidates generated in `iteration`."""
+        return [c for c in self if c.iteration == iteration and not c.scored]
+
+    def recorded_scores(self, scores: List[Dict]) -> List[Dict]:
+        """Returns evaluator `scores` as `Candidate.scores` will list them once recorded: in
+        criterion order, with float scores."""
+        criterion_index = self._log.criterion_index
+        ordered = sorted(scores, key=lambda s: criterion_index.get(s["criterion_id"], len(criterion_index)))
+        return [{"criterion_id": s["criterion_id"], "score": float(s["score"]), "justification": s.get("justification")}
+                for s in ordered]
+
+    def _score_rows(self) -> array:
+        """Returns a copy of each candidate's row in the score columns, or -1 if unscored."""
+        log, scored = self._log, self._scored
+        rows = log.score_rows[:self._count]
+        if scored != len(log.avg_scores):
+            rows = array("l", (row if row < scored else -1 for row in rows))
+        return rows
+
+    def score_columns(self) -> Tuple[array, Dict[str, array]]:
+        """Returns copies of each candidate's row in the score columns (-1 if unscored) and of
+        each criterion's column of scores, for vectorized scoring (see `scoring.py`)."""
+        log, scored = self._log, self._scored
+        return self._score_rows(), {criterion_id: column[:scored]
+                                    for criterion_id, column in zip(log.criterion_ids, log.columns)}
+
+    def avg_score_columns(self) -> Tuple[array, array, array]:
+        """Returns copies of each candidate's iteration and row in the score columns (-1 if
+        unscored), and of each score row's `avg_score`, for vectorized stopping checks (see
+        `stopping.py`)."""
+        return self._log.iterations[:self._count], self._score_rows(), self._log.avg_scores[:self._scored]
+
+    def apply(self, ops: List[Dict]) -> "CandidateStore":
+        """Returns a new view with `ops` applied."""
+        return self._view(*self._apply(ops))
+
+    def _apply(self, ops: List[Dict]):
+        log, count, scored = self._log, self._count, self._scored
+        if not ops:
+            return log, count, scored
+        if count != len(log.texts) or scored != len(log.avg_scores):
+            # Another view has already extended this log past us; branch off a copy.
+            log = log.truncated(count, scored)
+        for op in ops:
+            kind = op["op"]
+            if kind == "reset":
+                log, count, scored = _Log(), 0, 0
+                for criterion_id in op.get("criterion_ids", ()):
+                    log.criterion(criterion_id)
+            elif kind == "add":
+                log.texts.append(op["text"])
+                log.iterations.append(op["iteration"])
+                log.score_rows.append(-1)
+                count += 1
+            elif kind == "score":
+                index = op["index"]
+                if not 0 <= index < count or 0 <= log.score_rows[index] < scored:
+                    raise ValueError(f"Candidate {index} does not exist or is already scored.")
+                justifications = {}
+                for result in op["scores"]:
+                    position = log.criterion(result["criterion_id"])
+                    justifications[position] = result.get("justification")
+                for column in log.columns:
+                    column.append(NAN)
+                for result in op["scores"]:
+                    log.columns[log.criterion_index[result["criterion_id"]]][scored] = result["score"]
+                log.justifications.append(tuple(justifications.get(p) for p in range(len(log.criterion_ids))))
+                log.avg_scores.append(op["avg_score"])
+                log.score_rows[index] = scored
+                scored += 1
+            else:
+                raise ValueError(f"Unknown candidate op {kind!r}.")
+        return log, count, scored
+
+    def dict(self) -> Dict:
+        """Returns the JSON-friendly serialized form, columnar and with None for missing cells.
+
+        Named after the `.dict()` of the Pydantic schemas; LangGraph's checkpoint serializer
+        stores stores through it and rebuilds them with `CandidateStore(**data)`.
+        """
+        log = self._log
+        avg_scores, scores, justifications = [], [], []
+        for index in range(self._count):
+            row = self._row(index)
+            if row is None:
+                avg_scores.append(None)
+                scores.append(None)
+                justifications.append(None)
+                continue
+            avg_scores.append(log.avg_scores[row])
+            scores.append([None if math.isnan(column[row]) else column[row] for column in log.columns])
+            row_justifications = log.justifications[row]
+            justifications.append([row_justifications[p] if p < len(row_justifications) else None
+                                   for p in range(len(log.criterion_ids))])
+        return {
+            "criterion_ids": list(log.criterion_ids),
+            "texts": log.texts[:self._count],
+            "iterations": list(log.iterations[:self._count]),
+            "avg_scores": avg_scores,
+            "scores": scores,
+            "justifications": justifications,
+        }
+
+    def __repr__(self) -> str:
+        return f"CandidateStore(candidates={self._count}, scored={self._scored})"
+
+
+def merge_candidates(store: Optional[CandidateStore],
+                     update: Union[CandidateStore, Dict, List[Dict], None]) -> CandidateStore:
+    """Reducer of the `prompt_candidates` channel: applies a node's list of ops. A whole store,
+    or its serialized form from a checkpoint, replaces the current one."""
+    if isinstance(update, CandidateStore):
+        return update
+    if isinstance(update, dict):
+        return CandidateStore(**update)
+    if store is None:
+        store = CandidateStore()
+    return store.apply(update or [])
@@ -0,0 +1,187 @@
+"""Cascaded evaluation: cheap checks first, the full `PromptEvaluator` only for finalists.
+
+Each new candidate goes through up to three stages:
+1. A local pre-check rejects degenerate candidates (empty, unchanged from the original prompt,
+   or too short) without any LLM call.
+2. A `PromptScreener`, usually on a faster, cheaper model, pre-scores the rest. Candidates
+   whose screening score reaches `cutoff` become finalists, as does the best-screened candidate
+   of each iteration, so every iteration keeps its most promising candidate. Ties for that
+   promotion go to the candidate that fails the fewest `binary` criteria a substring check can
+   decide: those that ask for quoted text, e.g. "Does the prompt require the answer to end
+   with 'FINAL ANSWER:'?". Such a check misses paraphrases, so it never rejects a candidate.
+3. Only finalists get the full `PromptEvaluator` pass. Only full scores are recorded as a
+   candidate's scores, so `decide` and `act` never see screening scores.
+
+A deterministic `audit_rate` sample of screened-out candidates is fully evaluated too.
+Together with the finalists, it feeds `ScreeningStats`, which tracks how well screening
+scores agree with full scores and suggests a cutoff.
+"""
+import math
+import re
+import threading
+import zlib
+from collections import Counter, deque
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# --- Configuration ---
+SCREENING_CUTOFF = 0.6  # Minimum screening score for the full evaluation
+AUDIT_RATE = 0.1  # Share of screened-out candidates fully evaluated anyway, to measure agreement
+MIN_CANDIDATE_CHARS = 20
+GOOD_SCORE = 0.8  # Full score of a candidate that screening should not drop
+TARGET_RECALL = 0.95  # Share of good candidates a suggested cutoff keeps
+AGREEMENT_HISTORY = 10_000  # (screening, full) score pairs kept
+
+# Quoted text in a `binary` criterion's question, and words that make the question undecidable
+# by a substring check (it asks for the text's absence) or satisfied by any one quoted text.
+QUOTED_PATTERN = re.compile(r'"([^"\n]{1,80})"|“([^”\n]{1,80})”|`([^`\n]{1,80})`'
+                            r"|(?<!\w)'([^'\n]{1,80})'(?!\w)")
+NEGATION_PATTERN = re.compile(r"\b(not|no|never|avoid|avoids|without|omit|omits|exclude|excludes|refrain|"
+                              r"free of|instead of)\b|n't\b", re.IGNORECASE)
+ALTERNATIVE_PATTERN = re.compile(r"\b(or|either|any of|one of)\b", re.IGNORECASE)
+
+
+def _normalized(text: str) -> str:
+    return " ".join(text.split())
+
+
+def _binary_check(question: str) -> Optional[Tuple[List[str], bool]]:
+    """Returns the quoted texts a `binary` criterion asks for and whether any one of them
+    suffices, or None if the question cannot be decided locally."""
+    terms = [_normalized(next(group for group in match.groups() if group is not None)).lower()
+             for match in QUOTED_PATTERN.finditer(question)]
+    terms = [term for term in terms if term]
+    if not terms or NEGATION_PATTERN.search(question):
+        return None
+    return terms, bool(ALTERNATIVE_PATTERN.search(question))
+
+
+class ScreeningStats:
+    """Screening outcomes and (screening score, full score) pairs, for tuning the cutoff.
+
+    Audited pairs stand for all screened-out candidates, so they are weighted by
+    1 / `audit_rate`.
+    """
+
+    def __init__(self, history: int = AGREEMENT_HISTORY):
+        self.outcomes = Counter()
+        self._pairs = deque(maxlen=history)  # (screening score, full score, weight)
+        self._lock = threading.Lock()
+
+    def record_outcome(self, outcome: str) -> None:
+        with self._lock:
+            self.outcomes[outcome] += 1
+
+    def record_pair(self, screening_score: float, full_score: float, weight: float = 1.0) -> None:
+        with self._lock:
+            self._pairs.append((screening_score, full_score, weight))
+
+    def suggest_cutoff(self, target_recall: float = TARGET_RECALL, good_score: float = GOOD_SCORE) -> Optional[float]:
+        """Returns the highest cutoff that would have passed `target_recall` of the candidates
+        whose full score reached `good_score`, or None before any such candidate was seen."""
+        with self._lock:
+            good = sorted((screening, weight) for screening, full, weight in self._pairs if full >= good_score)
+        total = sum(weight for _, weight in good)
+        if not total:
+            return None
+        dropped = 0.0
+        cutoff = good[0][0]
+        for screening, weight in good:
+            if dropped > (1 - target_recall) * total:
+                break
+            cutoff = screening
+            dropped += weight
+        return cutoff
+
+    def summary(self, cutoff: float = SCREENING_CUTOFF, good_score: float = GOOD_SCORE) -> Dict:
+        """Returns the outcome counts and, over the recorded pairs, the weighted share on
+        which screening at `cutoff` agreed with the full evaluation on reaching `good_score`,
+        the mean absolute score difference, the correlation and a suggested cutoff."""
+        with self._lock:
+            pairs = list(self._pairs)
+            outcomes = dict(self.outcomes)
+        summary = {"outcomes": outcomes, "pairs": len(pairs), "agreement": None, "mean_abs_error": None,
+                   "correlation": None, "suggested_cutoff": self.suggest_cutoff(good_score=good_score)}
+        total = sum(weight for _, _, weight in pairs)
+        if not total:
+            return summary
+        summary["agreement"] = sum(weight for screening, full, weight in pairs
+                                   if (screening >= cutoff) == (full >= good_score)) / total
+        summary["mean_abs_error"] = sum(abs(screening - full) * weight for screening, full, weight in pairs) / total
+        screening_mean = sum(screening * weight for screening, _, weight in pairs) / total
+        full_mean = sum(full * weight for _, full, weight in pairs) / total
+        covariance = sum((s - screening_mean) * (f - full_mean) * w for s, f, w in pairs)
+        spread = math.sqrt(sum((s - screening_mean) ** 2 * w for s, _, w in pairs) *
+                           sum((f - full_mean) ** 2 * w for _, f, w in pairs))
+        summary["correlation"] = covariance / spread if spread else None
+        return summary
+
+
+class EvaluationCascade:
+    def __init__(self, cutoff: float = SCREENING_CUTOFF, audit_rate: float = AUDIT_RATE,
+                 min_chars: int = MIN_CANDIDATE_CHARS, good_score: float = GOOD_SCORE):
+        if not 0.0 <= audit_rate <= 1.0:
+            raise ValueError("audit_rate must be between 0 and 1.")
+        self.cutoff = cutoff
+        self.audit_rate = audit_rate
+        self.min_chars = min_chars
+        self.good_score = good_score
+        self.stats = ScreeningStats()
+
+    def precheck(self, text: str, original_prompt: str) -> Optional[str]:
+        """Returns why `text` is not worth evaluating, or None if it is."""
+        text = _normalized(text)
+        if not text:
+            return "empty"
+        if text == _normalized(original_prompt):
+            return "unchanged"
+        if len(text) < self.min_chars:
+            return "too_short"
+        return None
+
+    @staticmethod
+    def binary_failures(text: str, evaluation_criteria: Sequence) -> List[str]:
+        """Returns the ids of the `binary` criteria that `text` locally fails: it lacks the
+        quoted text they ask for (any one of it, for questions with alternatives). A hint
+        only: a paraphrase of the quoted text fails too."""
+        text = _normalized(text).lower()
+        failed = []
+        for criterion in evaluation_criteria:
+            if criterion.get("metric_type") != "binary":
+                continue
+            check = _binary_check(criterion.get("question", ""))
+            if check is None:
+                continue
+            terms, any_term = check
+            found = [term in text for term in terms]
+            if not (any(found) if any_term else all(found)):
+                failed.append(criterion["criterion_id"])
+        return failed
+
+    def _audited(self, text: str) -> bool:
+        # Deterministic per text, so a resumed or replayed run makes the same choices.
+        return zlib.crc32(text.encode("utf-8")) / 2 ** 32 < self.audit_rate
+
+    def roles(self, texts: Sequence[str], screening_scores: Sequence[Optional[float]],
+              binary_failures: Optional[Sequence[int]] = None) -> List[str]:
+        """Returns each screened candidate's role: `finalist` (screening failed or reached the
+        cutoff), `promoted` (the best-screened candidate, when none reached the cutoff; ties
+        go to the fewest `binary_failures`), `audited` or `screened_out`."""
+        roles = ["finalist" if score is None or score >= self.cutoff else None for score in screening_scores]
+        if "finalist" not in roles and roles:
+            failures = binary_failures or [0] * len(roles)
+            roles[max(range(len(roles)), key=lambda i: (screening_scores[i], -failures[i]))] = "promoted"
+        return [role or ("audited" if self._audited(text) else "screened_out")
+                for text, role in zip(texts, roles)]
+
+    def record(self, role: str, screening_score: Optional[float], full_score: Optional[float]) -> None:
+        """Records a candidate's outcome and, when it was a finalist or audited, its score pair."""
+        self.stats.record_outcome(role)
+        if screening_score is None or full_score is None:
+            return
+        if role == "finalist":
+            self.stats.record_pair(screening_score, full_score)
+        elif role == "audited":
+            self.stats.record_pair(screening_score, full_score, 1 / self.audit_rate)
+
+    def summary(self) -> Dict:
+        return self.stats.summary(self.cutoff, self.good_score)
@@ -0,0 +1,181 @@
+"""Durable SQLite checkpoints for ORCA runs, and crash-resume on top of them.
+
+A graph compiled with a checkpointer (`OrcaAgent.get_graph(checkpointer=...)`) persists the
+`AgentState` after every node under the run's `thread_id`, which ORCA sets to the run id. When
+a node raises, e.g. because a tool returned None late in the Construct loop, `resume` re-runs
+the graph from the last completed node instead of from `orient`. Resuming resets the run's
+`started_at`, so a `Deadline` policy counts from the resume rather than from the failed attempt.
+
+Checkpoints accumulate one row per node, so `compact` keeps only the newest few per run and
+drops runs that have not been touched for a while.
+
+Requires the `langgraph-checkpoint-sqlite` package.
+
+Usage:
+    python checkpoints.py --db checkpoints.db --keep-last 1 --max-age-days 7
+"""
+import argparse
+import contextlib
+import sqlite3
+import sys
+import time
+import uuid
+from typing import AsyncIterator, Dict, Optional
+
+from state import AgentState
+
+# --- Configuration ---
+KEEP_LAST_CHECKPOINTS = 1  # Per run; the newest checkpoint is all `resume` needs
+MAX_CHECKPOINT_AGE_SECONDS = 7 * 24 * 3600
+
+_GREGORIAN_TO_UNIX_100NS = 0x01B21DD213814000
+
+
+def _import_error() -> ImportError:
+    return ImportError("Durable checkpoints require the langgraph-checkpoint-sqlite package "
+                       "(pip install langgraph-checkpoint-sqlite).")
+
+
+def _serializer():
+    from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+    # The state's `CandidateStore` is not one of LangGraph's built-in types; it is rebuilt
+    # from its `.dict()` form.
+    return JsonPlusSerializer(allowed_msgpack_modules=[("candidates", "CandidateStore")])
+
+
+def open_checkpointer(path: str):
+    """Returns a `SqliteSaver` backed by the SQLite file at `path`, for the sync graph."""
+    try:
+        from langgraph.checkpoint.sqlite import SqliteSaver
+    except ImportError as e:
+        raise _import_error() from e
+    # The sync graph runs nodes on worker threads; the saver serializes access with its own lock.
+    saver = SqliteSaver(sqlite3.connect(path, check_same_thread=False), serde=_serializer())
+    saver.setup()
+    return saver
+
+
+@contextlib.asynccontextmanager
+async def open_async_checkpointer(path: str) -> AsyncIterator:
+    """Yields an `AsyncSqliteSaver` backed by `path`, for the async graph, within a running event loop."""
+    try:
+        import aiosqlite
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+    except ImportError as e:
+        raise _import_error() from e
+    async with aiosqlite.connect(path) as conn:
+        saver = AsyncSqliteSaver(conn, serde=_serializer())
+        await saver.setup()
+        yield saver
+
+
+def run_config(run_id: str, config: Optional[Dict] = None) -> Dict:
+    """Returns `config` with the checkpoint thread set to `run_id`."""
+    config = dict(config or {})
+    config["configurable"] = {**config.get("configurable", {}), "thread_id": run_id}
+    return config
+
+
+def invoke(app, state: AgentState, config: Optional[Dict] = None) -> AgentState:
+    """Starts a checkpointed run, using its `run_id` as the checkpoint thread."""
+    return app.invoke(state, config=run_config(state["run_id"], config))
+
+
+def resume_config(app, run_id: str, config: Optional[Dict] = None) -> Dict:
+    """Returns the config that continues the run `run_id` when passed with a None state, e.g.
+    to `streaming.stream`.
+
+    Raises ValueError if there is no unfinished checkpointed run with that id.
+    """
+    config = run_config(run_id, config)
+    if not app.get_state(config).next:
+        raise ValueError(f"No unfinished checkpointed run with id {run_id!r}.")
+    # A deadline counts from when the run was last (re)started, not from its failed attempt.
+    app.update_state(config, {"started_at": time.time()})
+    return config
+
+
+def resume(app, run_id: str, config: Optional[Dict] = None) -> AgentState:
+    """Continues the run `run_id` from its last completed node and returns the final state."""
+    return app.invoke(None, config=resume_config(app, run_id, config))
+
+
+async def aresume(app, run_id: str, config: Optional[Dict] = None) -> AgentState:
+    """Async version of `resume`, for graphs from `OrcaAgent.get_async_graph`."""
+    config = run_config(run_id, config)
+    snapshot = await app.aget_state(config)
+    if not snapshot.next:
+        raise ValueError(f"No unfinished checkpointed run with id {run_id!r}.")
+    await app.aupdate_state(config, {"started_at": time.time()})
+    return await app.ainvoke(None, config=config)
+
+
+def checkpoint_time(checkpoint_id: str) -> float:
+    """Returns the Unix time encoded in a LangGraph checkpoint id (a version 6 UUID)."""
+    value = uuid.UUID(checkpoint_id).int
+    timestamp = ((value >> 96) << 28) | (((value >> 80) & 0xFFFF) << 12) | ((value >> 64) & 0x0FFF)
+    return (timestamp - _GREGORIAN_TO_UNIX_100NS) / 1e7
+
+
+def compact(path: str, keep_last: int = KEEP_LAST_CHECKPOINTS,
+            max_age_seconds: Optional[float] = MAX_CHECKPOINT_AGE_SECONDS) -> Dict[str, int]:
+    """Applies the retention policy to the checkpoint database at `path`.
+
+    Runs whose newest checkpoint is older than `max_age_seconds` are deleted entirely; every
+    other run keeps its `keep_last` newest checkpoints. Returns the number of deleted runs and
+    checkpoints.
+    """
+    if keep_last < 1:
+        raise ValueError("keep_last must be at least 1, or runs could no longer be resumed.")
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute(
+            "SELECT thread_id, checkpoint_ns, checkpoint_id FROM checkpoints "
+            "ORDER BY thread_id, checkpoint_ns, checkpoint_id DESC").fetchall()
+        newest = {}
+        stale = []
+        for thread_id, checkpoint_ns, checkpoint_id in rows:
+            kept = newest.setdefault((thread_id, checkpoint_ns), [])
+            if len(kept) < keep_last:
+                kept.append(checkpoint_id)
+            else:
+                stale.append((thread_id, checkpoint_ns, checkpoint_id))
+
+        expired_threads = set()
+        if max_age_seconds is not None:
+            cutoff = time.time() - max_age_seconds
+            latest = {}
+            for (thread_id, _), kept in newest.items():
+                latest[thread_id] = max(latest.get(thread_id, 0.0), checkpoint_time(kept[0]))
+            expired_threads = {thread_id for thread_id, seen in latest.items() if seen < cutoff}
+
+        with conn:
+            for table in ("checkpoints", "writes"):
+                conn.executemany(f"DELETE FROM {table} WHERE thread_id = ?", [(t,) for t in expired_threads])
+                conn.executemany(
+                    f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    [key for key in stale if key[0] not in expired_threads])
+        deleted_checkpoints = len(rows) - conn.execute("SELECT COUNT(*) FROM checkpoints").fetchone()[0]
+        conn.execute("VACUUM")
+        return {"runs": len(expired_threads), "checkpoints": deleted_checkpoints}
+    finally:
+        conn.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Apply the retention policy to an ORCA checkpoint database.")
+    parser.add_argument("--db", required=True, help="SQLite checkpoint database.")
+    parser.add_argument("--keep-last", type=int, default=KEEP_LAST_CHECKPOINTS,
+                        help="Checkpoints to keep per run.")
+    parser.add_argument("--max-age-days", type=float, default=MAX_CHECKPOINT_AGE_SECONDS / 86400,
+                        help="Delete runs not updated for this many days; 0 keeps every run.")
+    args = parser.parse_args(argv)
+
+    deleted = compact(args.db, args.keep_last, args.max_age_days * 86400 or None)
+    print(f"Deleted {deleted['runs']} expired runs and {deleted['checkpoints']} checkpoints.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
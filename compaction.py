@@ -0,0 +1,53 @@
+"""Compact prompt payloads for the tools that are re-sent the full rubric every iteration.
+
+`PromptIdeator` only needs the full text of the criteria a candidate still falls short on;
+criteria it already satisfies are referenced by id. `ReportGenerator` does not need scoring
+guides at all. Everything is serialized without indentation or padding.
+"""
+import json
+import math
+from typing import Dict, List, Optional, Tuple
+
+CHARS_PER_TOKEN = 4  # Rough average for English text and JSON
+
+
+def minify(obj) -> str:
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+
+def estimate_tokens(text: str) -> int:
+    """A provider-independent token estimate, good enough to compare payload sizes."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def max_score(criterion: Dict) -> int:
+    return 1 if criterion["metric_type"] == "binary" else 5
+
+
+def _strip_empty(criterion: Dict) -> Dict:
+    return {k: v for k, v in criterion.items() if v is not None}
+
+
+def compact_ideation_inputs(evaluation_criteria: List, evaluation_feedback: Optional[List]) -> Tuple[str, str]:
+    """Returns the `evaluation_criteria` and `evaluation_feedback` fields for `PromptIdeator`."""
+    if not evaluation_feedback:
+        return minify([_strip_empty(c) for c in evaluation_criteria]), "N/A"
+
+    feedback_by_id = {s["criterion_id"]: s for s in evaluation_feedback}
+    deficient, satisfied = [], []
+    for criterion in evaluation_criteria:
+        score = feedback_by_id.get(criterion["criterion_id"])
+        if score is not None and score["score"] >= max_score(criterion):
+            satisfied.append(criterion["criterion_id"])
+        else:
+            deficient.append(criterion)
+
+    criteria = {"to_improve": [_strip_empty(c) for c in deficient], "already_satisfied_keep": satisfied}
+    feedback = [feedback_by_id[c["criterion_id"]] for c in deficient if c["criterion_id"] in feedback_by_id]
+    return minify(criteria), minify(feedback)
+
+
+def compact_report_inputs(evaluation_criteria: List, final_scores: List) -> Tuple[str, str]:
+    """Returns the `evaluation_criteria` and `final_scores` fields for `ReportGenerator`."""
+    criteria = [{"criterion_id": c["criterion_id"], "question": c["question"]} for c in evaluation_criteria]
+    return minify(criteria), minify(final_scores)
@@ -0,0 +1,178 @@
+"""A deterministic, offline stand-in for the chat model, for benchmarks and local testing.
+
+`FakeChatModel` implements the subset of the LangChain chat model interface ORCA uses
+(`with_structured_output(...).invoke/ainvoke`) and fabricates valid instances of the schemas
+in `state.py`. Responses, latencies and failures are drawn from an RNG seeded by the model
+seed and the prompt, so a run is reproducible regardless of how calls interleave.
+
+Candidate quality follows `score_trajectory`: every generated prompt is tagged with its
+generation (`[fake-gen:N]`), one more than the candidate it was derived from, and the
+evaluator scores generation N around `score_trajectory[N]`.
+"""
+import asyncio
+import random
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Optional, Sequence
+
+from state import (DecomposedGoals, EvaluationCriteria, EvaluationCriterion, EvaluationResult, FinalReport,
+                   PromptCandidate, ScoredCriterion)
+
+GENERATION_PATTERN = re.compile(r"\[fake-gen:(\d+)\]")
+CRITERION_ID_PATTERN = re.compile(r'"criterion_id"\s*:\s*"([^"]+)"')
+
+
+class FakeLLMError(RuntimeError):
+    """A simulated transport failure."""
+
+
+class FakeRateLimitError(FakeLLMError):
+    """A simulated provider throttling response."""
+
+    def __init__(self):
+        super().__init__("429 Resource exhausted: simulated rate limit")
+
+
+class FakeChatModel:
+    def __init__(self, seed: int = 0, latency_seconds: float = 0.0, latency_sigma: float = 0.0,
+                 failure_rate: float = 0.0, parse_failure_rate: float = 0.0, none_rate: float = 0.0,
+                 score_trajectory: Sequence[float] = (0.4, 0.6, 0.75, 0.85, 0.9), num_goals: int = 4,
+                 num_criteria: int = 5, model: str = "fake-orca", throttle_rate: float = 0.0,
+                 capacity: Optional[int] = None):
+        """Latencies are log-normal with median `latency_seconds` and shape `latency_sigma`
+        (0 makes them constant). The four rates are per-call probabilities of raising a
+        transport error, raising a parse error, returning None, or raising a rate limit error.
+        With a `capacity`, calls beyond that many in flight are rejected as rate limited, like
+        an overloaded provider."""
+        self.seed = seed
+        self.latency_seconds = latency_seconds
+        self.latency_sigma = latency_sigma
+        self.failure_rate = failure_rate
+        self.parse_failure_rate = parse_failure_rate
+        self.none_rate = none_rate
+        self.score_trajectory = list(score_trajectory)
+        self.num_goals = num_goals
+        self.num_criteria = num_criteria
+        self.model = model
+        self.throttle_rate = throttle_rate
+        self.capacity = capacity
+        self.temperature = 0.0
+        self.calls = Counter()  # Schema name -> calls
+        self._seen = Counter()  # (schema name, prompt) -> calls, to vary repeated prompts
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def with_structured_output(self, schema):
+        return FakeStructuredModel(self, schema)
+
+    def _rng(self, schema, prompt: str) -> random.Random:
+        with self._lock:
+            self.calls[schema.__name__] += 1
+            self._seen[(schema.__name__, prompt)] += 1
+            occurrence = self._seen[(schema.__name__, prompt)]
+        return random.Random(f"{self.seed}:{schema.__name__}:{occurrence}:{prompt}")
+
+    @contextmanager
+    def _admitted(self):
+        with self._lock:
+            self._in_flight += 1
+            overloaded = self.capacity is not None and self._in_flight > self.capacity
+        try:
+            if overloaded:
+                raise FakeRateLimitError()
+            yield
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def _latency(self, rng: random.Random) -> float:
+        if self.latency_sigma <= 0:
+            return self.latency_seconds
+        return self.latency_seconds * rng.lognormvariate(0.0, self.latency_sigma)
+
+    def _respond(self, schema, prompt: str, rng: random.Random):
+        draw = rng.random()
+        if draw < self.failure_rate:
+            raise FakeLLMError("Simulated transport failure")
+        if draw < self.failure_rate + self.parse_failure_rate:
+            raise ValueError(f"Simulated malformed output for {schema.__name__}")
+        if draw < self.failure_rate + self.parse_failure_rate + self.none_rate:
+            return None
+        if draw < self.failure_rate + self.parse_failure_rate + self.none_rate + self.throttle_rate:
+            raise FakeRateLimitError()
+        factories = {
+            DecomposedGoals: self._decomposed_goals,
+            EvaluationCriteria: self._evaluation_criteria,
+            PromptCandidate: self._prompt_candidate,
+            EvaluationResult: self._evaluation_result,
+            FinalReport: self._final_report,
+        }
+        return factories[schema](prompt, rng)
+
+    # --- Schema factories ---
+    def _decomposed_goals(self, prompt: str, rng: random.Random) -> DecomposedGoals:
+        goals = [f"Improve aspect {i + 1} of the prompt." for i in range(self.num_goals)]
+        return DecomposedGoals(decomposed_goals=goals)
+
+    def _evaluation_criteria(self, prompt: str, rng: random.Random) -> EvaluationCriteria:
+        criteria = []
+        for i in range(self.num_criteria):
+            binary = i % 2 == 0
+            criteria.append(EvaluationCriterion(
+                criterion_id=f"criterion_{i + 1}",
+                question=f"Does the prompt satisfy requirement {i + 1}?",
+                metric_type="binary" if binary else "scale_1_5",
+                scoring_guide=None if binary else "1: Absent, 3: Partially addressed, 5: Fully addressed"
+            ))
+        return EvaluationCriteria(evaluation_criteria=criteria)
+
+    def _prompt_candidate(self, prompt: str, rng: random.Random) -> PromptCandidate:
+        generations = [int(g) for g in GENERATION_PATTERN.findall(prompt)]
+        generation = max(generations) + 1 if generations else 0
+        return PromptCandidate(prompt_text=f"[fake-gen:{generation}] Candidate {rng.getrandbits(32):08x}.")
+
+    def _evaluation_result(self, prompt: str, rng: random.Random) -> EvaluationResult:
+        generations = [int(g) for g in GENERATION_PATTERN.findall(prompt)]
+        generation = max(generations) if generations else 0
+        quality = self.score_trajectory[min(generation, len(self.score_trajectory) - 1)]
+        metric_types = dict(re.findall(r'"criterion_id"\s*:\s*"([^"]+)".*?"metric_type"\s*:\s*"([^"]+)"',
+                                       prompt, flags=re.S))
+        results = []
+        for criterion_id in dict.fromkeys(CRITERION_ID_PATTERN.findall(prompt)):
+            if metric_types.get(criterion_id) == "binary":
+                score = 1.0 if rng.random() < quality else 0.0
+            else:
+                score = float(min(5, max(1, round(1 + 4 * quality + rng.gauss(0, 0.5)))))
+            results.append(ScoredCriterion(criterion_id=criterion_id, score=score,
+                                           justification=f"Simulated score at quality {quality:.2f}."))
+        return EvaluationResult(results=results)
+
+    def _final_report(self, prompt: str, rng: random.Random) -> FinalReport:
+        candidates = re.findall(r"\[fake-gen:\d+\][^\n]*", prompt)
+        criterion_ids = dict.fromkeys(CRITERION_ID_PATTERN.findall(prompt))
+        return FinalReport(
+            final_prompt=candidates[0] if candidates else "N/A",
+            executive_summary="Simulated report.",
+            detailed_rationale={criterion_id: "Simulated rationale." for criterion_id in criterion_ids}
+        )
+
+
+class FakeStructuredModel:
+    def __init__(self, model: FakeChatModel, schema):
+        self.model = model
+        self.schema = schema
+
+    def invoke(self, prompt: str, config: Optional[dict] = None):
+        rng = self.model._rng(self.schema, prompt)
+        with self.model._admitted():
+            time.sleep(self.model._latency(rng))
+            return self.model._respond(self.schema, prompt, rng)
+
+    async def ainvoke(self, prompt: str, config: Optional[dict] = None):
+        rng = self.model._rng(self.schema, prompt)
+        with self.model._admitted():
+            await asyncio.sleep(self.model._latency(rng))
+            return self.model._respond(self.schema, prompt, rng)
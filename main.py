@@ -1,48 +1,122 @@
+import argparse
 import os
+from typing import TYPE_CHECKING, Dict
+
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
 
-from agents import OrcaAgent
+import checkpoints
+from agents import TOOL_NAMES, OrcaAgent
+from cascade import AUDIT_RATE, SCREENING_CUTOFF, EvaluationCascade
+from state import initial_state
+from streaming import (CandidateGenerated, CandidateScored, CriteriaReady, GoalsDecomposed, ReportReady, StopDecision,
+                       stream)
+from telemetry import Telemetry
+
+if TYPE_CHECKING:
+    from langchain_google_genai import ChatGoogleGenerativeAI
 
 load_dotenv()
 
-# --- Main Execution ---
-if __name__ == "__main__":
+# --- Configuration ---
+MODEL_NAME = "gemini-2.5-flash"
+TEMPERATURE = 1.0
+
+
+def create_llm(model: str = MODEL_NAME, temperature: float = TEMPERATURE) -> "ChatGoogleGenerativeAI":
+    """Initializes the chat model used by every ORCA tool."""
     if not os.getenv("GOOGLE_API_KEY"):
         raise ValueError("GOOGLE_API_KEY environment variable not set.")
+    # Imported here because it is slow to load and not needed until a model is created.
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(model=model, temperature=temperature)
+
+
+def add_model_arguments(parser: argparse.ArgumentParser) -> None:
+    """Adds the options that choose the chat models and the evaluation cascade."""
+    parser.add_argument("--model", default=MODEL_NAME, help="Chat model for every tool without its own.")
+    parser.add_argument("--tool-model", action="append", default=[], metavar="TOOL=MODEL",
+                        help=f"Chat model for one tool, one of: {', '.join(TOOL_NAMES)}. A prompt_screener "
+                             "model screens candidates before the full evaluation.")
+    parser.add_argument("--screening-cutoff", type=float, default=SCREENING_CUTOFF,
+                        help="Minimum screening score for a candidate's full evaluation.")
+    parser.add_argument("--audit-rate", type=float, default=AUDIT_RATE,
+                        help="Share of screened-out candidates fully evaluated anyway, to measure agreement.")
+
+
+def create_models(args: argparse.Namespace) -> Dict:
+    """Returns the `llm`, `tool_llms` and `cascade` arguments of `OrcaAgent` for the options
+    added by `add_model_arguments`."""
+    tool_llms = {}
+    for spec in args.tool_model:
+        tool, _, model = spec.partition("=")
+        if not model:
+            raise ValueError(f"Expected --tool-model TOOL=MODEL, got {spec!r}.")
+        tool_llms[tool] = create_llm(model)
+    cascade = None
+    if "prompt_screener" in tool_llms:
+        cascade = EvaluationCascade(cutoff=args.screening_cutoff, audit_rate=args.audit_rate)
+    return {"llm": create_llm(args.model), "tool_llms": tool_llms, "cascade": cascade}
+
+
+def render(event) -> None:
+    """Prints one streamed progress event."""
+    if isinstance(event, GoalsDecomposed):
+        source = " (reused from a similar run)" if event.reused else ""
+        print(f"\nDecomposed goals{source}:")
+        for goal in event.goals:
+            print(f"- {goal}")
+    elif isinstance(event, CriteriaReady):
+        print(f"\nEvaluation criteria: {', '.join(c['criterion_id'] for c in event.criteria)}")
+    elif isinstance(event, CandidateGenerated):
+        print(f"\n[Iteration {event.iteration + 1}] Candidate generated:\n{event.text}")
+    elif isinstance(event, CandidateScored):
+        print(f"[Iteration {event.iteration + 1}] Candidate scored {event.avg_score:.2f}")
+    elif isinstance(event, StopDecision):
+        print(f"Stopping: {event.reason}" if event.stop else "Continuing to the next iteration.")
+    elif isinstance(event, ReportReady):
+        report = event.report
+        print("\n\n--- ORCA AGENT FINISHED ---")
+        print("\n--- FINAL REPORT ---")
+        print(f"\nOptimized Prompt:\n{'-' * 20}\n{report['final_prompt']}")
+        print(f"\nExecutive Summary:\n{'-' * 20}\n{report['executive_summary']}")
+        print(f"\nDetailed Rationale:\n{'-' * 20}")
+        for criterion_id, justification in report['detailed_rationale'].items():
+            print(f"- {criterion_id.replace('_', ' ').title()}: {justification}")
+
+
+# --- Main Execution ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Optimize a prompt with the ORCA agent.")
+    parser.add_argument("--checkpoint-db", help="SQLite file to checkpoint the run in after every node.")
+    parser.add_argument("--resume", metavar="RUN_ID", help="Resume a failed checkpointed run from its last "
+                                                           "completed node. Requires --checkpoint-db.")
+    parser.add_argument("--verbose", action="store_true", help="Also print the agent's detailed progress log.")
+    add_model_arguments(parser)
+    args = parser.parse_args()
+    if args.resume and not args.checkpoint_db:
+        parser.error("--resume requires --checkpoint-db.")
 
-    # Initialize the LLM
-    llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=1.0)
+    # Initialize the LLMs
+    models = create_models(args)
 
     # Instantiate the agent and get the compiled graph
-    orca_agent = OrcaAgent(llm)
-    app = orca_agent.get_graph()
+    orca_agent = OrcaAgent(**models, telemetry=Telemetry(verbose=args.verbose))
+    checkpointer = checkpoints.open_checkpointer(args.checkpoint_db) if args.checkpoint_db else None
+    app = orca_agent.get_graph(checkpointer=checkpointer)
 
     # Define the initial problem
     # Using the example from the blueprint
     initial_prompt_example = "Write about our new shoes."
     user_goal_example = "Make this a good prompt for generating exciting social media posts for Instagram."
 
-    # Set up the initial state
-    initial_state = {
-        "initial_prompt": initial_prompt_example,
-        "user_goal": user_goal_example,
-        "decomposed_goals": [],
-        "evaluation_criteria": [],
-        "prompt_candidates": [],
-        "iteration_count": 0,
-        "final_prompt": "",
-        "final_rationale": {}
-    }
-
-    print("--- STARTING ORCA AGENT ---")
-    # Run the agent
-    final_state = app.invoke(initial_state)
-
-    print("\n\n--- ORCA AGENT FINISHED ---")
-    print("\n--- FINAL REPORT ---")
-    print(f"\nOptimized Prompt:\n{'-' * 20}\n{final_state['final_rationale']['final_prompt']}")
-    print(f"\nExecutive Summary:\n{'-' * 20}\n{final_state['final_rationale']['executive_summary']}")
-    print(f"\nDetailed Rationale:\n{'-' * 20}")
-    for criterion_id, justification in final_state['final_rationale']['detailed_rationale'].items():
-        print(f"- {criterion_id.replace('_', ' ').title()}: {justification}")
+    # Run the agent, showing candidates and scores as they are produced
+    if args.resume:
+        print(f"--- RESUMING ORCA AGENT RUN {args.resume} ---")
+        state, config = None, checkpoints.resume_config(app, args.resume)
+    else:
+        state = initial_state(initial_prompt_example, user_goal_example)
+        config = checkpoints.run_config(state["run_id"]) if checkpointer is not None else None
+        print(f"--- STARTING ORCA AGENT RUN {state['run_id']} ---")
+    for event in stream(app, state, config):
+        render(event)
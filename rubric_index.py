@@ -0,0 +1,182 @@
+"""A local, persistent similarity index of previously generated rubrics.
+
+Runs with a near-identical `user_goal` and `initial_prompt` can reuse an earlier run's
+`decomposed_goals` and `evaluation_criteria`, skipping the Orient and Refine LLM calls.
+Texts are embedded as sparse, hashed TF-IDF vectors with NumPy; entries are appended to a JSONL
+file and re-vectorized on load.
+
+Each entry keeps only its few nonzero term frequencies, in flat arrays that grow by appending,
+so an add costs the entry's own size and a lookup is linear in the total number of nonzeros.
+IDF weights are applied at lookup time, since every add changes them. Entries with the same
+prompt and goal are indexed once, and beyond `max_entries` the oldest are evicted.
+"""
+import json
+import math
+import os
+import re
+import threading
+import time
+import uuid
+import zlib
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# --- Configuration ---
+SIMILARITY_THRESHOLD = 0.9  # Minimum cosine similarity for a rubric to be reused
+DIMENSIONS = 4096  # Hashed feature space size
+GOAL_WEIGHT = 2.0  # The goal shapes the rubric more than the prompt being improved
+MAX_ENTRIES = 10_000  # The oldest entries are evicted beyond this
+EVICTION_SHARE = 0.1  # Share of `max_entries` evicted at once, so the index is compacted rarely
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def _features(text: str) -> List[str]:
+    words = TOKEN_PATTERN.findall(text.lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def _key(initial_prompt: str, user_goal: str) -> Tuple[str, str]:
+    return " ".join(initial_prompt.split()), " ".join(user_goal.split())
+
+
+class RubricIndex:
+    def __init__(self, path: Optional[str] = None, threshold: float = SIMILARITY_THRESHOLD,
+                 dimensions: int = DIMENSIONS, max_entries: int = MAX_ENTRIES):
+        """Entries persist to the JSONL file at `path`; without one the index lives in memory.
+        Evicting rewrites the file from this instance's entries, so processes must not share it."""
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1.")
+        self.path = path
+        self.threshold = threshold
+        self.dimensions = dimensions
+        self.max_entries = max_entries
+        self._entries = []
+        self._ids_by_key = {}  # (prompt, goal) -> entry id, for deduplication
+        # The nonzero sublinear term frequencies of all entries, in entry order.
+        self._rows = np.empty(0, dtype=np.int32)  # Entry of each nonzero
+        self._features = np.empty(0, dtype=np.int32)
+        self._frequencies = np.empty(0, dtype=np.float32)
+        self._nonzeros = 0
+        self._document_frequency = np.zeros(dimensions, dtype=np.float32)
+        self._norms = None  # TF-IDF norms of the entries; recomputed lazily after adds
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            entries = deque(maxlen=max_entries)
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        continue  # A line truncated by an interrupted write
+            for entry in entries:
+                self._append(entry)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _vectorize(self, initial_prompt: str, user_goal: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the hashed features of a prompt and goal and their sublinear term frequencies."""
+        counts = {}
+        for text, weight in ((user_goal, GOAL_WEIGHT), (initial_prompt, 1.0)):
+            for feature in _features(text):
+                bucket = zlib.crc32(feature.encode("utf-8")) % self.dimensions
+                counts[bucket] = counts.get(bucket, 0.0) + weight
+        features = np.fromiter(counts.keys(), dtype=np.int32, count=len(counts))
+        frequencies = 1 + np.log(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+        return features, frequencies
+
+    def _append(self, entry: Dict) -> bool:
+        """Indexes `entry`, unless one with the same prompt and goal is indexed already."""
+        key = _key(entry["initial_prompt"], entry["user_goal"])
+        if key in self._ids_by_key:
+            return False
+        features, frequencies = self._vectorize(entry["initial_prompt"], entry["user_goal"])
+        end = self._nonzeros + len(features)
+        if end > len(self._features):
+            capacity = max(end, 2 * len(self._features), 1024)
+            self._rows = np.resize(self._rows, capacity)
+            self._features = np.resize(self._features, capacity)
+            self._frequencies = np.resize(self._frequencies, capacity)
+        self._rows[self._nonzeros:end] = len(self._entries)
+        self._features[self._nonzeros:end] = features
+        self._frequencies[self._nonzeros:end] = frequencies
+        self._nonzeros = end
+        self._document_frequency[features] += 1
+        self._entries.append(entry)
+        self._ids_by_key[key] = entry["id"]
+        self._norms = None
+        return True
+
+    def _evict(self) -> None:
+        """Drops the oldest entries, down to `max_entries` minus one eviction batch."""
+        count = len(self._entries) - self.max_entries + max(1, int(self.max_entries * EVICTION_SHARE))
+        cut = int(np.searchsorted(self._rows[:self._nonzeros], count))
+        self._document_frequency -= np.bincount(self._features[:cut], minlength=self.dimensions)
+        for entry in self._entries[:count]:
+            del self._ids_by_key[_key(entry["initial_prompt"], entry["user_goal"])]
+        del self._entries[:count]
+        kept = self._nonzeros - cut
+        self._rows[:kept] = self._rows[cut:self._nonzeros] - count
+        self._features[:kept] = self._features[cut:self._nonzeros]
+        self._frequencies[:kept] = self._frequencies[cut:self._nonzeros]
+        self._nonzeros = kept
+        self._norms = None
+        if self.path:
+            # Rewrite the file so evicted entries are not reloaded.
+            with open(f"{self.path}.tmp", "w", encoding="utf-8") as f:
+                for entry in self._entries:
+                    f.write(json.dumps(entry) + "\n")
+            os.replace(f"{self.path}.tmp", self.path)
+
+    def _idf(self) -> np.ndarray:
+        n = len(self._entries)
+        return np.log((1 + n) / (1 + self._document_frequency)) + 1
+
+    def lookup(self, initial_prompt: str, user_goal: str) -> Optional[Dict]:
+        """Returns the most similar entry at or above the threshold, with its `similarity`."""
+        with self._lock:
+            if not self._entries:
+                return None
+            idf = self._idf()
+            features = self._features[:self._nonzeros]
+            weighted = self._frequencies[:self._nonzeros] * idf[features]
+            if self._norms is None:
+                self._norms = np.sqrt(np.bincount(self._rows[:self._nonzeros], weights=weighted * weighted,
+                                                  minlength=len(self._entries)))
+            query_features, query_frequencies = self._vectorize(initial_prompt, user_goal)
+            query = np.zeros(self.dimensions, dtype=np.float32)
+            query[query_features] = query_frequencies * idf[query_features]
+            query /= max(float(np.linalg.norm(query)), 1e-12)
+            dots = np.bincount(self._rows[:self._nonzeros], weights=weighted * query[features],
+                               minlength=len(self._entries))
+            similarities = dots / np.maximum(self._norms, 1e-12)
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            if similarity < self.threshold or math.isnan(similarity):
+                return None
+            return {**self._entries[best], "similarity": similarity}
+
+    def add(self, initial_prompt: str, user_goal: str, decomposed_goals: List[str],
+            evaluation_criteria: List[Dict]) -> str:
+        """Indexes a generated rubric and returns its entry id. If a rubric for the same prompt
+        and goal is indexed already, it is kept and its id returned."""
+        entry = {
+            "id": uuid.uuid4().hex,
+            "created_at": time.time(),
+            "initial_prompt": initial_prompt,
+            "user_goal": user_goal,
+            "decomposed_goals": decomposed_goals,
+            "evaluation_criteria": evaluation_criteria,
+        }
+        with self._lock:
+            if not self._append(entry):
+                return self._ids_by_key[_key(initial_prompt, user_goal)]
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry) + "\n")
+            if len(self._entries) > self.max_entries:
+                self._evict()
+        return entry["id"]
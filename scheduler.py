@@ -0,0 +1,437 @@
+"""Process-wide scheduling of LLM calls: rate limits, adaptive concurrency, retries and hedging.
+
+Every tool call, sync or async, from every run in the process goes through one `LLMScheduler`
+(`get_scheduler`), which:
+- Waits on token buckets for requests and estimated tokens per minute.
+- Bounds in-flight calls with an AIMD limit. Each success raises the limit by 1/limit, and a
+  throttling response (HTTP 429, "rate limit", "resource exhausted") halves it. The limit is
+  halved at most once per median call latency, so one burst of 429s counts as one signal.
+- Retries transport failures with full-jitter exponential backoff. Parse failures (`ValueError`,
+  or no structured output) are retried immediately, since waiting does not change the answer.
+- Optionally hedges. Once a call has run longer than the `hedge_percentile` of recent
+  latencies, a duplicate is sent, provided there is spare concurrency and rate budget, and
+  whichever response arrives first wins. A losing sync attempt cannot be interrupted, so it
+  keeps its concurrency slot until it returns. Stragglers thus count against the limit, and
+  the thread pool running hedged sync calls, sized to the limit's ceiling, never queues a call.
+"""
+import asyncio
+import contextvars
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Awaitable, Callable, Dict, Optional
+
+# --- Configuration ---
+MAX_CONCURRENCY = 32  # Ceiling of the adaptive in-flight limit
+MIN_CONCURRENCY = 1
+MAX_RETRIES = 3  # For transport and throttling failures
+MAX_PARSE_RETRIES = 1  # For malformed or missing structured output
+BASE_BACKOFF_SECONDS = 0.5
+MAX_BACKOFF_SECONDS = 30.0
+THROTTLE_COOLDOWN_SECONDS = 1.0  # Minimum time between decreases until call latencies are known
+LATENCY_WINDOW = 256  # Recent successful call latencies kept for hedging
+HEDGE_MIN_SAMPLES = 20  # Latencies needed before the hedging percentile is trusted
+
+THROTTLE_MARKERS = ("429", "rate limit", "ratelimit", "resource exhausted", "resourceexhausted",
+                    "too many requests", "quota")
+
+
+def is_throttle(error: BaseException) -> bool:
+    """Whether `error` looks like the provider throttling us rather than a plain failure."""
+    text = f"{type(error).__name__} {error}".lower()
+    return any(marker in text for marker in THROTTLE_MARKERS)
+
+
+class TokenBucket:
+    """A token bucket refilled at `per_minute` and holding at most `burst` (default: a minute's worth)."""
+
+    def __init__(self, per_minute: float, burst: Optional[float] = None):
+        self.rate = per_minute / 60
+        self.capacity = burst or per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """Takes `amount` tokens, going into debt if needed, and returns the seconds to wait
+        until the debt is repaid."""
+        with self._lock:
+            self._refill()
+            self._tokens -= amount
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def try_take(self, amount: float) -> bool:
+        """Takes `amount` tokens only if they are available now."""
+        with self._lock:
+            self._refill()
+            if self._tokens < amount:
+                return False
+            self._tokens -= amount
+            return True
+
+    def charge(self, amount: float) -> None:
+        """Takes `amount` tokens after the fact, e.g. for a response's output tokens."""
+        with self._lock:
+            self._refill()
+            self._tokens -= amount
+
+
+class _Waiter:
+    """A caller queued for a concurrency slot, woken by whichever thread frees one."""
+    __slots__ = ("event", "loop", "future", "granted")
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.loop = loop
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+        self.granted = False
+
+    def grant(self) -> None:
+        self.granted = True
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self) -> None:
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class LLMScheduler:
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None,
+                 max_concurrency: int = MAX_CONCURRENCY, min_concurrency: int = MIN_CONCURRENCY,
+                 max_retries: int = MAX_RETRIES, max_parse_retries: int = MAX_PARSE_RETRIES,
+                 base_backoff_seconds: float = BASE_BACKOFF_SECONDS,
+                 max_backoff_seconds: float = MAX_BACKOFF_SECONDS, hedge_percentile: Optional[float] = None):
+        """Rate limits are off unless given. The concurrency limit starts at `max_concurrency`
+        and adapts between the two bounds. Hedging is off unless `hedge_percentile` (e.g. 95) is set."""
+        if not 1 <= min_concurrency <= max_concurrency:
+            raise ValueError("Concurrency bounds must satisfy 1 <= min_concurrency <= max_concurrency.")
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_retries = max_retries
+        self.max_parse_retries = max_parse_retries
+        self.base_backoff_seconds = base_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.hedge_percentile = hedge_percentile
+
+        self._lock = threading.Lock()
+        self._limit = float(max_concurrency)
+        self._in_flight = 0
+        self._waiters = deque()
+        self._last_decrease = float("-inf")
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._pool = None
+        self._counters = {"calls": 0, "attempts": 0, "retries": 0, "parse_retries": 0, "throttles": 0,
+                          "failures": 0, "hedges": 0, "hedge_wins": 0, "rate_limited_seconds": 0.0}
+
+    # --- Concurrency ---
+    def _slots(self) -> int:
+        return max(self.min_concurrency, int(self._limit))
+
+    def _grant_waiters(self) -> None:
+        # Called with the lock held. Slots are handed to waiters directly so none can be stolen.
+        while self._waiters and self._in_flight < self._slots():
+            self._in_flight += 1
+            self._waiters.popleft().grant()
+
+    def _try_acquire(self, waiter: Optional[_Waiter] = None) -> bool:
+        with self._lock:
+            if not self._waiters and self._in_flight < self._slots():
+                self._in_flight += 1
+                return True
+            if waiter is not None:
+                self._waiters.append(waiter)
+            return False
+
+    def _acquire(self) -> None:
+        waiter = _Waiter()
+        if not self._try_acquire(waiter):
+            waiter.event.wait()
+
+    async def _aacquire(self) -> None:
+        waiter = _Waiter(asyncio.get_running_loop())
+        if self._try_acquire(waiter):
+            return
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter.granted:
+                    self._in_flight -= 1
+                    self._grant_waiters()
+                else:
+                    self._waiters.remove(waiter)
+            raise
+
+    def _release(self, *_) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            self._grant_waiters()
+
+    def set_max_concurrency(self, limit: int) -> None:
+        """Changes the ceiling of the adaptive limit, e.g. to match a provider quota."""
+        if limit < self.min_concurrency:
+            raise ValueError(f"limit must be at least min_concurrency ({self.min_concurrency}).")
+        with self._lock:
+            self.max_concurrency = limit
+            self._limit = min(float(limit), max(self._limit, float(self.min_concurrency)))
+            # The hedging pool must have a thread for every slot; a new one is sized on demand.
+            # Attempts already running on the old pool still finish.
+            pool, self._pool = self._pool, None
+            self._grant_waiters()
+        if pool is not None:
+            pool.shutdown(wait=False)
+
+    def _on_success(self, seconds: float) -> None:
+        with self._lock:
+            self._latencies.append(seconds)
+            self._limit = min(float(self.max_concurrency), self._limit + 1 / self._limit)
+            self._grant_waiters()
+
+    def _on_throttle(self) -> None:
+        with self._lock:
+            self._counters["throttles"] += 1
+            now = time.monotonic()
+            cooldown = sorted(self._latencies)[len(self._latencies) // 2] if self._latencies \
+                else THROTTLE_COOLDOWN_SECONDS
+            if now - self._last_decrease >= cooldown:
+                self._limit = max(float(self.min_concurrency), self._limit / 2)
+                self._last_decrease = now
+
+    # --- Rate limits ---
+    def _rate_wait(self, tokens: int) -> float:
+        delay = 0.0
+        if self.requests is not None:
+            delay = max(delay, self.requests.reserve(1))
+        if self.tokens is not None and tokens:
+            delay = max(delay, self.tokens.reserve(tokens))
+        if delay:
+            with self._lock:
+                self._counters["rate_limited_seconds"] += delay
+        return delay
+
+    def charge_tokens(self, tokens: int) -> None:
+        """Counts tokens known only after a call, such as its output, against the token budget."""
+        if self.tokens is not None and tokens:
+            self.tokens.charge(tokens)
+
+    # --- Retries ---
+    def _retry_delay(self, error: Optional[BaseException], result, attempts: Dict[str, int]) -> Optional[float]:
+        """Returns the seconds to wait before retrying a failed attempt, or None to give up."""
+        if error is None or isinstance(error, ValueError):
+            # Malformed output, or none at all: the model answered, so retry at once.
+            if attempts["parse"] >= self.max_parse_retries:
+                return None
+            attempts["parse"] += 1
+            with self._lock:
+                self._counters["parse_retries"] += 1
+            return 0.0
+        if is_throttle(error):
+            self._on_throttle()
+        if attempts["transport"] >= self.max_retries:
+            return None
+        attempts["transport"] += 1
+        with self._lock:
+            self._counters["retries"] += 1
+        ceiling = min(self.max_backoff_seconds, self.base_backoff_seconds * 2 ** attempts["transport"])
+        return random.uniform(0, ceiling)
+
+    def _give_up(self, error: Optional[BaseException], result):
+        with self._lock:
+            self._counters["failures"] += 1
+        if error is not None:
+            raise error
+        return result
+
+    # --- Hedging ---
+    def _hedge_delay(self) -> Optional[float]:
+        if self.hedge_percentile is None:
+            return None
+        with self._lock:
+            if len(self._latencies) < HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(self.hedge_percentile / 100 * len(ordered)))]
+
+    def _try_hedge_slot(self, tokens: int) -> bool:
+        """Reserves capacity for a hedge only if it is spare right now; hedges never wait."""
+        if not self._try_acquire():
+            return False
+        if (self.requests is not None and not self.requests.try_take(1)) or \
+                (self.tokens is not None and tokens and not self.tokens.try_take(tokens)):
+            self._release()
+            return False
+        with self._lock:
+            self._counters["hedges"] += 1
+        return True
+
+    def _count_hedge_win(self) -> None:
+        with self._lock:
+            self._counters["hedge_wins"] += 1
+
+    def _hedge_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # Every task on the pool holds a concurrency slot, so there is never more work
+                # than threads.
+                self._pool = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="orca-llm")
+            return self._pool
+
+    def _run(self, fn: Callable, tokens: int):
+        """Runs one attempt of `fn` in the concurrency slot the caller acquired, and releases
+        the slot once the attempt, rather than this call, has finished."""
+        delay = self._hedge_delay()
+        if delay is None:
+            try:
+                return fn()
+            finally:
+                self._release()
+        # The attempt runs on a pool thread so that a hedge can win while it is still pending.
+        # Calls run in a copy of the caller's context so usage tracking and telemetry tags follow them.
+        pool = self._hedge_pool()
+        try:
+            primary = pool.submit(contextvars.copy_context().run, fn)
+        except BaseException:
+            self._release()
+            raise
+        primary.add_done_callback(self._release)
+        if wait([primary], timeout=delay).done or not self._try_hedge_slot(tokens):
+            return primary.result()
+        try:
+            hedge = pool.submit(contextvars.copy_context().run, fn)
+        except BaseException:
+            self._release()
+            raise
+        hedge.add_done_callback(self._release)
+        done, pending = wait([primary, hedge], return_when=FIRST_COMPLETED)
+        winner = next((f for f in done if f.exception() is None), None)
+        if winner is None and pending:
+            winner = pending.pop()
+        winner = winner or primary
+        if winner is hedge:
+            self._count_hedge_win()
+        # The losing attempt finishes in the background and frees its slot when it does.
+        return winner.result()
+
+    async def _arun(self, fn: Callable[[], Awaitable], tokens: int):
+        delay = self._hedge_delay()
+        if delay is None:
+            return await fn()
+        primary = asyncio.ensure_future(fn())
+        try:
+            done, _ = await asyncio.wait([primary], timeout=delay)
+            if done or not self._try_hedge_slot(tokens):
+                return await primary
+            hedge = asyncio.ensure_future(fn())
+            hedge.add_done_callback(self._release)
+            try:
+                pending = {primary, hedge}
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    winner = next((f for f in done if f.exception() is None), None)
+                    if winner is not None or not pending:
+                        winner = winner or done.pop()
+                        if winner is hedge:
+                            self._count_hedge_win()
+                        return winner.result()
+            finally:
+                hedge.cancel()
+        finally:
+            primary.cancel()
+
+    # --- Calls ---
+    def call(self, fn: Callable, tokens: int = 0):
+        """Calls `fn()` under the scheduler's limits, retrying failures, and returns its result.
+
+        `tokens` is the estimated input size of the call. A None result counts as a parse
+        failure. Raises the last error once the retries are exhausted.
+        """
+        with self._lock:
+            self._counters["calls"] += 1
+        attempts = {"parse": 0, "transport": 0}
+        while True:
+            wait_seconds = self._rate_wait(tokens)
+            if wait_seconds:
+                time.sleep(wait_seconds)
+            self._acquire()
+            error, result = None, None
+            start = time.perf_counter()
+            with self._lock:
+                self._counters["attempts"] += 1
+            try:
+                result = self._run(fn, tokens)  # Releases the slot itself
+            except Exception as e:
+                error = e
+            if error is None and result is not None:
+                self._on_success(time.perf_counter() - start)
+                return result
+            delay = self._retry_delay(error, result, attempts)
+            if delay is None:
+                return self._give_up(error, result)
+            time.sleep(delay)
+
+    async def acall(self, fn: Callable[[], Awaitable], tokens: int = 0):
+        """Async counterpart of `call`, for a coroutine function `fn`."""
+        with self._lock:
+            self._counters["calls"] += 1
+        attempts = {"parse": 0, "transport": 0}
+        while True:
+            wait_seconds = self._rate_wait(tokens)
+            if wait_seconds:
+                await asyncio.sleep(wait_seconds)
+            await self._aacquire()
+            error, result = None, None
+            start = time.perf_counter()
+            try:
+                with self._lock:
+                    self._counters["attempts"] += 1
+                result = await self._arun(fn, tokens)
+            except Exception as e:
+                error = e
+            finally:
+                self._release()
+            if error is None and result is not None:
+                self._on_success(time.perf_counter() - start)
+                return result
+            delay = self._retry_delay(error, result, attempts)
+            if delay is None:
+                return self._give_up(error, result)
+            await asyncio.sleep(delay)
+
+    def stats(self) -> Dict:
+        """Returns call, retry, throttle and hedge counters and the current concurrency state."""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            return {
+                **self._counters,
+                "concurrency_limit": self._slots(),
+                "in_flight": self._in_flight,
+                "waiting": len(self._waiters),
+                "p50_seconds": latencies[len(latencies) // 2] if latencies else None,
+                "p95_seconds": latencies[int(0.95 * len(latencies))] if latencies else None,
+            }
+
+
+_scheduler = LLMScheduler()
+
+
+def get_scheduler() -> LLMScheduler:
+    """Returns the scheduler shared by every tool in the process."""
+    return _scheduler
+
+
+def set_scheduler(scheduler: LLMScheduler) -> None:
+    """Replaces the process-wide scheduler, e.g. with one configured for the provider's quotas."""
+    global _scheduler
+    _scheduler = scheduler
@@ -0,0 +1,191 @@
+"""Vectorized, id-aligned scoring and selection of prompt candidates.
+
+`Scorer` reads a `CandidateStore` into a candidates x criteria NumPy matrix. Its columns follow
+the rubric and are matched by `criterion_id`, never by position, so criteria the evaluator
+reordered or dropped cannot be misattributed. Scores are normalized to [0, 1] by their
+metric's maximum: 1 for `binary` and 5 for `scale_1_5`. Criteria without a score are NaN
+cells. With `missing="zero"` they count as 0; with `missing="skip"` they are left out of the
+candidate's aggregate.
+
+A candidate's `avg_score` is the weighted mean of its normalized scores. A criterion's weight
+comes from `weights`, else from its own `weight` field, else defaults to 1. Candidates are
+ranked by one of these selection modes:
+- `weighted_mean`: by `avg_score`.
+- `min_criterion`: by the worst normalized criterion score, then by `avg_score`.
+- `pareto`: candidates on the Pareto front of the criteria first, then by `avg_score`.
+
+Equally ranked candidates keep their generation order.
+"""
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from candidates import Candidate, CandidateStore
+
+# --- Configuration ---
+METRIC_MAXIMA = {"binary": 1.0, "scale_1_5": 5.0}
+SELECTION_MODES = ("weighted_mean", "min_criterion", "pareto")
+MISSING_POLICIES = ("zero", "skip")
+PARETO_BLOCK_ROWS = 256  # Bounds the memory of the pairwise dominance check
+
+
+class Scorer:
+    def __init__(self, weights: Optional[Dict[str, float]] = None, selection: str = "weighted_mean",
+                 missing: str = "zero"):
+        if selection not in SELECTION_MODES:
+            raise ValueError(f"Unknown selection mode {selection!r}; expected one of {SELECTION_MODES}.")
+        if missing not in MISSING_POLICIES:
+            raise ValueError(f"Unknown missing-score policy {missing!r}; expected one of {MISSING_POLICIES}.")
+        if any(weight < 0 for weight in (weights or {}).values()):
+            raise ValueError("Criterion weights must not be negative.")
+        self.weights = dict(weights or {})
+        self.selection = selection
+        self.missing = missing
+
+    def _rubric(self, evaluation_criteria: List) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """Returns the rubric's criterion ids, metric maxima and weights."""
+        ids, maxima, weights = [], [], []
+        for criterion in evaluation_criteria:
+            criterion_id, metric_type = criterion["criterion_id"], criterion["metric_type"]
+            if metric_type not in METRIC_MAXIMA:
+                raise ValueError(f"Unknown metric type {metric_type!r} of criterion {criterion_id!r}.")
+            weight = self.weights.get(criterion_id, criterion.get("weight"))
+            ids.append(criterion_id)
+            maxima.append(METRIC_MAXIMA[metric_type])
+            weights.append(1.0 if weight is None else weight)
+        return ids, np.array(maxima, dtype=np.float64), np.array(weights, dtype=np.float64)
+
+    def _aggregate(self, normalized: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        present = ~np.isnan(normalized)
+        totals = np.where(present, normalized, 0.0) @ weights
+        if self.missing == "zero":
+            denominators = np.full(len(normalized), weights.sum())
+        else:
+            denominators = present @ weights
+        return np.divide(totals, denominators, out=np.zeros_like(totals), where=denominators > 0)
+
+    def score(self, evaluation_criteria: List, scores: List[dict]) -> float:
+        """Returns the aggregate score of one candidate's evaluator `scores`."""
+        ids, maxima, weights = self._rubric(evaluation_criteria)
+        by_id = {s["criterion_id"]: s["score"] for s in scores}
+        row = np.array([[by_id.get(criterion_id, math.nan) for criterion_id in ids]], dtype=np.float64)
+        return float(self._aggregate(np.clip(row / maxima, 0.0, 1.0), weights)[0])
+
+    @staticmethod
+    def _matrix(store: CandidateStore, ids: List[str], maxima: np.ndarray,
+                pending: Sequence[Dict] = ()) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the indices of the scored candidates in ascending order and their normalized
+        candidates x criteria score matrix, with NaN for missing cells."""
+        rows, columns = store.score_columns()
+        rows = np.frombuffer(rows, dtype=np.dtype(rows.typecode))
+        scored = np.flatnonzero(rows >= 0)
+        # Score rows are in evaluation order; put them back in generation order. The matrix is
+        # filled criterion by criterion, so it is built transposed to write contiguous rows.
+        row_order = rows[scored]
+        matrix = np.full((len(ids), len(scored) + len(pending)), np.nan)
+        for position, criterion_id in enumerate(ids):
+            column = columns.get(criterion_id)
+            if column is not None:
+                np.take(np.frombuffer(column, dtype=np.float64), row_order, out=matrix[position, :len(scored)])
+        for row, op in enumerate(pending, start=len(scored)):
+            by_id = {s["criterion_id"]: s["score"] for s in op["scores"]}
+            matrix[:, row] = [by_id.get(criterion_id, math.nan) for criterion_id in ids]
+        if pending:
+            scored = np.concatenate([scored, np.array([op["index"] for op in pending], dtype=scored.dtype)])
+            order = np.argsort(scored, kind="stable")
+            scored, matrix = scored[order], matrix[:, order]
+        matrix /= maxima[:, None]
+        np.clip(matrix, 0.0, 1.0, out=matrix)
+        return scored, matrix.T
+
+    def rank(self, store: CandidateStore, evaluation_criteria: List, pending: Sequence[Dict] = ()) -> np.ndarray:
+        """Returns the indices of the scored candidates in `store`, best first.
+
+        `pending` are `candidates.score` ops for unscored candidates of `store`, which are
+        ranked as if they had been applied, without changing `store`.
+        """
+        ids, maxima, weights = self._rubric(evaluation_criteria)
+        indices, normalized = self._matrix(store, ids, maxima, pending)
+        # Both sorts are stable and `indices` ascend, so ties keep their generation order.
+        keys = [-self._aggregate(normalized, weights)]  # np.lexsort sorts by the last key first
+        if self.selection == "min_criterion" and ids:
+            if self.missing == "zero":
+                worst = np.nan_to_num(normalized, nan=0.0).min(axis=1)
+            else:
+                worst = np.nan_to_num(np.nanmin(np.where(np.isnan(normalized), np.inf, normalized), axis=1),
+                                      posinf=0.0)
+            keys.append(-worst)
+        elif self.selection == "pareto" and ids:
+            missing_value = 0.0 if self.missing == "zero" else -np.inf
+            keys.append(~pareto_front(np.nan_to_num(normalized, nan=missing_value)))
+        if len(keys) == 1:
+            return indices[np.argsort(keys[0], kind="stable")]
+        return indices[np.lexsort(keys)]
+
+    def best(self, store: CandidateStore, evaluation_criteria: List, n: int = 1) -> List[Candidate]:
+        """Returns the top `n` scored candidates in `store`, best first."""
+        return [store[int(index)] for index in self.rank(store, evaluation_criteria)[:n]]
+
+
+def _unique_rows(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Like `np.unique(values, axis=0, return_inverse=True)`, which sorts the rows as opaque
+    byte strings and is several times slower."""
+    order = np.lexsort(values.T[::-1])
+    ordered = values[order]
+    starts = np.ones(len(values), dtype=bool)
+    starts[1:] = (ordered[1:] != ordered[:-1]).any(axis=1)
+    inverse = np.empty(len(values), dtype=np.intp)
+    inverse[order] = np.cumsum(starts) - 1
+    return ordered[starts], inverse
+
+
+def _matched_or_beaten(rivals: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """Returns a rivals x rows mask of whether the rival matches or beats the row on every column."""
+    at_least = np.ones((len(rivals), len(rows)), dtype=bool)
+    for column in range(rows.shape[1]):  # Columns are few; each pass is vectorized over all pairs.
+        at_least &= rivals[:, column, None] >= rows[None, :, column]
+    return at_least
+
+
+def pareto_front(values: np.ndarray) -> np.ndarray:
+    """Returns a mask of the rows of `values` that no other row dominates, i.e. that no other
+    row matches or beats on every column and beats on at least one."""
+    if not len(values):
+        return np.zeros(0, dtype=bool)
+    # Scores are discrete, so many candidates share a row; compare each distinct row once.
+    # Between distinct rows, matching or beating on every column implies beating on one.
+    rows, inverse = _unique_rows(values)
+    # A dominating row has a larger sum, so it comes first in this order. A row dominated by
+    # any row is dominated by a row of the front, so each block of rows is checked against
+    # the front found so far, and the survivors against each other.
+    order = np.argsort(-np.where(np.isneginf(rows), -1.0, rows).sum(axis=1), kind="stable")
+    rows = rows[order]
+    on_front = np.zeros(len(rows), dtype=bool)
+    front = rows[:0]
+    for start in range(0, len(rows), PARETO_BLOCK_ROWS):
+        block = rows[start:start + PARETO_BLOCK_ROWS]
+        survivors = np.flatnonzero(~_matched_or_beaten(front, block).any(axis=0))
+        within = _matched_or_beaten(block[survivors], block[survivors])
+        np.fill_diagonal(within, False)
+        kept = survivors[~within.any(axis=0)]
+        on_front[start + kept] = True
+        front = np.concatenate([front, block[kept]])
+    mask = np.empty_like(on_front)
+    mask[order] = on_front
+    return mask[inverse]
+
+
+def scorer_from_spec(spec: Dict) -> Scorer:
+    """Builds a `Scorer` from a JSON-friendly dict with the optional keys `weights`
+    (criterion id to weight), `selection` and `missing`. Raises ValueError for a malformed spec."""
+    if not isinstance(spec, dict):
+        raise ValueError("A scoring spec must be a JSON object.")
+    unknown = set(spec) - {"weights", "selection", "missing"}
+    if unknown:
+        raise ValueError(f"Unknown scoring keys: {sorted(unknown)}")
+    weights = spec.get("weights", {})
+    if not isinstance(weights, dict) or not all(
+            isinstance(w, (int, float)) and not isinstance(w, bool) and math.isfinite(w) for w in weights.values()):
+        raise ValueError("Scoring weights must map criterion ids to finite numbers.")
+    return Scorer(**spec)
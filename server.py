@@ -0,0 +1,307 @@
+"""Long-lived ORCA service: a local HTTP/JSON API in front of one warm agent.
+
+The model client, tools and compiled graph are created once at startup and shared by every
+job, so a request costs only its LLM calls. Jobs go into a bounded queue drained by worker
+threads. When the queue is full, submissions are rejected with 503 and `Retry-After`
+rather than piling up.
+
+Endpoints:
+- `POST /jobs` with `{"initial_prompt", "user_goal", "stopping"?}` returns 202 and `{"id", "status"}`.
+- `GET /jobs/{id}` returns the status and progress (iteration, best score so far).
+- `GET /jobs/{id}/result` returns the final report once the job has succeeded. It returns
+  409 while the job is still running and 500 with the error if the job failed.
+- `GET /healthz` returns queue depth, LLM scheduler stats and, with a screener, screening agreement.
+- `GET /metrics` returns Prometheus metrics.
+
+Usage:
+    python server.py --port 8080 --workers 4 --queue-size 64
+"""
+import argparse
+import json
+import queue
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+from scheduler import get_scheduler
+from state import initial_state
+from stopping import policy_from_spec
+from streaming import CandidateScored, ReportReady, StopDecision, stream
+
+# --- Configuration ---
+DEFAULT_WORKERS = 4  # Jobs run concurrently; each fans its own LLM calls out further
+DEFAULT_QUEUE_SIZE = 64  # Jobs accepted but not yet started
+JOB_HISTORY = 1000  # Finished jobs kept for status and result queries
+RETRY_AFTER_SECONDS = 5
+MAX_REQUEST_BYTES = 1 << 20
+
+JOB_PATH = re.compile(r"^/jobs/([0-9a-f]+)(/result)?$")
+
+
+class JobStore:
+    """Job records by id. Only the most recent `JOB_HISTORY` finished jobs are kept."""
+
+    def __init__(self, history: int = JOB_HISTORY):
+        self.history = history
+        self._jobs = OrderedDict()
+        self._finished = 0
+        self._lock = threading.Lock()
+
+    def add(self, job: Dict) -> None:
+        with self._lock:
+            self._jobs[job["id"]] = job
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def discard(self, job_id: str) -> None:
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def update(self, job_id: str, **fields) -> None:
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(fields)
+            if fields.get("status") in ("succeeded", "failed"):
+                self._finished += 1
+                self._jobs.move_to_end(job_id)
+                while self._finished > self.history:
+                    oldest = next(j for j in self._jobs.values() if j["status"] in ("succeeded", "failed"))
+                    del self._jobs[oldest["id"]]
+                    self._finished -= 1
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            counts = {"queued": 0, "running": 0, "succeeded": 0, "failed": 0}
+            for job in self._jobs.values():
+                counts[job["status"]] += 1
+            return counts
+
+
+class OrcaService:
+    """Runs submitted jobs through one compiled graph on a pool of worker threads."""
+
+    def __init__(self, app, workers: int = DEFAULT_WORKERS, queue_size: int = DEFAULT_QUEUE_SIZE,
+                 checkpointed: bool = False, metrics=None, cascade=None):
+        self.app = app
+        self.checkpointed = checkpointed
+        self.metrics = metrics
+        self.cascade = cascade
+        self.jobs = JobStore()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._workers = [threading.Thread(target=self._work, name=f"orca-worker-{i}", daemon=True)
+                         for i in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, payload: Dict) -> Optional[Dict]:
+        """Queues a job and returns its record, or None if the queue is full.
+
+        Raises ValueError for an invalid payload.
+        """
+        if not isinstance(payload, dict):
+            raise ValueError("The request body must be a JSON object.")
+        for key in ("initial_prompt", "user_goal"):
+            if not isinstance(payload.get(key), str) or not payload[key].strip():
+                raise ValueError(f"'{key}' must be a non-empty string.")
+        config = {}
+        if payload.get("stopping"):
+            config["configurable"] = {"stopping_policy": policy_from_spec(payload["stopping"])}
+
+        job = {"id": uuid.uuid4().hex, "status": "queued", "submitted_at": time.time(), "iteration": 0,
+               "best_score": None}
+        self.jobs.add(job)
+        try:
+            self._queue.put_nowait((job["id"], payload["initial_prompt"], payload["user_goal"], config))
+        except queue.Full:
+            self.jobs.discard(job["id"])
+            return None
+        return job
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def _work(self) -> None:
+        while True:
+            job_id, initial_prompt, user_goal, config = self._queue.get()
+            self.jobs.update(job_id, status="running", started_at=time.time())
+            if self.checkpointed:
+                config = {**config, "configurable": {**config.get("configurable", {}), "thread_id": job_id}}
+            try:
+                for event in stream(self.app, initial_state(initial_prompt, user_goal, run_id=job_id), config):
+                    if isinstance(event, CandidateScored):
+                        best = self.jobs.get(job_id)["best_score"]
+                        if best is None or event.avg_score > best:
+                            self.jobs.update(job_id, best_score=event.avg_score)
+                    elif isinstance(event, StopDecision):
+                        self.jobs.update(job_id, iteration=event.iteration)
+                    elif isinstance(event, ReportReady):
+                        self.jobs.update(job_id, result={
+                            "final_rationale": event.report,
+                            "stop_reason": event.stop_reason,
+                            "llm_calls": event.state.get("llm_calls", 0),
+                            "tokens_used": event.state.get("tokens_used", 0),
+                        })
+                self.jobs.update(job_id, status="succeeded", finished_at=time.time())
+            except Exception as e:
+                self.jobs.update(job_id, status="failed", finished_at=time.time(), error=f"{type(e).__name__}: {e}")
+
+
+def _status_view(job: Dict) -> Dict:
+    return {key: value for key, value in job.items() if key != "result"}
+
+
+def make_handler(service: OrcaService):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Keep-alive, so clients can reuse connections
+
+        def _send(self, status: int, body: Dict, headers: Optional[Dict] = None) -> None:
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _read_json(self) -> Tuple[Optional[Dict], Optional[str]]:
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+            except ValueError:
+                length = -1
+            if length < 0:
+                self.close_connection = True  # The body's extent is unknown
+                return None, "Invalid Content-Length header."
+            if length > MAX_REQUEST_BYTES:
+                self.close_connection = True  # The unread body would otherwise be parsed as a request
+                return None, "Request body too large."
+            try:
+                return json.loads(self.rfile.read(length) or b"null"), None
+            except json.JSONDecodeError as e:
+                return None, f"Invalid JSON: {e}"
+
+        def do_POST(self):
+            if self.path != "/jobs":
+                return self._send(404, {"error": "Not found."})
+            payload, error = self._read_json()
+            if error:
+                return self._send(400, {"error": error})
+            try:
+                job = service.submit(payload)
+            except ValueError as e:
+                return self._send(400, {"error": str(e)})
+            if job is None:
+                return self._send(503, {"error": "The job queue is full; retry later."},
+                                  {"Retry-After": str(RETRY_AFTER_SECONDS)})
+            self._send(202, {"id": job["id"], "status": job["status"]}, {"Location": f"/jobs/{job['id']}"})
+
+        def do_GET(self):
+            if self.path == "/healthz":
+                health = {"status": "ok", "queue_depth": service.queue_depth(), "jobs": service.jobs.counts(),
+                          "scheduler": get_scheduler().stats()}
+                if service.cascade is not None:
+                    health["screening"] = service.cascade.summary()
+                return self._send(200, health)
+            if self.path == "/metrics":
+                if service.metrics is None:
+                    return self._send(404, {"error": "Metrics are disabled."})
+                data = service.metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                return
+            match = JOB_PATH.match(self.path)
+            job = service.jobs.get(match.group(1)) if match else None
+            if job is None:
+                return self._send(404, {"error": "Not found."})
+            if not match.group(2):
+                return self._send(200, _status_view(job))
+            if job["status"] == "succeeded":
+                return self._send(200, {"id": job["id"], **job["result"]})
+            if job["status"] == "failed":
+                return self._send(500, {"id": job["id"], "error": job.get("error")})
+            self._send(409, {"id": job["id"], "status": job["status"], "error": "The job has not finished."})
+
+        def log_message(self, format, *args):
+            pass  # Request logs would drown the agent's own output; use /metrics instead.
+
+    return Handler
+
+
+def main(argv=None) -> int:
+    from agents import MAX_ITERATIONS
+    from main import add_model_arguments
+
+    parser = argparse.ArgumentParser(description="Serve ORCA prompt optimization over a local HTTP/JSON API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Jobs run concurrently.")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help="Jobs accepted but not yet started; beyond this, submissions get a 503.")
+    parser.add_argument("--population-size", type=int, default=1)
+    parser.add_argument("--beam-width", type=int, default=1)
+    parser.add_argument("--max-iterations", type=int, default=MAX_ITERATIONS,
+                        help="Hard cap on the iterations of every job, whatever its stopping policy.")
+    parser.add_argument("--evaluation-shard-size", type=int)
+    parser.add_argument("--speculative-report", action="store_true")
+    parser.add_argument("--scoring", help="Scoring spec as JSON (see `scoring.scorer_from_spec`).")
+    parser.add_argument("--cache-db", help="SQLite file for the LLM response cache.")
+    parser.add_argument("--rubric-index", help="JSONL file of generated rubrics to reuse for similar jobs.")
+    parser.add_argument("--similarity-threshold", type=float, default=0.9,
+                        help="Minimum similarity for a job to reuse an indexed rubric.")
+    parser.add_argument("--checkpoint-db", help="SQLite file to checkpoint every job in after each node.")
+    parser.add_argument("--verbose", action="store_true", help="Print agent progress.")
+    add_model_arguments(parser)
+    args = parser.parse_args(argv)
+
+    from agents import OrcaAgent
+    from cache import open_cache
+    from main import create_models
+    from scoring import scorer_from_spec
+    from telemetry import PrometheusSink, Telemetry
+
+    rubric_index = None
+    if args.rubric_index:
+        from rubric_index import RubricIndex
+
+        rubric_index = RubricIndex(args.rubric_index, threshold=args.similarity_threshold)
+    checkpointer = None
+    if args.checkpoint_db:
+        from checkpoints import open_checkpointer
+
+        checkpointer = open_checkpointer(args.checkpoint_db)
+
+    # Everything expensive happens once, before the first request.
+    metrics = PrometheusSink()
+    agent = OrcaAgent(**create_models(args), population_size=args.population_size, beam_width=args.beam_width,
+                      max_iterations=args.max_iterations, cache=open_cache(args.cache_db) if args.cache_db else None,
+                      evaluation_shard_size=args.evaluation_shard_size, speculative_report=args.speculative_report,
+                      rubric_index=rubric_index, scorer=scorer_from_spec(json.loads(args.scoring)) if args.scoring else None,
+                      telemetry=Telemetry(metrics, verbose=args.verbose))
+    service = OrcaService(agent.get_graph(checkpointer=checkpointer), workers=args.workers,
+                          queue_size=args.queue_size, checkpointed=checkpointer is not None, metrics=metrics,
+                          cascade=agent.cascade)
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    print(f"ORCA service listening on http://{args.host}:{args.port}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,12 @@
 from typing import List, Dict, Literal, Optional
 import json
+import time
+import uuid
 
 from pydantic import BaseModel, Field, validator
-from typing_extensions import TypedDict
+from typing_extensions import Annotated, TypedDict
+
+from candidates import CandidateStore, merge_candidates
 
 
 class DecomposedGoals(BaseModel):
@@ -62,11 +66,37 @@ class FinalReport(BaseModel):
 
 class AgentState(TypedDict):
     """Represents the state of our graph."""
+    run_id: str
     initial_prompt: str
     user_goal: str
     decomposed_goals: List[str]
     evaluation_criteria: List[EvaluationCriterion]
-    prompt_candidates: List  # List of dicts with 'text', 'scores', 'avg_score'
+    prompt_candidates: Annotated[CandidateStore, merge_candidates]  # Nodes write lists of candidate ops
     iteration_count: int
     final_prompt: str
     final_rationale: Dict
+    started_at: float  # Unix time the run started or was last resumed, for deadline-based stopping
+    llm_calls: int  # LLM calls made so far in this run
+    tokens_used: int  # Estimated input + output tokens used so far in this run
+    stop_reason: Optional[str]  # Why the Construct loop stopped, once it has
+    rubric_source: Optional[Dict]  # Rubric index entry reused instead of running Orient/Refine
+
+
+def initial_state(initial_prompt: str, user_goal: str, run_id: Optional[str] = None) -> AgentState:
+    """Returns the starting state for one optimization run."""
+    return {
+        "run_id": run_id or uuid.uuid4().hex,
+        "initial_prompt": initial_prompt,
+        "user_goal": user_goal,
+        "decomposed_goals": [],
+        "evaluation_criteria": [],
+        "prompt_candidates": CandidateStore(),
+        "iteration_count": 0,
+        "final_prompt": "",
+        "final_rationale": {},
+        "started_at": time.time(),
+        "llm_calls": 0,
+        "tokens_used": 0,
+        "stop_reason": None,
+        "rubric_source": None
+    }
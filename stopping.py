@@ -0,0 +1,192 @@
+"""Stopping policies for the Construct loop.
+
+A policy inspects the state after each evaluate step and returns a human-readable reason to
+stop, or None to keep iterating. Policies combine with `AnyOf`, and a run can override the
+agent's policy through `config={"configurable": {"stopping_policy": ...}}`. Whatever the
+policy, the agent also stops at its hard `max_iterations` cap.
+"""
+import math
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from state import AgentState
+
+
+def best_score_history(state: AgentState) -> List[float]:
+    """Returns the best score reached in each iteration with a scored candidate, in order."""
+    iterations, rows, avg_scores = state["prompt_candidates"].avg_score_columns()
+    rows = np.frombuffer(rows, dtype=np.dtype(rows.typecode))
+    scored = rows >= 0
+    iterations = np.frombuffer(iterations, dtype=np.dtype(iterations.typecode))[scored]
+    if not len(iterations):
+        return []
+    scores = np.frombuffer(avg_scores, dtype=np.float64)[rows[scored]]
+    order = np.argsort(iterations, kind="stable")
+    iterations, scores = iterations[order], scores[order]
+    starts = np.flatnonzero(np.r_[True, iterations[1:] != iterations[:-1]])
+    return np.maximum(np.maximum.reduceat(scores, starts), 0.0).tolist()
+
+
+class StoppingPolicy:
+    def check(self, state: AgentState) -> Optional[str]:
+        raise NotImplementedError
+
+
+class AnyOf(StoppingPolicy):
+    """Stops as soon as any of the given policies does."""
+
+    def __init__(self, *policies: StoppingPolicy):
+        self.policies = policies
+
+    def check(self, state: AgentState) -> Optional[str]:
+        for policy in self.policies:
+            reason = policy.check(state)
+            if reason:
+                return reason
+        return None
+
+
+class MaxIterations(StoppingPolicy):
+    def __init__(self, max_iterations: int):
+        self.max_iterations = max_iterations
+
+    def check(self, state: AgentState) -> Optional[str]:
+        if state["iteration_count"] >= self.max_iterations:
+            return f"Max iterations ({self.max_iterations}) reached."
+        return None
+
+
+class QualityThreshold(StoppingPolicy):
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+
+    def check(self, state: AgentState) -> Optional[str]:
+        history = best_score_history(state)
+        if history and max(history) >= self.threshold:
+            return f"Quality threshold ({self.threshold}) met."
+        return None
+
+
+class Plateau(StoppingPolicy):
+    """Stops when the best score improved by less than `min_delta` over the last `window` iterations."""
+
+    def __init__(self, window: int = 2, min_delta: float = 0.01):
+        self.window = window
+        self.min_delta = min_delta
+
+    def check(self, state: AgentState) -> Optional[str]:
+        history = best_score_history(state)
+        if len(history) <= self.window:
+            return None
+        gain = max(history) - max(history[:-self.window])
+        if gain < self.min_delta:
+            return f"Scores plateaued (gain {gain:.3f} over the last {self.window} iterations)."
+        return None
+
+
+class NoImprovement(StoppingPolicy):
+    """Stops after `max_rounds` consecutive iterations that did not beat the best score so far."""
+
+    def __init__(self, max_rounds: int = 2):
+        self.max_rounds = max_rounds
+
+    def check(self, state: AgentState) -> Optional[str]:
+        history = best_score_history(state)
+        rounds = 0
+        best = float("-inf")
+        for score in history:
+            if score > best:
+                best, rounds = score, 0
+            else:
+                rounds += 1
+        if rounds >= self.max_rounds:
+            return f"No improvement for {rounds} iterations."
+        return None
+
+
+class Deadline(StoppingPolicy):
+    """Stops once the run has been going for `seconds` since its `started_at` time, which
+    resuming a checkpointed run resets."""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+
+    def check(self, state: AgentState) -> Optional[str]:
+        elapsed = time.time() - state.get("started_at", time.time())
+        if elapsed >= self.seconds:
+            return f"Deadline of {self.seconds}s reached ({elapsed:.1f}s elapsed)."
+        return None
+
+
+class CallBudget(StoppingPolicy):
+    """Stops once the run has made `max_calls` LLM calls."""
+
+    def __init__(self, max_calls: int):
+        self.max_calls = max_calls
+
+    def check(self, state: AgentState) -> Optional[str]:
+        if state.get("llm_calls", 0) >= self.max_calls:
+            return f"LLM call budget ({self.max_calls}) exhausted."
+        return None
+
+
+class TokenBudget(StoppingPolicy):
+    """Stops once the run has used `max_tokens` estimated input and output tokens."""
+
+    def __init__(self, max_tokens: int):
+        self.max_tokens = max_tokens
+
+    def check(self, state: AgentState) -> Optional[str]:
+        if state.get("tokens_used", 0) >= self.max_tokens:
+            return f"Token budget ({self.max_tokens}) exhausted."
+        return None
+
+
+def _spec_value(key: str, value, kind: type, minimum: float, maximum: float = math.inf):
+    """Returns `value` if it is a `kind` between `minimum` and `maximum`, else raises ValueError."""
+    kinds = (int,) if kind is int else (int, float)
+    if isinstance(value, bool) or not isinstance(value, kinds) or not minimum <= value <= maximum:
+        expected = "an integer" if kind is int else "a number"
+        bounds = f"at least {minimum}" if maximum == math.inf else f"between {minimum} and {maximum}"
+        raise ValueError(f"Stopping policy {key!r} must be {expected} {bounds}, got {value!r}.")
+    return value
+
+
+def policy_from_spec(spec: Dict) -> StoppingPolicy:
+    """Builds an `AnyOf` policy from a JSON-friendly dict, e.g. a batch job's `stopping` field.
+
+    Recognized keys: `max_iterations`, `quality_threshold`, `plateau` (`{"window", "min_delta"}`),
+    `max_rounds_without_improvement`, `deadline_seconds`, `max_calls` and `max_tokens`.
+    Raises ValueError for unknown keys and for values of the wrong type or out of range.
+    """
+    if not isinstance(spec, dict):
+        raise ValueError("A stopping policy spec must be a JSON object.")
+    unknown = set(spec) - {"max_iterations", "quality_threshold", "plateau", "max_rounds_without_improvement",
+                           "deadline_seconds", "max_calls", "max_tokens"}
+    if unknown:
+        raise ValueError(f"Unknown stopping policy keys: {sorted(unknown)}")
+    policies = []
+    if "max_iterations" in spec:
+        policies.append(MaxIterations(_spec_value("max_iterations", spec["max_iterations"], int, 1)))
+    if "quality_threshold" in spec:
+        policies.append(QualityThreshold(_spec_value("quality_threshold", spec["quality_threshold"], float, 0, 1)))
+    if "plateau" in spec:
+        plateau = spec["plateau"]
+        if not isinstance(plateau, dict) or set(plateau) - {"window", "min_delta"}:
+            raise ValueError("Stopping policy 'plateau' must be an object with optional keys 'window' and "
+                             "'min_delta'.")
+        policies.append(Plateau(
+            window=_spec_value("plateau.window", plateau.get("window", 2), int, 1),
+            min_delta=_spec_value("plateau.min_delta", plateau.get("min_delta", 0.01), float, 0)))
+    if "max_rounds_without_improvement" in spec:
+        policies.append(NoImprovement(_spec_value("max_rounds_without_improvement",
+                                                  spec["max_rounds_without_improvement"], int, 1)))
+    if "deadline_seconds" in spec:
+        policies.append(Deadline(_spec_value("deadline_seconds", spec["deadline_seconds"], float, 0)))
+    if "max_calls" in spec:
+        policies.append(CallBudget(_spec_value("max_calls", spec["max_calls"], int, 1)))
+    if "max_tokens" in spec:
+        policies.append(TokenBudget(_spec_value("max_tokens", spec["max_tokens"], int, 1)))
+    return AnyOf(*policies)
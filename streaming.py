@@ -0,0 +1,117 @@
+"""Typed progress events streamed from a running ORCA graph.
+
+`stream` and `astream` drive a compiled graph with LangGraph's `updates` and `values` stream
+modes and translate each node's state update into events, so callers see goals, criteria,
+candidates and scores as soon as each node finishes, instead of only the final state. Nodes
+return only the keys they change, so each update is read against the state it applies to.
+
+    for event in stream(app, initial_state(prompt, goal)):
+        if isinstance(event, CandidateScored):
+            ...
+"""
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+
+from state import AgentState
+
+
+@dataclass(frozen=True)
+class OrcaEvent:
+    run_id: Optional[str]
+
+
+@dataclass(frozen=True)
+class GoalsDecomposed(OrcaEvent):
+    goals: List[str]
+    reused: bool = False  # Taken from the rubric index rather than generated
+
+
+@dataclass(frozen=True)
+class CriteriaReady(OrcaEvent):
+    criteria: List[Dict]
+    reused: bool = False
+
+
+@dataclass(frozen=True)
+class CandidateGenerated(OrcaEvent):
+    iteration: int
+    text: str
+
+
+@dataclass(frozen=True)
+class CandidateScored(OrcaEvent):
+    iteration: int
+    text: str
+    avg_score: float
+    scores: List[Dict] = field(repr=False)
+
+
+@dataclass(frozen=True)
+class StopDecision(OrcaEvent):
+    iteration: int
+    stop: bool
+    reason: Optional[str]
+
+
+@dataclass(frozen=True)
+class ReportReady(OrcaEvent):
+    report: Dict
+    stop_reason: Optional[str]
+    state: AgentState = field(repr=False)  # The final state, as `app.invoke` would return it
+
+
+def events_from_update(node: str, update: Dict, state: AgentState) -> List[OrcaEvent]:
+    """Returns the events for one node's state update, made to `state`."""
+    run_id = state.get("run_id")
+    if node == "recall":
+        if not update.get("rubric_source"):
+            return []
+        return [GoalsDecomposed(run_id, update["decomposed_goals"], reused=True),
+                CriteriaReady(run_id, update["evaluation_criteria"], reused=True)]
+    if node == "orient":
+        return [GoalsDecomposed(run_id, update["decomposed_goals"])]
+    if node == "refine":
+        return [CriteriaReady(run_id, update["evaluation_criteria"])]
+    if node == "ideate":
+        return [CandidateGenerated(run_id, op["iteration"], op["text"])
+                for op in update["prompt_candidates"] if op["op"] == "add"]
+    if node == "evaluate":
+        candidates = state["prompt_candidates"]
+        return [CandidateScored(run_id, candidates[op["index"]].iteration, candidates[op["index"]].text,
+                                op["avg_score"], op["scores"])
+                for op in update["prompt_candidates"] if op["op"] == "score"]
+    if node == "decide":
+        return [StopDecision(run_id, state["iteration_count"], bool(update.get("stop_reason")),
+                             update.get("stop_reason"))]
+    if node == "act":
+        final_state = {**state, **update}
+        return [ReportReady(run_id, update["final_rationale"], final_state.get("stop_reason"), final_state)]
+    return []
+
+
+def _events(chunk, values: List[AgentState]) -> List[OrcaEvent]:
+    """Translates one `(mode, data)` chunk; `values` holds the latest full state. LangGraph
+    emits the state before each step's updates, including when a checkpointed run resumes."""
+    mode, data = chunk
+    if mode == "values":
+        values[:] = [data]
+        return []
+    return [event for node, update in data.items() for event in events_from_update(node, update, values[0])]
+
+
+def stream(app, state: Optional[AgentState], config: Optional[Dict] = None) -> Iterator[OrcaEvent]:
+    """Runs the sync graph `app` and yields its events as they happen.
+
+    `state` may be None to continue a checkpointed run named in `config`.
+    """
+    values = []
+    for chunk in app.stream(state, config=config, stream_mode=["updates", "values"]):
+        yield from _events(chunk, values)
+
+
+async def astream(app, state: Optional[AgentState], config: Optional[Dict] = None) -> AsyncIterator[OrcaEvent]:
+    """Async counterpart of `stream`, for graphs from `OrcaAgent.get_async_graph`."""
+    values = []
+    async for chunk in app.astream(state, config=config, stream_mode=["updates", "values"]):
+        for event in _events(chunk, values):
+            yield event
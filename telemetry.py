@@ -0,0 +1,174 @@
+"""Tracing and metrics for graph nodes and tool calls.
+
+A `Telemetry` object is shared by an `OrcaAgent` and its tools. It emits structured events
+to a pluggable sink and prints human-readable progress only when `verbose` is set. With no
+sink, emitting is a single attribute check, so instrumentation costs nothing measurable.
+
+Events are plain dicts with an `event` field:
+- `node`: graph node wall time (`node`, `run_id`, `seconds`, `error`).
+- `llm_call`: one tool call (`tool`, `seconds`, `outcome`, prompt/response sizes and
+  estimated tokens). `outcome` is `ok`, `cache_hit`, `none` (the model returned no
+  structured output), `parse_error` or `error`.
+- `run`: a finished run (`run_id`, `iterations`, `score_trajectory`, `final_score`).
+- `speculation`: a speculative final report was `started`, `used`, `superseded` (cancelled before it
+  finished), `discarded` (superseded too late to cancel) or `failed`.
+- `rubric_reused`: a run reused an indexed rubric (`run_id`, `entry_id`, `similarity`).
+- `screening`: a candidate's cascaded evaluation role (`run_id`, `outcome`, plus `reason` or
+  `screening_score`). `outcome` is `rejected`, `finalist`, `promoted`, `audited` or `screened_out`.
+
+Events emitted inside `Telemetry.tagged(...)` carry its tags, e.g. `speculative=True`.
+"""
+import contextvars
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+_event_tags = contextvars.ContextVar("orca_event_tags", default={})
+
+
+class Sink:
+    """Receives telemetry events."""
+
+    def emit(self, event: Dict) -> None:
+        raise NotImplementedError
+
+
+class InMemorySink(Sink):
+    """Keeps the most recent `max_events` events in `self.events`."""
+
+    def __init__(self, max_events: Optional[int] = None):
+        self.events = deque(maxlen=max_events)
+
+    def emit(self, event: Dict) -> None:
+        self.events.append(event)
+
+
+class JsonlSink(Sink):
+    """Appends one JSON line per event to a file."""
+
+    def __init__(self, path: str):
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def emit(self, event: Dict) -> None:
+        line = json.dumps(event, default=str) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+class PrometheusSink(Sink):
+    """Aggregates events into counters and summaries rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)  # (metric, labels) -> value
+        self._summaries = defaultdict(lambda: [0.0, 0])  # (metric, labels) -> [sum, count]
+
+    def emit(self, event: Dict) -> None:
+        with self._lock:
+            kind = event["event"]
+            if kind == "node":
+                labels = (("node", event["node"]),)
+                self._summaries[("orca_node_seconds", labels)][0] += event["seconds"]
+                self._summaries[("orca_node_seconds", labels)][1] += 1
+                if event.get("error"):
+                    self._counters[("orca_node_errors_total", labels)] += 1
+            elif kind == "llm_call":
+                labels = (("tool", event["tool"]),)
+                if event.get("speculative"):
+                    labels += (("speculative", "true"),)
+                self._counters[("orca_llm_calls_total", labels + (("outcome", event["outcome"]),))] += 1
+                self._counters[("orca_llm_input_tokens_total", labels)] += event.get("input_tokens", 0)
+                self._counters[("orca_llm_output_tokens_total", labels)] += event.get("output_tokens", 0)
+                if event["outcome"] != "cache_hit":
+                    self._summaries[("orca_llm_call_seconds", labels)][0] += event["seconds"]
+                    self._summaries[("orca_llm_call_seconds", labels)][1] += 1
+            elif kind == "speculation":
+                self._counters[("orca_speculative_reports_total", (("outcome", event["outcome"]),))] += 1
+            elif kind == "screening":
+                self._counters[("orca_screened_candidates_total", (("outcome", event["outcome"]),))] += 1
+            elif kind == "run":
+                self._counters[("orca_runs_total", ())] += 1
+                self._summaries[("orca_run_iterations", ())][0] += event["iterations"]
+                self._summaries[("orca_run_iterations", ())][1] += 1
+            else:
+                self._counters[(f"orca_{kind}_total", ())] += 1
+
+    @staticmethod
+    def _format(name: str, labels, value) -> str:
+        if labels:
+            label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+            return f"{name}{{{label_text}}} {value}"
+        return f"{name} {value}"
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for metric in sorted({m for m, _ in self._counters}):
+                lines.append(f"# TYPE {metric} counter")
+                for (m, labels), value in sorted(self._counters.items()):
+                    if m == metric:
+                        lines.append(self._format(m, labels, value))
+            for metric in sorted({m for m, _ in self._summaries}):
+                lines.append(f"# TYPE {metric} summary")
+                for (m, labels), (total, count) in sorted(self._summaries.items()):
+                    if m == metric:
+                        lines.append(self._format(f"{m}_sum", labels, total))
+                        lines.append(self._format(f"{m}_count", labels, count))
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str) -> None:
+        """Writes the current metrics for the node_exporter textfile collector."""
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+
+
+class Telemetry:
+    def __init__(self, sink: Optional[Sink] = None, verbose: bool = False):
+        self.sink = sink
+        self.verbose = verbose
+
+    @property
+    def enabled(self) -> bool:
+        return self.sink is not None
+
+    def log(self, message: str) -> None:
+        if self.verbose:
+            print(message)
+
+    def emit(self, event: str, **fields) -> None:
+        if self.sink is not None:
+            self.sink.emit({"event": event, "ts": time.time(), **_event_tags.get(), **fields})
+
+    @contextmanager
+    def tagged(self, **tags):
+        """Adds `tags` to every event emitted in this context, including from its tasks."""
+        token = _event_tags.set({**_event_tags.get(), **tags})
+        try:
+            yield
+        finally:
+            _event_tags.reset(token)
+
+    @contextmanager
+    def span(self, event: str, **fields):
+        """Emits `event` with the wall time of the `with` block, and whether it raised."""
+        if self.sink is None:
+            yield
+            return
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            self.emit(event, seconds=time.perf_counter() - start, error=error, **fields)
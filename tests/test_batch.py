@@ -0,0 +1,38 @@
+import json
+
+import pytest
+
+from batch import main, read_jobs
+
+
+def test_read_jobs_reports_malformed_lines_and_keeps_going():
+    lines = [
+        json.dumps({"id": "a", "initial_prompt": "p", "user_goal": "g"}),
+        "not json",
+        json.dumps({"id": "b", "user_goal": "g"}),
+        "",
+        json.dumps(["p", "g"]),
+        json.dumps({"initial_prompt": "q", "user_goal": "g"}),
+    ]
+    jobs = list(read_jobs(lines))
+    assert [job["id"] for job in jobs if "error" not in job] == ["a", jobs[-1]["id"]]
+    errors = [job for job in jobs if "error" in job]
+    assert [(job["id"], job["line"]) for job in errors] == [(None, 2), ("b", 3), (None, 5)]
+    assert errors[0]["error"].startswith("JSONDecodeError")
+
+
+def test_read_jobs_skips_completed_ids_and_other_shards():
+    lines = [json.dumps({"id": str(i), "initial_prompt": "p", "user_goal": "g"}) for i in range(6)]
+    assert [job["id"] for job in read_jobs(lines, skip_ids={"2"}, shard_index=0, num_shards=2)] == ["0", "4"]
+
+
+@pytest.mark.parametrize("flag, spec", [
+    ("--scoring", "{not json"),
+    ("--scoring", '{"selection": "best"}'),
+    ("--stopping", '{"max_iterations": 0}'),
+])
+def test_main_rejects_invalid_specs_at_startup(flag, spec, capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        main(["--input", "-", flag, spec])
+    assert exit_info.value.code == 2
+    assert f"Invalid {flag}" in capsys.readouterr().err
@@ -0,0 +1,114 @@
+import pytest
+
+import cache
+from cache import MemoryCache, SQLiteCache, TieredCache, cache_key, open_cache
+from fake_llm import FakeChatModel
+from state import DecomposedGoals, EvaluationResult
+from tools import GoalDecomposer
+
+
+class Clock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    instance = Clock()
+    monkeypatch.setattr(cache.time, "time", instance)
+    return instance
+
+
+def test_cache_key_is_stable_and_covers_every_input():
+    key = cache_key(FakeChatModel(), "GoalDecomposer", "prompt", DecomposedGoals)
+    # Another instance of the same model, with other seeds or latencies, answers alike.
+    assert cache_key(FakeChatModel(seed=7, latency_seconds=1.0), "GoalDecomposer", "prompt", DecomposedGoals) == key
+    other_model = FakeChatModel(model="fake-other")
+    hotter_model = FakeChatModel()
+    hotter_model.temperature = 0.7
+    assert len({key,
+                cache_key(other_model, "GoalDecomposer", "prompt", DecomposedGoals),
+                cache_key(hotter_model, "GoalDecomposer", "prompt", DecomposedGoals),
+                cache_key(FakeChatModel(), "CriteriaGenerator", "prompt", DecomposedGoals),
+                cache_key(FakeChatModel(), "GoalDecomposer", "prompt ", DecomposedGoals),
+                cache_key(FakeChatModel(), "GoalDecomposer", "prompt", EvaluationResult)}) == 6
+
+
+def test_memory_cache_evicts_the_least_recently_used():
+    memory = MemoryCache(max_entries=2)
+    memory.set("a", {"v": 1})
+    memory.set("b", {"v": 2})
+    assert memory.get("a") == {"v": 1}  # "b" is now the least recently used
+    memory.set("c", {"v": 3})
+    assert memory.get("b") is None
+    assert memory.get("a") == {"v": 1} and memory.get("c") == {"v": 3}
+    assert memory.stats() == {"hits": 3, "misses": 1}
+
+
+def test_sqlite_cache_persists_across_connections(tmp_path):
+    path = str(tmp_path / "cache.db")
+    disk = SQLiteCache(path)
+    disk.set("a", {"v": [1, 2]})
+    disk.close()
+    assert SQLiteCache(path).get("a") == {"v": [1, 2]}
+
+
+def test_sqlite_cache_expires_entries_after_the_ttl(tmp_path, clock):
+    disk = SQLiteCache(str(tmp_path / "cache.db"), ttl_seconds=60)
+    disk.set("a", {"v": 1})
+    clock.now += 60
+    assert disk.get("a") == {"v": 1}
+    # Reads refresh recency but not age: the TTL runs from when the entry was written.
+    clock.now += 1
+    assert disk.get("a") is None
+    clock.now += 3600
+    assert disk.get("a") is None
+    forever = SQLiteCache(str(tmp_path / "forever.db"), ttl_seconds=None)
+    forever.set("a", {"v": 1})
+    clock.now += 10 ** 9
+    assert forever.get("a") == {"v": 1}
+
+
+def test_sqlite_cache_eviction_keeps_the_most_recently_accessed(tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(cache, "DISK_EVICTION_INTERVAL", 1)
+    disk = SQLiteCache(str(tmp_path / "cache.db"), ttl_seconds=100, max_entries=2)
+    for key in ("a", "b"):
+        disk.set(key, {"key": key})
+        clock.now += 1
+    assert disk.get("a") is not None  # Refreshes "a", so "b" is evicted next
+    clock.now += 1
+    disk.set("c", {"key": "c"})
+    assert disk.get("b") is None
+    assert disk.get("a") is not None and disk.get("c") is not None
+    # An eviction pass also drops expired entries, however recently they were read.
+    clock.now += 101
+    disk.set("d", {"key": "d"})
+    assert disk._conn.execute("SELECT key FROM llm_cache").fetchall() == [("d",)]
+
+
+def test_tiered_cache_promotes_disk_hits_into_memory(tmp_path):
+    path = str(tmp_path / "cache.db")
+    first = open_cache(path)
+    first.set("a", {"v": 1})
+    assert first.memory.get("a") == {"v": 1}
+
+    tiered = TieredCache(MemoryCache(), SQLiteCache(path))
+    assert tiered.get("a") == {"v": 1}  # From disk, then promoted
+    assert tiered.get("a") == {"v": 1}  # From memory
+    assert tiered.get("missing") is None
+    assert tiered.stats() == {"hits": 2, "misses": 1, "memory": {"hits": 1, "misses": 2},
+                              "disk": {"hits": 1, "misses": 1}}
+
+
+def test_tools_serve_repeated_calls_from_the_cache():
+    model = FakeChatModel()
+    decomposer = GoalDecomposer(model, cache=open_cache())
+    first = decomposer.run("Summarize the text.", "Short summaries.")
+    second = decomposer.run("Summarize the text.", "Short summaries.")
+    assert first == second
+    assert model.calls["DecomposedGoals"] == 1
+    assert decomposer.usage["calls"] == 1
+    assert GoalDecomposer(model, cache=open_cache(), cacheable=False).cache is None
@@ -0,0 +1,72 @@
+import math
+
+import pytest
+
+import candidates
+from candidates import CandidateStore, merge_candidates
+
+
+def scores(**values):
+    return [{"criterion_id": key, "score": value, "justification": f"{key} reason"} for key, value in values.items()]
+
+
+def test_reducer_applies_ops_in_order():
+    store = merge_candidates(None, [candidates.reset(["a", "b"])])
+    store = merge_candidates(store, [candidates.add("first", 0), candidates.add("second", 0)])
+    store = merge_candidates(store, [candidates.score(1, scores(b=3, a=1), 0.7)])
+    assert store.criterion_ids == ["a", "b"]
+    assert [c.text for c in store] == ["first", "second"]
+    assert [c.index for c in store.pending(0)] == [0]
+    assert store[1].avg_score == 0.7
+    # Scores come back in rubric order, whatever order the evaluator used.
+    assert [(s["criterion_id"], s["score"]) for s in store[1].scores] == [("a", 1.0), ("b", 3.0)]
+
+
+def test_reducer_treats_empty_updates_as_no_ops_and_stores_as_replacements():
+    store = CandidateStore().apply([candidates.add("x", 0)])
+    assert len(merge_candidates(store, None)) == 1
+    assert len(merge_candidates(store, [])) == 1
+    replacement = CandidateStore()
+    assert merge_candidates(store, replacement) is replacement
+    assert len(merge_candidates(store, store.dict())) == 1
+
+
+def test_reset_clears_history():
+    store = CandidateStore().apply([candidates.add("x", 0), candidates.reset(["c"])])
+    assert len(store) == 0 and store.criterion_ids == ["c"]
+
+
+def test_views_are_immutable_and_branches_do_not_leak():
+    base = CandidateStore().apply([candidates.reset(["a"]), candidates.add("x", 0)])
+    scored = base.apply([candidates.score(0, scores(a=1), 1.0)])
+    # Extending `base` a second time, as a retried step would, must not see `scored`'s changes.
+    branch = base.apply([candidates.add("y", 0)])
+    assert not base[0].scored and len(base) == 1
+    assert scored[0].scored and len(scored) == 1
+    assert not branch[0].scored and [c.text for c in branch] == ["x", "y"]
+
+
+def test_scoring_twice_or_unknown_candidate_is_rejected():
+    store = CandidateStore().apply([candidates.add("x", 0), candidates.score(0, scores(a=1), 1.0)])
+    with pytest.raises(ValueError):
+        store.apply([candidates.score(0, scores(a=1), 1.0)])
+    with pytest.raises(ValueError):
+        store.apply([candidates.score(5, scores(a=1), 1.0)])
+    with pytest.raises(ValueError):
+        store.apply([{"op": "remove", "index": 0}])
+
+
+def test_serialized_form_round_trips_with_missing_cells():
+    store = CandidateStore().apply([
+        candidates.reset(["a", "b"]),
+        candidates.add("x", 0), candidates.add("y", 1),
+        candidates.score(1, scores(b=2), 0.4),
+    ])
+    data = store.dict()
+    assert data["avg_scores"] == [None, 0.4]
+    assert data["scores"] == [None, [None, 2.0]]
+    restored = CandidateStore(**data)
+    assert restored.dict() == data
+    rows, columns = restored.score_columns()
+    assert list(rows) == [-1, 0]
+    assert math.isnan(columns["a"][0]) and columns["b"][0] == 2.0
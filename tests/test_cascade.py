@@ -0,0 +1,120 @@
+import itertools
+import threading
+import zlib
+
+import pytest
+
+from agents import OrcaAgent
+from cascade import EvaluationCascade
+from fake_llm import FakeChatModel
+from state import (EvaluationCriteria, EvaluationCriterion, EvaluationResult, PromptCandidate, ScoredCriterion,
+                   initial_state)
+
+ORIGINAL = "Summarize the following article."
+CRITERIA = [
+    {"criterion_id": "ends", "question": "Does the prompt require the answer to end with 'FINAL ANSWER:'?",
+     "metric_type": "binary"},
+    {"criterion_id": "format", "question": 'Does the prompt ask for "JSON" or "YAML" output?', "metric_type": "binary"},
+    {"criterion_id": "hedging", "question": "Does the prompt avoid the word 'maybe'?", "metric_type": "binary"},
+    {"criterion_id": "tone", "question": "Is the requested tone 'formal'?", "metric_type": "scale_1_5"},
+]
+PASSING = "Summarize the article as JSON and end with final answer: your summary."
+
+
+@pytest.mark.parametrize("text, reason", [
+    ("   ", "empty"),
+    (f"  {ORIGINAL}\n", "unchanged"),
+    ("Summarize it.", "too_short"),
+    (PASSING, None),
+    ("Summarize the article in three bullet points, please.", None),
+])
+def test_precheck_only_rejects_degenerate_candidates(text, reason):
+    assert EvaluationCascade().precheck(text, ORIGINAL) == reason
+
+
+@pytest.mark.parametrize("text, failed", [
+    (PASSING, []),
+    ("Summarize the article as YAML and end with FINAL ANSWER:", []),
+    ("Summarize the article in three bullet points, as JSON.", ["ends"]),
+    ("Summarize the article in three bullet points, please.", ["ends", "format"]),
+])
+def test_binary_failures_check_quoted_text_of_binary_criteria(text, failed):
+    assert EvaluationCascade.binary_failures(text, CRITERIA) == failed
+
+
+def test_roles_keep_finalists_and_promote_the_best_screened():
+    cascade = EvaluationCascade(cutoff=0.6, audit_rate=0.0)
+    assert cascade.roles(["a", "b", "c"], [0.7, None, 0.2]) == ["finalist", "finalist", "screened_out"]
+    assert cascade.roles(["a", "b", "c"], [0.3, 0.5, 0.1]) == ["screened_out", "promoted", "screened_out"]
+    assert cascade.roles([], []) == []
+    # Equal screening scores: the promotion goes to the fewest binary failures.
+    assert cascade.roles(["a", "b"], [0.3, 0.3], [2, 1]) == ["screened_out", "promoted"]
+
+
+def test_audits_are_deterministic_per_text():
+    texts = [f"candidate {i}" for i in range(200)]
+    scores = [0.0] * len(texts)
+    assert set(EvaluationCascade(audit_rate=1.0).roles(texts, [1.0] + scores[1:])[1:]) == {"audited"}
+    cascade = EvaluationCascade(audit_rate=0.25)
+    roles = cascade.roles(texts, [1.0] + scores[1:])
+    assert roles == cascade.roles(texts, [1.0] + scores[1:])
+    assert [role == "audited" for role in roles[1:]] == [
+        zlib.crc32(text.encode("utf-8")) / 2 ** 32 < 0.25 for text in texts[1:]]
+
+
+def test_record_weights_audited_pairs_by_the_audit_rate():
+    cascade = EvaluationCascade(cutoff=0.6, audit_rate=0.5)
+    cascade.record("finalist", 0.9, 0.9)
+    cascade.record("audited", 0.2, 0.9)
+    cascade.record("screened_out", 0.1, None)
+    cascade.record("rejected", None, None)
+    summary = cascade.summary()
+    assert summary["outcomes"] == {"finalist": 1, "audited": 1, "screened_out": 1, "rejected": 1}
+    assert summary["pairs"] == 2
+    # The audited pair disagrees and weighs 2, the finalist pair agrees and weighs 1.
+    assert summary["agreement"] == pytest.approx(1 / 3)
+    assert summary["suggested_cutoff"] == 0.2
+
+
+def test_invalid_audit_rate_is_rejected():
+    with pytest.raises(ValueError):
+        EvaluationCascade(audit_rate=1.5)
+
+
+class QuotedTermModel(FakeChatModel):
+    """Rubric with a quoted binary criterion. The strong candidate lacks the quoted text but
+    excels on every scale criterion; the weak one has it and little else."""
+
+    def __init__(self):
+        super().__init__()
+        self._texts = itertools.cycle(["[fake-gen:0] STRONG: a thorough, well structured summary prompt.",
+                                       "[fake-gen:0] WEAK: summarize. End with FINAL ANSWER:"])
+        self._texts_lock = threading.Lock()
+
+    def _evaluation_criteria(self, prompt, rng):
+        return EvaluationCriteria(evaluation_criteria=[
+            EvaluationCriterion(criterion_id="ends", metric_type="binary",
+                                question="Does the prompt require the answer to end with 'FINAL ANSWER:'?"),
+            EvaluationCriterion(criterion_id="clarity", question="How clear is the prompt?", metric_type="scale_1_5"),
+            EvaluationCriterion(criterion_id="detail", question="How detailed is the prompt?", metric_type="scale_1_5"),
+        ])
+
+    def _prompt_candidate(self, prompt, rng):
+        with self._texts_lock:
+            return PromptCandidate(prompt_text=next(self._texts))
+
+    def _evaluation_result(self, prompt, rng):
+        strong = "STRONG" in prompt
+        scores = {"ends": 0.0 if strong else 1.0, "clarity": 5.0 if strong else 1.0, "detail": 5.0 if strong else 1.0}
+        return EvaluationResult(results=[ScoredCriterion(criterion_id=criterion_id, score=score, justification="")
+                                         for criterion_id, score in scores.items()])
+
+
+def test_failing_a_binary_check_does_not_skip_the_full_evaluation():
+    model = QuotedTermModel()
+    agent = OrcaAgent(model, population_size=2, max_iterations=1, cascade=EvaluationCascade())
+    final_state = agent.get_graph().invoke(initial_state(ORIGINAL, "Better summaries."))
+    store = final_state["prompt_candidates"]
+    assert len(store) == 2 and all(c.scored for c in store)
+    assert model.calls["EvaluationResult"] == 2
+    assert final_state["final_prompt"].startswith("[fake-gen:0] STRONG")
@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from agents import OrcaAgent
+from fake_llm import CRITERION_ID_PATTERN, FakeChatModel
+from state import EvaluationResult, PromptCandidate, initial_state
+from tools import PromptEvaluator
+
+CANDIDATE = "[fake-gen:1] Summarize the text in three bullet points."
+
+
+def rubric(num_criteria: int = 5):
+    criteria = FakeChatModel(num_criteria=num_criteria)._evaluation_criteria("", None)
+    return [c.dict() for c in criteria.evaluation_criteria]
+
+
+class DroppingModel(FakeChatModel):
+    """Leaves `dropped` out of the first `times` responses that should score it, like a model
+    that skipped a criterion, and records the criteria each evaluation call was asked for."""
+
+    def __init__(self, dropped: str, times: int = 1):
+        super().__init__()
+        self.dropped = dropped
+        self.times = times
+        self.requests = []
+
+    def _evaluation_result(self, prompt, rng):
+        requested = list(dict.fromkeys(CRITERION_ID_PATTERN.findall(prompt)))
+        self.requests.append(requested)
+        result = super()._evaluation_result(prompt, rng)
+        if sum(self.dropped in r for r in self.requests) <= self.times:
+            result = EvaluationResult(results=[r for r in result.results if r.criterion_id != self.dropped])
+        return result
+
+
+@pytest.mark.parametrize("shard_size, shards", [(None, 1), (1, 5), (2, 3)])
+def test_criteria_are_sharded_into_separate_calls(shard_size, shards):
+    model = FakeChatModel()
+    result = PromptEvaluator(model, shard_size=shard_size).run(CANDIDATE, rubric())
+    assert [r.criterion_id for r in result.results] == [c["criterion_id"] for c in rubric()]
+    assert model.calls["EvaluationResult"] == shards
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_a_failed_shard_is_retried_alone(use_async):
+    model = DroppingModel("criterion_3")
+    evaluator = PromptEvaluator(model, shard_size=2)
+    if use_async:
+        result = asyncio.run(evaluator.arun(CANDIDATE, rubric()))
+    else:
+        result = evaluator.run(CANDIDATE, rubric())
+    assert result is not None and len(result.results) == 5
+    # Three shards, then one retry holding only the criterion the model skipped.
+    assert model.calls["EvaluationResult"] == 4
+    assert sorted(model.requests[:3]) == [["criterion_1", "criterion_2"], ["criterion_3", "criterion_4"],
+                                          ["criterion_5"]]
+    assert model.requests[3] == ["criterion_3"]
+
+
+def test_evaluation_fails_once_shard_retries_run_out():
+    model = DroppingModel("criterion_3", times=3)
+    evaluator = PromptEvaluator(model, shard_size=2, max_shard_retries=2)
+    assert evaluator.run(CANDIDATE, rubric()) is None
+    assert model.calls["EvaluationResult"] == 3 + 2
+
+
+def test_memoized_scores_are_reused():
+    model = FakeChatModel()
+    evaluator = PromptEvaluator(model, shard_size=1)
+    first = evaluator.run(CANDIDATE, rubric())
+    assert evaluator.run(CANDIDATE, rubric()) == first
+    assert model.calls["EvaluationResult"] == 5
+    # A changed criterion is scored anew; the others are reused.
+    changed = rubric()
+    changed[1]["question"] = "Does the prompt satisfy a stricter requirement 2?"
+    evaluator.run(CANDIDATE, changed)
+    assert model.calls["EvaluationResult"] == 6
+
+
+class RevertingModel(FakeChatModel):
+    """An ideator that keeps proposing the same prompt, as when a search reverts to an earlier one."""
+
+    def _prompt_candidate(self, prompt, rng):
+        return PromptCandidate(prompt_text=CANDIDATE)
+
+
+def test_memoized_scores_are_reused_across_iterations():
+    model = RevertingModel(score_trajectory=(0.3,))
+    agent = OrcaAgent(model, max_iterations=3)
+    final_state = agent.get_graph().invoke(initial_state("Summarize the text.", "Short summaries."))
+    assert final_state["iteration_count"] == 3
+    assert model.calls["PromptCandidate"] == 3
+    assert all(c.scored for c in final_state["prompt_candidates"])
+    assert model.calls["EvaluationResult"] == 1
@@ -0,0 +1,22 @@
+from rubric_index import RubricIndex
+
+
+def test_lookup_finds_similar_runs_only():
+    index = RubricIndex(threshold=0.8)
+    entry_id = index.add("Summarize the article in three bullet points.", "Concise news summaries", ["g"], [])
+    index.add("Translate the email into French.", "Polite business French", ["g"], [])
+    match = index.lookup("Summarize the article in three bullet points!", "Concise news summaries")
+    assert match["id"] == entry_id and match["similarity"] > 0.99
+    assert index.lookup("Write a haiku about autumn.", "Seasonal poetry") is None
+
+
+def test_duplicates_are_indexed_once_and_old_entries_evicted(tmp_path):
+    path = str(tmp_path / "rubrics.jsonl")
+    index = RubricIndex(path, max_entries=10)
+    ids = [index.add(f"prompt number {i}", f"goal number {i}", [], []) for i in range(25)]
+    assert index.add("prompt  number 24", "goal number 24", [], []) == ids[-1]
+    assert len(index) <= 10
+    reloaded = RubricIndex(path, max_entries=10, threshold=0.99)
+    assert len(reloaded) == len(index)
+    assert reloaded.lookup("prompt number 24", "goal number 24")["id"] == ids[-1]
+    assert reloaded.lookup("prompt number 0", "goal number 0") is None
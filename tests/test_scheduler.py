@@ -0,0 +1,105 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import scheduler
+from scheduler import LLMScheduler
+from tools import set_max_concurrent_llm_calls
+
+
+@pytest.fixture
+def llm_scheduler(monkeypatch):
+    instance = LLMScheduler(max_concurrency=8)
+    monkeypatch.setattr(scheduler, "_scheduler", instance)
+    return instance
+
+
+class ConcurrencyProbe:
+    def __init__(self, seconds: float = 0.02):
+        self.seconds = seconds
+        self.in_flight = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def _enter(self):
+        with self._lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+
+    def _exit(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def __call__(self):
+        self._enter()
+        time.sleep(self.seconds)
+        self._exit()
+        return "ok"
+
+    async def acall(self):
+        self._enter()
+        await asyncio.sleep(self.seconds)
+        self._exit()
+        return "ok"
+
+
+def test_llm_call_cap_is_shared_by_sync_threads_and_event_loops(llm_scheduler):
+    set_max_concurrent_llm_calls(2)
+    probe = ConcurrencyProbe()
+
+    async def async_calls():
+        await asyncio.gather(*(llm_scheduler.acall(probe.acall) for _ in range(6)))
+
+    threads = [threading.Thread(target=llm_scheduler.call, args=(probe,)) for _ in range(6)]
+    threads += [threading.Thread(target=asyncio.run, args=(async_calls(),)) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert probe.peak == 2
+    assert llm_scheduler.stats()["in_flight"] == 0
+
+
+def test_throttling_halves_the_limit_and_successes_raise_it_again(llm_scheduler):
+    calls = iter([RuntimeError("429 Resource exhausted"), "ok"])
+
+    def flaky():
+        outcome = next(calls)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    llm_scheduler.base_backoff_seconds = 0.0
+    assert llm_scheduler.call(flaky) == "ok"
+    stats = llm_scheduler.stats()
+    assert (stats["throttles"], stats["retries"], stats["concurrency_limit"]) == (1, 1, 4)
+    for _ in range(10):
+        llm_scheduler.call(lambda: "ok")
+    assert llm_scheduler.stats()["concurrency_limit"] == 6
+
+
+def test_sync_hedge_wins_and_the_straggler_keeps_its_slot(llm_scheduler):
+    llm_scheduler.hedge_percentile = 50
+    for _ in range(20):
+        llm_scheduler.call(lambda: "warm-up")
+    straggler_done = threading.Event()
+    attempts = iter(["slow", "fast"])
+
+    def fn():
+        if next(attempts) == "slow":
+            time.sleep(0.3)
+            straggler_done.set()
+            return "slow"
+        return "fast"
+
+    assert llm_scheduler.call(fn) == "fast"
+    stats = llm_scheduler.stats()
+    assert (stats["hedges"], stats["hedge_wins"]) == (1, 1)
+    assert stats["in_flight"] == 1  # The losing attempt still holds its slot
+    assert straggler_done.wait(2)
+    deadline = time.monotonic() + 2
+    while llm_scheduler.stats()["in_flight"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert llm_scheduler.stats()["in_flight"] == 0
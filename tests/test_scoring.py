@@ -0,0 +1,97 @@
+import itertools
+
+import numpy as np
+import pytest
+
+import candidates
+from candidates import CandidateStore
+from scoring import Scorer, pareto_front, scorer_from_spec
+
+RUBRIC = [
+    {"criterion_id": "a", "metric_type": "scale_1_5"},
+    {"criterion_id": "b", "metric_type": "binary"},
+]
+
+
+def store_of(*rows):
+    """A store with one candidate per row of scores, given as {criterion_id: score} dicts."""
+    ops = [candidates.reset(["a", "b"])]
+    ops += [candidates.add(f"prompt {index}", 0) for index in range(len(rows))]
+    ops += [candidates.score(index, [{"criterion_id": key, "score": value} for key, value in row.items()], 0.0)
+            for index, row in enumerate(rows)]
+    return CandidateStore().apply(ops)
+
+
+def brute_force_front(values):
+    return np.array([not any((other >= row).all() and (other > row).any() for other in values)
+                     for row in values], dtype=bool)
+
+
+@pytest.mark.parametrize("discrete", [True, False])
+def test_pareto_front_matches_brute_force(discrete):
+    rng = np.random.default_rng(0)
+    for rows, columns in itertools.product((1, 2, 50, 300), (1, 2, 4)):
+        if discrete:
+            values = rng.integers(0, 5, size=(rows, columns)).astype(float)
+        else:
+            values = rng.random((rows, columns))
+        values[rng.random(values.shape) < 0.05] = -np.inf
+        assert (pareto_front(values) == brute_force_front(values)).all()
+
+
+def test_pareto_front_keeps_duplicates_and_handles_empty_input():
+    values = np.array([[1.0, 0.0], [1.0, 0.0], [0.0, 1.0], [0.0, 0.0]])
+    assert pareto_front(values).tolist() == [True, True, True, False]
+    assert pareto_front(np.empty((0, 2))).tolist() == []
+
+
+def test_score_normalizes_and_weights_by_criterion_id():
+    scorer = Scorer(weights={"b": 3})
+    # a: 5/5 with weight 1; b: 0/1 with weight 3.
+    assert scorer.score(RUBRIC, [{"criterion_id": "b", "score": 0}, {"criterion_id": "a", "score": 5}]) == 0.25
+    assert Scorer(missing="zero").score(RUBRIC, [{"criterion_id": "a", "score": 5}]) == 0.5
+    assert Scorer(missing="skip").score(RUBRIC, [{"criterion_id": "a", "score": 5}]) == 1.0
+
+
+def test_weighted_mean_ranking_keeps_generation_order_for_ties():
+    store = store_of({"a": 3, "b": 1}, {"a": 5, "b": 1}, {"a": 3, "b": 1}, {"a": 1, "b": 0})
+    assert Scorer().rank(store, RUBRIC).tolist() == [1, 0, 2, 3]
+    assert [c.index for c in Scorer().best(store, RUBRIC, n=2)] == [1, 0]
+
+
+def test_min_criterion_prefers_the_best_worst_criterion():
+    store = store_of({"a": 5, "b": 0}, {"a": 3, "b": 1})
+    assert Scorer(selection="min_criterion").rank(store, RUBRIC).tolist() == [1, 0]
+    skipped = store_of({"a": 5}, {"a": 4, "b": 1})
+    assert Scorer(selection="min_criterion", missing="skip").rank(skipped, RUBRIC).tolist() == [0, 1]
+    assert Scorer(selection="min_criterion", missing="zero").rank(skipped, RUBRIC).tolist() == [1, 0]
+
+
+def test_pareto_selection_ranks_the_front_first():
+    rubric = RUBRIC + [{"criterion_id": "c", "metric_type": "scale_1_5"}]
+    store = store_of({"a": 4, "b": 1}, {"a": 5, "b": 0}, {"a": 4, "b": 0})
+    # Candidate 2 is dominated by both others; candidate 1 has the lowest mean of the front.
+    assert Scorer(selection="pareto").rank(store, RUBRIC).tolist() == [0, 1, 2]
+    assert Scorer(selection="pareto", weights={"a": 10}).rank(store, rubric).tolist() == [1, 0, 2]
+
+
+def test_rank_with_pending_ops_leaves_the_store_unchanged():
+    store = store_of({"a": 3, "b": 1}).apply([candidates.add("unscored", 1)])
+    pending = [candidates.score(1, [{"criterion_id": "a", "score": 5}, {"criterion_id": "b", "score": 1}], 1.0)]
+    assert Scorer().rank(store, RUBRIC, pending=pending).tolist() == [1, 0]
+    assert Scorer().rank(store, RUBRIC).tolist() == [0]
+    assert not store[1].scored
+
+
+def test_unscored_candidates_and_unknown_criteria_are_not_ranked():
+    store = store_of({"a": 3, "b": 1}).apply([candidates.add("unscored", 1)])
+    assert Scorer().rank(store, RUBRIC).tolist() == [0]
+    with pytest.raises(ValueError):
+        Scorer().rank(store, [{"criterion_id": "a", "metric_type": "percent"}])
+
+
+@pytest.mark.parametrize("spec", [{"selection": "best"}, {"missing": "drop"}, {"weights": {"a": -1}}, {"limit": 3},
+                                  {"weights": {"a": "2"}}, {"weights": [1, 2]}, ["weights"], 3])
+def test_scorer_from_spec_rejects_invalid_specs(spec):
+    with pytest.raises(ValueError):
+        scorer_from_spec(spec)
@@ -0,0 +1,48 @@
+import http.client
+import json
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from server import OrcaService, make_handler
+
+
+@pytest.fixture
+def connection():
+    service = OrcaService(app=None, workers=0)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(service))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    connection = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=5)
+    yield connection
+    connection.close()
+    server.shutdown()
+    server.server_close()
+
+
+def post(connection, body: bytes, headers=None):
+    connection.putrequest("POST", "/jobs")
+    for name, value in {"Content-Length": str(len(body)), **(headers or {})}.items():
+        connection.putheader(name, value)
+    connection.endheaders(body)
+    response = connection.getresponse()
+    return response.status, json.loads(response.read())
+
+
+@pytest.mark.parametrize("stopping", [{"plateau": 3}, {"max_iterations": "4"}, {"deadline": 10}, "fast"])
+def test_invalid_stopping_spec_is_a_bad_request(connection, stopping):
+    payload = {"initial_prompt": "Summarize.", "user_goal": "Short summaries.", "stopping": stopping}
+    status, body = post(connection, json.dumps(payload).encode())
+    assert status == 400 and body["error"]
+
+
+def test_invalid_content_length_is_a_bad_request(connection):
+    status, body = post(connection, b"{}", {"Content-Length": "lots"})
+    assert status == 400 and "Content-Length" in body["error"]
+
+
+def test_valid_job_is_accepted(connection):
+    payload = {"initial_prompt": "Summarize.", "user_goal": "Short summaries.", "stopping": {"max_iterations": 2}}
+    status, body = post(connection, json.dumps(payload).encode())
+    assert status == 202 and body["status"] == "queued"
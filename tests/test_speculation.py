@@ -0,0 +1,83 @@
+import asyncio
+from concurrent.futures import Future
+
+import pytest
+
+import candidates
+from agents import OrcaAgent
+from candidates import CandidateStore
+from fake_llm import FakeChatModel
+from state import FinalReport, initial_state
+from telemetry import InMemorySink, Telemetry
+
+RUBRIC = [{"criterion_id": "a", "question": "Is it clear?", "metric_type": "scale_1_5"}]
+
+
+def speculating_agent(model=None, **options):
+    sink = InMemorySink()
+    agent = OrcaAgent(model or FakeChatModel(), speculative_report=True, telemetry=Telemetry(sink), **options)
+    return agent, sink
+
+
+def outcomes(sink):
+    return [event["outcome"] for event in sink.events if event["event"] == "speculation"]
+
+
+def request(text):
+    return {"final_prompt": text}
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_act_reuses_the_speculative_report_of_the_final_best(use_async):
+    model = FakeChatModel()
+    agent, sink = speculating_agent(model, max_iterations=1)
+    state = initial_state("Summarize the text.", "Short summaries.")
+    if use_async:
+        final_state = asyncio.run(agent.get_async_graph().ainvoke(state))
+    else:
+        final_state = agent.get_graph().invoke(state)
+    assert final_state["iteration_count"] == 1
+    assert outcomes(sink) == ["started", "used"]
+    assert model.calls["FinalReport"] == 1  # act did not generate the report again
+
+
+def test_a_speculation_that_has_not_started_is_superseded():
+    agent, sink = speculating_agent()
+    pending = Future()
+    agent._replace_speculation("run", request("first"), pending)
+    agent._replace_speculation("run", request("second"), Future())
+    assert pending.cancelled()
+    assert outcomes(sink) == ["started", "superseded", "started"]
+
+
+def test_a_running_or_finished_speculation_is_discarded():
+    agent, sink = speculating_agent()
+    running = Future()
+    running.set_running_or_notify_cancel()
+    agent._replace_speculation("run", request("first"), running)
+    agent._replace_speculation("run", request("second"), Future())
+    assert not running.cancelled()
+    # act wants a report for another candidate than the finished speculation's.
+    finished = Future()
+    finished.set_result((FinalReport(final_prompt="x", executive_summary="", detailed_rationale={}), {}))
+    agent._replace_speculation("run", request("third"), finished)
+    assert agent._take_speculation("run", request("fourth")) is None
+    assert outcomes(sink) == ["started", "discarded", "started", "superseded", "started", "discarded"]
+
+
+def test_speculation_requests_do_not_extend_the_candidate_log():
+    agent, _ = speculating_agent()
+    store = CandidateStore().apply([candidates.reset(["a"]), candidates.add("a first candidate prompt", 0),
+                                    candidates.add("a second candidate prompt", 0)])
+    store = store.apply([candidates.score(0, [{"criterion_id": "a", "score": 2}], 0.25)])
+    state = {**initial_state("Summarize.", "Goal."), "evaluation_criteria": RUBRIC, "prompt_candidates": store}
+    update = {"prompt_candidates": [candidates.score(1, [{"criterion_id": "a", "score": 5}], 1.0)]}
+    speculated = agent._speculation_request(state, update)
+    assert speculated["final_prompt"] == "a second candidate prompt"
+    assert speculated["final_scores"] == [{"criterion_id": "a", "score": 5.0, "justification": None}]
+    # The reducer can still extend the store in place, without copying its log.
+    assert len(store._log.avg_scores) == 1
+    assert store.apply(update["prompt_candidates"])._log is store._log
+    # A new score that does not change the best starts no speculation.
+    worse = {"prompt_candidates": [candidates.score(1, [{"criterion_id": "a", "score": 1}], 0.0)]}
+    assert agent._speculation_request(state, worse) is None
@@ -0,0 +1,56 @@
+import pytest
+
+import candidates
+from agents import OrcaAgent
+from candidates import CandidateStore
+from fake_llm import FakeChatModel
+from state import initial_state
+from stopping import AnyOf, MaxIterations, Plateau, QualityThreshold, best_score_history, policy_from_spec
+
+
+def test_policy_from_spec_builds_each_policy():
+    policy = policy_from_spec({"max_iterations": 3, "quality_threshold": 0.9,
+                               "plateau": {"window": 1, "min_delta": 0.05}})
+    assert isinstance(policy, AnyOf)
+    assert [type(p) for p in policy.policies] == [MaxIterations, QualityThreshold, Plateau]
+    assert (policy.policies[2].window, policy.policies[2].min_delta) == (1, 0.05)
+
+
+@pytest.mark.parametrize("spec", [
+    {"plateau": 3},
+    {"plateau": {"window": 0}},
+    {"plateau": {"patience": 2}},
+    {"max_iterations": "4"},
+    {"max_iterations": -1},
+    {"max_iterations": 2.5},
+    {"max_iterations": True},
+    {"quality_threshold": 1.5},
+    {"quality_threshold": float("nan")},
+    {"deadline_seconds": -10},
+    {"max_tokens": 0},
+    {"unknown_key": 1},
+    ["max_iterations", 4],
+])
+def test_policy_from_spec_rejects_malformed_specs(spec):
+    with pytest.raises(ValueError):
+        policy_from_spec(spec)
+
+
+def test_threshold_only_spec_stops_at_the_iteration_cap():
+    # The fake model never scores above ~0.3, so the threshold is never met.
+    agent = OrcaAgent(FakeChatModel(seed=1, score_trajectory=(0.3,)), max_iterations=3)
+    config = {"configurable": {"stopping_policy": policy_from_spec({"quality_threshold": 0.99})},
+              "recursion_limit": 100}
+    final_state = agent.get_graph().invoke(initial_state("Summarize the text.", "Short summaries."), config=config)
+    assert final_state["iteration_count"] == 3
+    assert final_state["stop_reason"] == "Max iterations (3) reached."
+
+
+def test_best_score_history_takes_each_scored_iteration_best():
+    store = CandidateStore().apply([candidates.reset(["a"])] + [
+        candidates.add(f"prompt {i}", iteration) for i, iteration in enumerate([0, 0, 2, 1, 2, 3])])
+    store = store.apply([candidates.score(index, [{"criterion_id": "a", "score": 1}], avg_score)
+                         for index, avg_score in [(4, 0.7), (1, 0.5), (0, 0.25), (2, 0.9), (3, 0.4)]])
+    # Iteration 3 has no scored candidate and is left out.
+    assert best_score_history({"prompt_candidates": store}) == [0.5, 0.4, 0.9]
+    assert best_score_history({"prompt_candidates": CandidateStore()}) == []
@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+
+from agents import OrcaAgent
+from fake_llm import FakeChatModel
+from state import initial_state
+from streaming import (CandidateGenerated, CandidateScored, CriteriaReady, GoalsDecomposed, ReportReady, StopDecision,
+                       astream, stream)
+
+
+def collect(use_async: bool, state):
+    agent = OrcaAgent(FakeChatModel(), population_size=2, max_iterations=2)
+    if not use_async:
+        return list(stream(agent.get_graph(), state))
+
+    async def run():
+        return [event async for event in astream(agent.get_async_graph(), state)]
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_events_follow_the_graph_order(use_async):
+    state = initial_state("Summarize the text.", "Short summaries.", run_id="run-1")
+    events = collect(use_async, state)
+    assert [type(event) for event in events] == [
+        GoalsDecomposed, CriteriaReady,
+        CandidateGenerated, CandidateGenerated, CandidateScored, CandidateScored, StopDecision,
+        CandidateGenerated, CandidateGenerated, CandidateScored, CandidateScored, StopDecision,
+        ReportReady,
+    ]
+    assert {event.run_id for event in events} == {"run-1"}
+
+    # Each iteration's candidates are scored after being generated, as the same texts.
+    generated = [(e.iteration, e.text) for e in events if isinstance(e, CandidateGenerated)]
+    scored = [(e.iteration, e.text) for e in events if isinstance(e, CandidateScored)]
+    assert [i for i, _ in generated] == [0, 0, 1, 1]
+    assert sorted(scored) == sorted(generated)
+    assert [(e.iteration, e.stop) for e in events if isinstance(e, StopDecision)] == [(1, False), (2, True)]
+
+    report = events[-1]
+    assert report.stop_reason == "Max iterations (2) reached."
+    assert report.state["final_prompt"] and report.state["iteration_count"] == 2
@@ -1,28 +1,201 @@
+import asyncio
+import contextvars
+import hashlib
 import json
-from typing import List, Optional
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
 
 from pydantic import BaseModel
 
-from state import (DecomposedGoals, EvaluationCriteria, PromptCandidate, EvaluationResult, FinalReport)
+from cache import LLMCache, cache_key
+from compaction import compact_ideation_inputs, compact_report_inputs, estimate_tokens, minify
+from scheduler import get_scheduler
+from state import (DecomposedGoals, EvaluationCriteria, PromptCandidate, EvaluationResult, FinalReport,
+                   ScoredCriterion)
+from telemetry import Telemetry
+
+# --- Configuration ---
+MAX_SHARD_RETRIES = 1  # Extra attempts for evaluation shards that failed or came back incomplete
+SCORE_MEMO_ENTRIES = 10_000  # (candidate, criterion) scores remembered by each PromptEvaluator
+
+# LLM usage of the graph node currently executing; see `track_usage`.
+_node_usage = contextvars.ContextVar("orca_node_usage", default=None)
+_node_usage_lock = threading.Lock()
+
+
+@contextmanager
+def track_usage():
+    """Counts the LLM calls and estimated tokens made by tools within the block, including
+    calls fanned out to threads by `fan_out` or to tasks by asyncio."""
+    usage = {"calls": 0, "tokens": 0}
+    token = _node_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _node_usage.reset(token)
+
+
+def set_max_concurrent_llm_calls(limit: int) -> None:
+    """Sets the cap on concurrent LLM calls shared by every tool in the process, sync and async
+    alike, on any thread or event loop. It is the ceiling of the current scheduler's adaptive
+    limit (see `scheduler.LLMScheduler`); calls already in flight keep their slots."""
+    get_scheduler().set_max_concurrency(limit)
+
+
+def charge_usage(usage: dict) -> None:
+    """Adds usage tracked elsewhere, e.g. by background work, to the current `track_usage` block."""
+    node_usage = _node_usage.get()
+    if node_usage is not None:
+        with _node_usage_lock:
+            node_usage["calls"] += usage["calls"]
+            node_usage["tokens"] += usage["tokens"]
+
+
+def fan_out(fn: Callable, items: List) -> List:
+    """Applies `fn` to every item concurrently on threads, preserving order."""
+    if len(items) <= 1:
+        return [fn(item) for item in items]
+    # Each thread runs in a copy of the caller's context so that `track_usage` sees its calls.
+    contexts = [contextvars.copy_context() for _ in items]
+    with ThreadPoolExecutor(max_workers=len(items)) as pool:
+        return list(pool.map(lambda context, item: context.run(fn, item), contexts, items))
 
 
 class BaseTool:
-    """Base class for our LLM-based tools."""
+    """Base class for our LLM-based tools.
+
+    Subclasses define `PROMPT_TEMPLATE`, `OUTPUT_MODEL` and `_inputs`, which maps the
+    arguments of `run`/`arun` to the template's fields. Responses are served from `cache`
+    when one is given, unless the tool opts out with `cacheable=False` (or `CACHEABLE`).
+    """
+    PROMPT_TEMPLATE: str
+    OUTPUT_MODEL: BaseModel
+    CACHEABLE = True
 
-    def __init__(self, llm):
+    def __init__(self, llm, cache: Optional[LLMCache] = None, cacheable: Optional[bool] = None,
+                 telemetry: Optional[Telemetry] = None):
         self.llm = llm
+        self.cache = cache if (self.CACHEABLE if cacheable is None else cacheable) else None
+        self.telemetry = telemetry or Telemetry()
+        # Estimated tokens of the LLM calls actually made (cache hits are free).
+        self.usage = {"calls": 0, "input_tokens": 0, "output_tokens": 0}
+        self._usage_lock = threading.Lock()
+        self._structured_llms = {}  # Output model -> structured runnable, built once per tool
+
+    def _record_call(self, prompt: str, response_obj, seconds: float, error: Optional[Exception] = None) -> None:
+        """Updates token usage and emits an `llm_call` event for one model call."""
+        response_text = minify(response_obj.dict()) if response_obj is not None else ""
+        input_tokens, output_tokens = estimate_tokens(prompt), estimate_tokens(response_text)
+        with self._usage_lock:
+            self.usage["calls"] += 1
+            self.usage["input_tokens"] += input_tokens
+            self.usage["output_tokens"] += output_tokens
+        node_usage = _node_usage.get()
+        if node_usage is not None:
+            with _node_usage_lock:
+                node_usage["calls"] += 1
+                node_usage["tokens"] += input_tokens + output_tokens
+        # Input tokens were reserved against the rate limit before the call.
+        get_scheduler().charge_tokens(output_tokens)
+
+        if error is not None:
+            # Output parsers and Pydantic validation both raise ValueError subclasses.
+            outcome = "parse_error" if isinstance(error, ValueError) else "error"
+            self.telemetry.log(f"Error calling LLM or parsing output for {self.OUTPUT_MODEL.__name__}: {error}")
+        else:
+            outcome = "ok" if response_obj is not None else "none"
+        self.telemetry.emit("llm_call", tool=type(self).__name__, outcome=outcome, seconds=seconds,
+                            prompt_chars=len(prompt), response_chars=len(response_text),
+                            input_tokens=input_tokens, output_tokens=output_tokens)
+
+    def _inputs(self, *args, **kwargs) -> Dict:
+        raise NotImplementedError
+
+    def run(self, *args, **kwargs) -> Optional[BaseModel]:
+        return self._call_llm(self.PROMPT_TEMPLATE, self.OUTPUT_MODEL, **self._inputs(*args, **kwargs))
+
+    async def arun(self, *args, **kwargs) -> Optional[BaseModel]:
+        return await self._acall_llm(self.PROMPT_TEMPLATE, self.OUTPUT_MODEL, **self._inputs(*args, **kwargs))
+
+    def _structured_llm(self, pydantic_model: BaseModel):
+        structured_llm = self._structured_llms.get(pydantic_model)
+        if structured_llm is None:
+            structured_llm = self._structured_llms[pydantic_model] = self.llm.with_structured_output(pydantic_model)
+        return structured_llm
+
+    def _cache_lookup(self, prompt: str, pydantic_model: BaseModel):
+        """Returns `(key, cached response or None)`; the key is None when caching is off."""
+        if self.cache is None:
+            return None, None
+        key = cache_key(self.llm, type(self).__name__, prompt, pydantic_model)
+        value = self.cache.get(key)
+        if value is None:
+            return key, None
+        self.telemetry.emit("llm_call", tool=type(self).__name__, outcome="cache_hit", seconds=0.0,
+                            prompt_chars=len(prompt))
+        return key, pydantic_model.parse_obj(value)
+
+    def _cache_store(self, key: Optional[str], response_obj) -> None:
+        if key is not None and response_obj is not None:
+            self.cache.set(key, response_obj.dict())
 
     def _call_llm(self, prompt_template: str, pydantic_model: BaseModel, **kwargs):
-        """A helper function to call the LLM and parse the structured output."""
+        """A helper function to call the LLM and parse the structured output.
+
+        Calls go through the process-wide scheduler, which rate-limits and retries them.
+        Returns None once its retries are exhausted.
+        """
         prompt = prompt_template.format(**kwargs)
-        structured_llm = self.llm.with_structured_output(pydantic_model)
+        key, cached = self._cache_lookup(prompt, pydantic_model)
+        if cached is not None:
+            return cached
+        structured_llm = self._structured_llm(pydantic_model)
+
+        def attempt():
+            start = time.perf_counter()
+            try:
+                response = structured_llm.invoke(prompt)
+            except Exception as e:
+                self._record_call(prompt, None, time.perf_counter() - start, error=e)
+                raise
+            self._record_call(prompt, response, time.perf_counter() - start)
+            return response
+
         try:
-            response_obj = structured_llm.invoke(prompt)
-            return response_obj
-        except Exception as e:
-            print(f"Error calling LLM or parsing output for {pydantic_model.__name__}: {e}")
-            # Fallback or retry logic could be implemented here
+            response_obj = get_scheduler().call(attempt, estimate_tokens(prompt))
+        except Exception:
+            return None  # Every attempt was already logged and recorded.
+        self._cache_store(key, response_obj)
+        return response_obj
+
+    async def _acall_llm(self, prompt_template: str, pydantic_model: BaseModel, **kwargs):
+        """Async counterpart of `_call_llm`."""
+        prompt = prompt_template.format(**kwargs)
+        key, cached = self._cache_lookup(prompt, pydantic_model)
+        if cached is not None:
+            return cached
+        structured_llm = self._structured_llm(pydantic_model)
+
+        async def attempt():
+            start = time.perf_counter()
+            try:
+                response = await structured_llm.ainvoke(prompt)
+            except Exception as e:
+                self._record_call(prompt, None, time.perf_counter() - start, error=e)
+                raise
+            self._record_call(prompt, response, time.perf_counter() - start)
+            return response
+
+        try:
+            response_obj = await get_scheduler().acall(attempt, estimate_tokens(prompt))
+        except Exception:
             return None
+        self._cache_store(key, response_obj)
+        return response_obj
 
 
 class GoalDecomposer(BaseTool):
@@ -42,8 +215,10 @@ class GoalDecomposer(BaseTool):
     **Output Format:** You MUST output a valid JSON object that conforms to the provided Pydantic model. Do not add any explanatory text outside of the JSON structure.
     """
 
-    def run(self, initial_prompt: str, user_goal: str) -> Optional:
-        return self._call_llm(self.PROMPT_TEMPLATE, DecomposedGoals, initial_prompt=initial_prompt, user_goal=user_goal)
+    OUTPUT_MODEL = DecomposedGoals
+
+    def _inputs(self, initial_prompt: str, user_goal: str) -> Dict:
+        return {"initial_prompt": initial_prompt, "user_goal": user_goal}
 
 
 class CriteriaGenerator(BaseTool):
@@ -62,12 +237,20 @@ class CriteriaGenerator(BaseTool):
     **Output Format:** You MUST output a valid JSON object that conforms to the provided Pydantic model. Do not add any explanatory text outside of the JSON structure.
     """
 
-    def run(self, decomposed_goals: List[str]) -> Optional[EvaluationCriteria]:
-        return self._call_llm(self.PROMPT_TEMPLATE, EvaluationCriteria, decomposed_goals=decomposed_goals)
+    OUTPUT_MODEL = EvaluationCriteria
+
+    def _inputs(self, decomposed_goals: List[str]) -> Dict:
+        return {"decomposed_goals": decomposed_goals}
 
 
 class PromptIdeator(BaseTool):
-    """Tool to generate a new prompt candidate."""
+    """Tool to generate a new prompt candidate.
+
+    Not cached by default: ideation is deliberately stochastic, and identical requests
+    within a population must still yield distinct candidates. With `compact` (the default)
+    only the criteria the previous candidate fell short on are sent in full.
+    """
+    CACHEABLE = False
     PROMPT_TEMPLATE = """
     **Role:** You are a Master Prompt Engineer. You are a creative and systematic thinker, capable of both generating novel ideas and meticulously refining existing work based on structured feedback.
     **Task:** Your task is to generate a new, improved version of a prompt. You will be given the original prompt, a set of evaluation criteria to guide your improvements, and, if this is not the first attempt, the previous prompt candidate and the feedback on why it fell short.
@@ -85,20 +268,38 @@ class PromptIdeator(BaseTool):
     **Output Format:** You MUST output a valid JSON object that conforms to the provided Pydantic model. The `prompt_text` field should contain only the text of the new prompt.
     """
 
-    def run(self, original_prompt: str, evaluation_criteria: List, previous_candidate: Optional[str] = None,
-            evaluation_feedback: Optional = None) -> Optional[PromptCandidate]:
-        return self._call_llm(
-            self.PROMPT_TEMPLATE,
-            PromptCandidate,
-            original_prompt=original_prompt,
-            evaluation_criteria=json.dumps(evaluation_criteria, indent=2),
-            previous_candidate=previous_candidate or "N/A",
-            evaluation_feedback=json.dumps(evaluation_feedback, indent=2) if evaluation_feedback else "N/A"
-        )
+    OUTPUT_MODEL = PromptCandidate
+
+    def __init__(self, llm, cache: Optional[LLMCache] = None, cacheable: Optional[bool] = None,
+                 telemetry: Optional[Telemetry] = None, compact: bool = True):
+        super().__init__(llm, cache=cache, cacheable=cacheable, telemetry=telemetry)
+        self.compact = compact
+
+    def _inputs(self, original_prompt: str, evaluation_criteria: List, previous_candidate: Optional[str] = None,
+                evaluation_feedback: Optional = None) -> Dict:
+        if self.compact:
+            criteria, feedback = compact_ideation_inputs(evaluation_criteria, evaluation_feedback)
+            return {
+                "original_prompt": original_prompt,
+                "evaluation_criteria": criteria,
+                "previous_candidate": previous_candidate or "N/A",
+                "evaluation_feedback": feedback
+            }
+        return {
+            "original_prompt": original_prompt,
+            "evaluation_criteria": json.dumps(evaluation_criteria, indent=2),
+            "previous_candidate": previous_candidate or "N/A",
+            "evaluation_feedback": json.dumps(evaluation_feedback, indent=2) if evaluation_feedback else "N/A"
+        }
 
 
 class PromptEvaluator(BaseTool):
-    """Tool to evaluate a prompt against criteria."""
+    """Tool to evaluate a prompt against criteria.
+
+    Scores are merged by `criterion_id` and memoized per (candidate text, criterion), so
+    duplicate or reverted candidates are never re-scored. Criteria the model failed to score
+    are retried on their own, up to `max_shard_retries` times.
+    """
     PROMPT_TEMPLATE = """
     **Role:** You are a meticulous and impartial AI Prompt Quality Analyst. You do not get creative. You do not offer suggestions for improvement. Your sole function is to objectively evaluate a given prompt against a strict set of criteria and provide scores and justifications.
     **Task:** You will be given a prompt candidate and a list of evaluation criteria. For each criterion, you must provide a score (binary or 1-5 scale as defined) and a brief, factual justification for that score.
@@ -114,17 +315,114 @@ class PromptEvaluator(BaseTool):
     **Output Format:** You MUST output a valid JSON object that conforms to the provided Pydantic model. Do not add any other text.
     """
 
-    def run(self, prompt_candidate: str, evaluation_criteria: List) -> Optional:
-        return self._call_llm(
-            self.PROMPT_TEMPLATE,
-            EvaluationResult,
-            prompt_candidate=prompt_candidate,
-            evaluation_criteria=json.dumps(evaluation_criteria, indent=2)
-        )
+    OUTPUT_MODEL = EvaluationResult
+
+    def __init__(self, llm, cache: Optional[LLMCache] = None, cacheable: Optional[bool] = None,
+                 telemetry: Optional[Telemetry] = None, shard_size: Optional[int] = None,
+                 max_shard_retries: int = MAX_SHARD_RETRIES):
+        """`shard_size` splits the criteria into concurrent calls of at most that many criteria
+        each (1 scores every criterion separately); None sends them all in one call."""
+        super().__init__(llm, cache=cache, cacheable=cacheable, telemetry=telemetry)
+        self.shard_size = shard_size
+        self.max_shard_retries = max_shard_retries
+        self._scores = OrderedDict()  # (candidate hash, criterion hash) -> ScoredCriterion dict
+        self._scores_lock = threading.Lock()
+
+    def _inputs(self, prompt_candidate: str, evaluation_criteria: List) -> Dict:
+        return {
+            "prompt_candidate": prompt_candidate,
+            "evaluation_criteria": json.dumps(evaluation_criteria, indent=2)
+        }
+
+    @staticmethod
+    def _score_key(prompt_candidate: str, criterion: Dict) -> Tuple[str, str]:
+        criterion_json = json.dumps(criterion, sort_keys=True, default=str)
+        return (hashlib.sha256(prompt_candidate.encode("utf-8")).hexdigest(),
+                hashlib.sha256(criterion_json.encode("utf-8")).hexdigest())
+
+    def _plan(self, prompt_candidate: str, evaluation_criteria: List) -> Tuple[Dict, List[List]]:
+        """Returns the memoized scores by criterion id and the shards still to be scored."""
+        scores = {}
+        remaining = []
+        with self._scores_lock:
+            for criterion in evaluation_criteria:
+                score = self._scores.get(self._score_key(prompt_candidate, criterion))
+                if score is None:
+                    remaining.append(criterion)
+                else:
+                    scores[criterion["criterion_id"]] = score
+        size = self.shard_size or len(remaining) or 1
+        return scores, [remaining[i:i + size] for i in range(0, len(remaining), size)]
+
+    def _absorb(self, prompt_candidate: str, shards: List[List], responses: List, scores: Dict) -> List[List]:
+        """Merges shard responses into `scores` by criterion id; returns the criteria still unscored."""
+        failed = []
+        for shard, response in zip(shards, responses):
+            returned = {r.criterion_id: r.dict() for r in response.results} if response else {}
+            missing = []
+            for criterion in shard:
+                score = returned.get(criterion["criterion_id"])
+                if score is None:
+                    missing.append(criterion)
+                    continue
+                scores[criterion["criterion_id"]] = score
+                with self._scores_lock:
+                    self._scores[self._score_key(prompt_candidate, criterion)] = score
+                    while len(self._scores) > SCORE_MEMO_ENTRIES:
+                        self._scores.popitem(last=False)
+            if missing:
+                failed.append(missing)
+        return failed
+
+    def _result(self, evaluation_criteria: List, scores: Dict, failed: List[List]) -> Optional[EvaluationResult]:
+        if failed:
+            missing = [c["criterion_id"] for shard in failed for c in shard]
+            self.telemetry.log(f"Error evaluating prompt candidate: no score for criteria {missing}")
+            return None
+        return EvaluationResult(results=[ScoredCriterion(**scores[c["criterion_id"]]) for c in evaluation_criteria])
+
+    def run(self, prompt_candidate: str, evaluation_criteria: List) -> Optional[EvaluationResult]:
+        scores, shards = self._plan(prompt_candidate, evaluation_criteria)
+        for _ in range(self.max_shard_retries + 1):
+            if not shards:
+                break
+            responses = fan_out(lambda shard: super(PromptEvaluator, self).run(prompt_candidate, shard), shards)
+            shards = self._absorb(prompt_candidate, shards, responses, scores)
+        return self._result(evaluation_criteria, scores, shards)
+
+    async def arun(self, prompt_candidate: str, evaluation_criteria: List) -> Optional[EvaluationResult]:
+        scores, shards = self._plan(prompt_candidate, evaluation_criteria)
+        for _ in range(self.max_shard_retries + 1):
+            if not shards:
+                break
+            responses = await asyncio.gather(*(super(PromptEvaluator, self).arun(prompt_candidate, shard)
+                                               for shard in shards))
+            shards = self._absorb(prompt_candidate, shards, list(responses), scores)
+        return self._result(evaluation_criteria, scores, shards)
+
+
+class PromptScreener(PromptEvaluator):
+    """Tool to quickly pre-score a prompt against criteria, meant for a faster, cheaper model.
+
+    Screening scores only decide which candidates get the full `PromptEvaluator` pass; they
+    are never recorded as a candidate's scores.
+    """
+    PROMPT_TEMPLATE = """
+    **Role:** You are a fast, impartial AI Prompt Quality Screener.
+    **Task:** Score the prompt candidate against each evaluation criterion (binary or 1-5 scale as defined). Keep each justification to a few words.
+    **Input:**
+    - `prompt_candidate`: {prompt_candidate}
+    - `evaluation_criteria`: {evaluation_criteria}
+    **Scoring:** Read each criterion's question and scoring guide literally. Be conservative; if the evidence is ambiguous, score lower. For binary, use 0 for No and 1 for Yes.
+    **Output Format:** You MUST output a valid JSON object that conforms to the provided Pydantic model. Do not add any other text.
+    """
 
 
 class ReportGenerator(BaseTool):
-    """Tool to generate the final report."""
+    """Tool to generate the final report.
+
+    With `compact` (the default) criteria are sent without their scoring guides.
+    """
     PROMPT_TEMPLATE = """
     **Role:** You are a Senior AI Consultant delivering a final report to a client. Your communication style is clear, professional, and insightful.
     **Task:** You will be given the user's original prompt, their goal, and the final, optimized prompt that was selected after an iterative refinement process. Your task is to generate a final report that presents the improved prompt and explains *why* it is better.
@@ -142,14 +440,28 @@ class ReportGenerator(BaseTool):
     **Output Format:** You MUST output a valid JSON object that conforms to the provided Pydantic model.
     """
 
-    def run(self, initial_prompt: str, user_goal: str, final_prompt: str, evaluation_criteria: List,
-            final_scores: List) -> Optional:
-        return self._call_llm(
-            self.PROMPT_TEMPLATE,
-            FinalReport,
-            initial_prompt=initial_prompt,
-            user_goal=user_goal,
-            final_prompt=final_prompt,
-            evaluation_criteria=json.dumps(evaluation_criteria, indent=2),
-            final_scores=json.dumps(final_scores, indent=2)
-        )
+    OUTPUT_MODEL = FinalReport
+
+    def __init__(self, llm, cache: Optional[LLMCache] = None, cacheable: Optional[bool] = None,
+                 telemetry: Optional[Telemetry] = None, compact: bool = True):
+        super().__init__(llm, cache=cache, cacheable=cacheable, telemetry=telemetry)
+        self.compact = compact
+
+    def _inputs(self, initial_prompt: str, user_goal: str, final_prompt: str, evaluation_criteria: List,
+                final_scores: List) -> Dict:
+        if self.compact:
+            criteria, scores = compact_report_inputs(evaluation_criteria, final_scores)
+            return {
+                "initial_prompt": initial_prompt,
+                "user_goal": user_goal,
+                "final_prompt": final_prompt,
+                "evaluation_criteria": criteria,
+                "final_scores": scores
+            }
+        return {
+            "initial_prompt": initial_prompt,
+            "user_goal": user_goal,
+            "final_prompt": final_prompt,
+            "evaluation_criteria": json.dumps(evaluation_criteria, indent=2),
+            "final_scores": json.dumps(final_scores, indent=2)
+        }